@@ -102,6 +102,7 @@ setup(
         "wtforms-json",
     ],
     extras_require={
+        "arrow": ["pyarrow>=0.14.0"],
         "bigquery": ["pybigquery>=0.4.10", "pandas_gbq>=0.10.0"],
         "cors": ["flask-cors>=2.0.0"],
         "gsheets": ["gsheetsdb>=0.1.9"],
@@ -361,6 +361,54 @@ def update_datasources_cache():
                 print("{}".format(str(e)))
 
 
+@app.cli.command()
+@click.option("--database_name", "-d", help="Database of the table")
+@click.option("--schema", "-s", default=None, help="Schema of the table")
+@click.option("--table_name", "-t", help="Table whose cached data to evict")
+@click.option(
+    "--since", default=None, help="Only evict the data of time ranges ending after"
+)
+@click.option(
+    "--until", default=None, help="Only evict the data of time ranges starting before"
+)
+@click.option(
+    "--warm-up", "-w", is_flag=True, help="Warm up the cache of the table's charts"
+)
+def invalidate_cache(database_name, schema, table_name, since, until, warm_up):
+    """Evicts the cached data of a table, e.g. after it was reloaded"""
+    from superset.connectors.sqla.models import SqlaTable
+    from superset.models.core import Database
+    from superset.tasks.cache import get_datasource_charts, warm_up_charts
+    from superset.utils.cache import invalidate_datasource
+
+    table = (
+        db.session.query(SqlaTable)
+        .join(Database)
+        .filter(
+            Database.database_name == database_name,
+            SqlaTable.schema == schema,
+            SqlaTable.table_name == table_name,
+        )
+        .one_or_none()
+    )
+    if not table:
+        print(Fore.RED + "Table {} not found".format(table_name) + Style.RESET_ALL)
+        return
+    keys = invalidate_datasource(
+        table.uid,
+        utils.parse_human_datetime(since) if since else None,
+        utils.parse_human_datetime(until) if until else None,
+    )
+    print("Evicted {} cache keys of {}".format(len(keys), table.full_name))
+    if warm_up:
+        results = warm_up_charts(get_datasource_charts(table))
+        print(
+            "Warmed up {} charts, {} errors".format(
+                len(results["success"]), len(results["errors"])
+            )
+        )
+
+
 @app.cli.command()
 @click.option(
     "--workers", "-w", type=int, help="Number of celery server workers to fire up"
@@ -509,3 +557,58 @@ def sync_tags():
     add_types(db.engine, metadata)
     add_owners(db.engine, metadata)
     add_favorites(db.engine, metadata)
+
+
+@app.cli.command()
+@click.option(
+    "--row-limit", "-r", default=100000, help="Maximum number of rows per dataset"
+)
+@click.option(
+    "--iterations", "-i", default=5, help="Number of encode/decode rounds per codec"
+)
+def benchmark_cache_codecs(row_limit, iterations):
+    """Compares the data cache codecs on the example datasets"""
+    from superset.connectors.sqla.models import SqlaTable
+    from superset.utils import cache_codecs
+    from superset.utils.dates import now_as_float
+
+    examples_db = utils.get_example_database()
+    tables = db.session.query(SqlaTable).filter_by(database_id=examples_db.id).all()
+    print(
+        "{:<30} {:<8} {:>10} {:>12} {:>12} {:>12}".format(
+            "dataset", "codec", "rows", "bytes", "encode (ms)", "decode (ms)"
+        )
+    )
+    for table in tables:
+        sql = examples_db.select_star(
+            table.table_name, schema=table.schema, limit=row_limit, show_cols=False
+        )
+        df = examples_db.get_df(sql, table.schema)
+        payload = {"df": df, "dttm": datetime.utcnow().isoformat(), "query": sql}
+        for name in sorted(cache_codecs.registered_codecs):
+            encode_ms = decode_ms = 0.0
+            try:
+                for _ in range(iterations):
+                    start = now_as_float()
+                    data = cache_codecs.serialize(payload, name)
+                    encode_ms += now_as_float() - start
+                    start = now_as_float()
+                    cache_codecs.deserialize(data)
+                    decode_ms += now_as_float() - start
+            except Exception as e:
+                print(
+                    Fore.RED
+                    + "{} failed on {}: {}".format(name, table, e)
+                    + Style.RESET_ALL
+                )
+                continue
+            print(
+                "{:<30} {:<8} {:>10} {:>12} {:>12.1f} {:>12.1f}".format(
+                    table.table_name[:30],
+                    name,
+                    len(df.index),
+                    len(data),
+                    encode_ms / iterations,
+                    decode_ms / iterations,
+                )
+            )
@@ -17,7 +17,6 @@
 # pylint: disable=C,R,W
 from datetime import datetime, timedelta
 import logging
-import pickle as pkl
 from typing import Dict, List
 
 import numpy as np
@@ -26,7 +25,13 @@ import pandas as pd
 from superset import app, cache
 from superset import db
 from superset.connectors.connector_registry import ConnectorRegistry
-from superset.utils import core as utils
+from superset.utils import cache_codecs, core as utils
+from superset.utils.cache import (
+    acquire_lease,
+    index_cache_key,
+    release_lease,
+    wait_for_key,
+)
 from superset.utils.core import DTTM_ALIAS
 from .query_object import QueryObject
 
@@ -171,12 +176,17 @@ class QueryContext:
         status = None
         query = ""
         error_message = None
+        leased = False
         if cache_key and cache and not self.force:
             cache_value = cache.get(cache_key)
+            if not cache_value:
+                leased = acquire_lease(cache_key)
+                if not leased:
+                    cache_value = wait_for_key(cache_key)
             if cache_value:
                 stats_logger.incr("loaded_from_cache")
                 try:
-                    cache_value = pkl.loads(cache_value)
+                    cache_value = cache_codecs.deserialize(cache_value)
                     df = cache_value["df"]
                     query = cache_value["query"]
                     status = utils.QueryStatus.SUCCESS
@@ -210,7 +220,9 @@ class QueryContext:
                     cache_value = dict(
                         dttm=cached_dttm, df=df if df is not None else None, query=query
                     )
-                    cache_binary = pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+                    cache_binary = cache_codecs.serialize(
+                        cache_value, config.get("DATA_CACHE_CODEC")
+                    )
 
                     logging.info(
                         "Caching {} chars at key {}".format(
@@ -222,12 +234,21 @@ class QueryContext:
                     cache.set(
                         cache_key, cache_value=cache_binary, timeout=self.cache_timeout
                     )
+                    index_cache_key(
+                        self.datasource.uid,
+                        cache_key,
+                        self.cache_timeout,
+                        query_obj.from_dttm,
+                        query_obj.to_dttm,
+                    )
                 except Exception as e:
                     # cache.set call can fail if the backend is down or if
                     # the key is too large or whatever other reasons
                     logging.warning("Could not cache key {}".format(cache_key))
                     logging.exception(e)
                     cache.delete(cache_key)
+        if leased:
+            release_lease(cache_key)
         return {
             "cache_key": cache_key,
             "cached_dttm": cache_value["dttm"] if cache_value is not None else None,
@@ -56,6 +56,14 @@ ROW_LIMIT = 50000
 VIZ_ROW_LIMIT = 10000
 # max rows retrieved by filter select auto complete
 FILTER_SELECT_ROW_LIMIT = 10000
+# max number of queries a single chart (time comparisons, filter box
+# columns, ...) runs concurrently, set to 1 to run them one after the other
+VIZ_MAX_CONCURRENT_QUERIES = 4
+# max number of charts queried concurrently by a batched dashboard request
+DASHBOARD_MAX_CONCURRENT_CHARTS = 8
+# number of compiled chart queries kept in memory by each process, so that
+# identical queries skip the SQL generation; set to 0 to disable
+COMPILED_QUERY_CACHE_SIZE = 1000
 SUPERSET_WORKERS = 2  # deprecated
 SUPERSET_CELERY_WORKERS = 32  # deprecated
 
@@ -246,6 +254,64 @@ CACHE_DEFAULT_TIMEOUT = 60 * 60 * 24
 CACHE_CONFIG = {"CACHE_TYPE": "null"}
 TABLE_NAMES_CACHE_CONFIG = {"CACHE_TYPE": "null"}
 
+# Charts missing the cache at the same time run their query only once: the
+# first one takes a lease on the cache key for at most this many seconds and
+# the others wait up to QUERY_COALESCING_WAIT_TIMEOUT seconds for its result
+# before querying on their own. Set to 0 to disable.
+QUERY_COALESCING_LEASE_TIMEOUT = 60
+QUERY_COALESCING_WAIT_TIMEOUT = 30
+
+# Charts whose cached data timed out less than this many seconds ago are still
+# served from the cache at once, while a Celery task refreshes their data in
+# the background. Datasources can override it with their own "Stale Cache
+# Timeout". Set to 0 to disable.
+STALE_CACHE_TIMEOUT = 0
+
+# Time series charts on SQL tables can cache their data in segments spanning
+# this many seconds (e.g. 24 * 60 * 60), so that charts on sliding time ranges
+# like "Last week" only query the segments missing from the cache, plus the
+# trailing one which is still open. Only applies when the time range starts
+# at the beginning of a segment and the time grain divides it. Set to 0 to
+# disable.
+TIMESERIES_CACHE_SEGMENT_SECONDS = 0
+
+# The keys of cached chart data are indexed by datasource, along with their
+# time range, so that reloading a table can evict only the data derived from
+# it with `superset invalidate_cache` or POST /superset/invalidate_cache/.
+# Each datasource indexes at most this many keys, the most recent ones, split
+# in CACHE_INDEX_SHARDS cache values so that each stays small. Set to 0 to
+# disable.
+CACHE_INDEX_MAX_KEYS = 2000
+CACHE_INDEX_SHARDS = 16
+
+# The permissions granted to each set of roles are indexed in the cache, under
+# a version bumped whenever roles or permissions change. Indexes and their
+# version expire after this many seconds, which bounds how long processes not
+# sharing the cache, e.g. with a SimpleCache, keep using revoked permissions.
+PERMISSIONS_INDEX_TIMEOUT = 60
+
+# Rollups declared on SQL tables are pre-aggregated copies of them, which the
+# "rollups.refresh_rollup_tables" Celery task materializes in the database of
+# the table, e.g. when scheduled in CELERYBEAT_SCHEDULE. Queries covered by a
+# rollup read the smallest one, unless it was refreshed longer than this many
+# seconds ago. Set to 0 to read rollups however old they are.
+ROLLUP_TABLE_MAX_AGE = 24 * 60 * 60
+
+# Prefix of the names of the tables rollups are materialized in
+ROLLUP_TABLE_PREFIX = "superset_rollup_"
+
+# The "cache-warmup" Celery task loads the data of the charts picked by its
+# strategy in the worker, running at most this many of their queries at once
+# against each database
+CACHE_WARMUP_MAX_CONCURRENCY_PER_DATABASE = 2
+
+# Serialization format of the dataframes stored in the data cache, one of
+# "pickle", "arrow" or "parquet" (the latter two require pyarrow), or an
+# instance of `superset.utils.cache_codecs.BaseCodec`, for instance
+# `ArrowCodec(compression_level=1)`. Payloads are tagged with the codec that
+# wrote them, so changing this setting doesn't invalidate existing entries.
+DATA_CACHE_CODEC = "pickle"
+
 # CORS Options
 ENABLE_CORS = False
 CORS_OPTIONS = {}
@@ -266,6 +332,21 @@ ALLOWED_EXTENSIONS = set(["csv"])
 # note: index option should not be overridden
 CSV_EXPORT = {"encoding": "utf-8"}
 
+# CSV exports are streamed to the client this many rows at a time
+CSV_EXPORT_CHUNK_SIZE = 10000
+
+# Uploaded CSV files are inserted this many rows at a time, in column types
+# inferred from their first CSV_UPLOAD_SAMPLE_SIZE rows
+CSV_UPLOAD_CHUNK_SIZE = 10000
+CSV_UPLOAD_SAMPLE_SIZE = 10000
+
+# Load uploaded CSV files in a Celery worker rather than in the web request.
+# The workers need access to UPLOAD_FOLDER, where the files are saved.
+CSV_UPLOAD_ASYNC = False
+
+# How long the progress of CSV uploads loaded by workers is kept in the cache
+CSV_UPLOAD_STATUS_TIMEOUT = 60 * 60 * 24
+
 # ---------------------------------------------------
 # Time grain configurations
 # ---------------------------------------------------
@@ -437,6 +518,10 @@ SQLLAB_ASYNC_TIME_LIMIT_SEC = 60 * 60 * 6
 # in SQL Lab by using the "Run Async" button/feature
 RESULTS_BACKEND = None
 
+# Query results are stored in the results backend by pages of this many rows,
+# so that SQL Lab can fetch a window of a large result without reading it all
+RESULTS_BACKEND_PAGE_SIZE = 1000
+
 # The S3 bucket where you want to store your external hive tables created
 # from CSV files. For example, 'companyname-superset'
 CSV_TO_HIVE_UPLOAD_S3_BUCKET = None
@@ -512,6 +597,15 @@ TRACKING_URL_TRANSFORMER = lambda x: x  # noqa: E731
 # Interval between consecutive polls when using Hive Engine
 HIVE_POLL_INTERVAL = 5
 
+# Running Presto and Hive queries are polled for progress with intervals
+# growing from the min to the max interval (in seconds) by the backoff factor.
+# Progress is committed once it moved by SQLLAB_PROGRESS_MIN_DELTA percent,
+# and stop requests are signaled through the cache when one is configured.
+SQLLAB_POLL_MIN_INTERVAL = 1
+SQLLAB_POLL_MAX_INTERVAL = 5
+SQLLAB_POLL_BACKOFF = 1.5
+SQLLAB_PROGRESS_MIN_DELTA = 5
+
 # Allow for javascript controls components
 # this enables programmers to customize certain charts (like the
 # geospatial ones) by inputing javascript in controls. This exposes
@@ -538,6 +632,13 @@ DASHBOARD_TEMPLATE_ID = None
 # as such `create_engine(url, **params)`
 DB_CONNECTION_MUTATOR = None
 
+# Each process keeps the SQLAlchemy engines of the databases it connects to,
+# per schema and effective user. Only the SQLA_ENGINE_CACHE_SIZE most recently
+# used ones are kept, for at most SQLA_ENGINE_CACHE_TTL seconds, after which
+# their connections are closed. Set to None to keep them all, forever.
+SQLA_ENGINE_CACHE_SIZE = 100
+SQLA_ENGINE_CACHE_TTL = 60 * 60
+
 # A function that intercepts the SQL to be executed and can alter it.
 # The use case is can be around adding some sort of comment header
 # with information such as the username and worker node information
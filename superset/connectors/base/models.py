@@ -56,6 +56,7 @@ class BaseDatasource(AuditMixinNullable, ImportMixin):
     filter_select_enabled = Column(Boolean, default=False)
     offset = Column(Integer, default=0)
     cache_timeout = Column(Integer)
+    stale_cache_timeout = Column(Integer)
     params = Column(String(1000))
     perm = Column(String(1000))
 
@@ -189,6 +190,7 @@ class BaseDatasource(AuditMixinNullable, ImportMixin):
             "schema": self.schema,
             "offset": self.offset,
             "cache_timeout": self.cache_timeout,
+            "stale_cache_timeout": self.stale_cache_timeout,
             "params": self.params,
             "perm": self.perm,
             "edit_url": self.url,
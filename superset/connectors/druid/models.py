@@ -482,6 +482,7 @@ class DruidDatasource(Model, BaseDatasource):
         "cluster_name",
         "offset",
         "cache_timeout",
+        "stale_cache_timeout",
         "params",
         "filter_select_enabled",
     )
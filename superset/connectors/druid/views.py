@@ -312,6 +312,7 @@ class DruidDatasourceModelView(
         "default_endpoint",
         "offset",
         "cache_timeout",
+        "stale_cache_timeout",
     ]
     search_columns = ("datasource_name", "cluster", "description", "owners")
     add_columns = edit_columns
@@ -355,6 +356,12 @@ class DruidDatasourceModelView(
             "A timeout of 0 indicates that the cache never expires. "
             "Note this defaults to the cluster timeout if undefined."
         ),
+        "stale_cache_timeout": _(
+            "Duration (in seconds) past the caching timeout during which "
+            "charts are still served from the cache while their data is "
+            "refreshed in the background. "
+            "Note this defaults to STALE_CACHE_TIMEOUT if undefined."
+        ),
     }
     base_filters = [["id", DatasourceFilter, lambda: []]]
     label_columns = {
@@ -368,6 +375,7 @@ class DruidDatasourceModelView(
         "default_endpoint": _("Default Endpoint"),
         "offset": _("Time Offset"),
         "cache_timeout": _("Cache Timeout"),
+        "stale_cache_timeout": _("Stale Cache Timeout"),
         "datasource_name": _("Datasource Name"),
         "fetch_values_from": _("Fetch Values From"),
         "changed_by_": _("Changed By"),
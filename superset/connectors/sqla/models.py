@@ -16,10 +16,13 @@
 # under the License.
 # pylint: disable=C,R,W
 from collections import OrderedDict
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import json
 import logging
 import re
-from typing import Any, Dict, List, NamedTuple, Optional, Union
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 from flask import escape, Markup
 from flask_appbuilder import Model
@@ -42,7 +45,14 @@ from sqlalchemy import (
     Text,
 )
 from sqlalchemy.exc import CompileError
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import (
+    backref,
+    joinedload,
+    object_session,
+    relationship,
+    subqueryload,
+)
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import column, literal_column, table, text
@@ -56,10 +66,13 @@ from superset.exceptions import DatabaseNotFound
 from superset.jinja_context import get_template_processor
 from superset.models.annotations import Annotation
 from superset.models.core import Database
-from superset.models.helpers import QueryResult
-from superset.utils import core as utils, import_datasource
+from superset.models.helpers import AuditMixinNullable, QueryResult
+from superset.sql_parse import ParsedQuery
+from superset.utils import core as utils, import_datasource, rollups
+from superset.utils.dates import EPOCH, now_as_float
 
 config = app.config
+stats_logger = config.get("STATS_LOGGER")
 metadata = Model.metadata  # pylint: disable=no-member
 
 
@@ -76,6 +89,33 @@ class QueryStringExtended(NamedTuple):
     sql: str
 
 
+class RenderedTemplates(NamedTuple):
+    extra_cache_keys: List[Any]
+    from_sql: Optional[str]
+    where: Optional[str]
+    having: Optional[str]
+
+
+class SqlaTableSnapshot(NamedTuple):
+    """Read-only view of the metadata needed to query a table"""
+
+    version: Tuple[Any, ...]
+    columns: Dict[str, Any]
+    metrics: Dict[str, Any]
+    dttm_cols: List[str]
+    template_params: Dict[str, Any]
+    rollups: List[Any]
+
+
+# snapshots of the tables, by id, shared across the requests of a process
+_snapshots: Dict[int, SqlaTableSnapshot] = {}
+_snapshots_lock = threading.Lock()
+
+# compiled SQL of the recent chart queries, least recently used first
+_compiled_queries: "OrderedDict[str, QueryStringExtended]" = OrderedDict()
+_compiled_queries_lock = threading.Lock()
+
+
 class AnnotationDatasource(BaseDatasource):
     """ Dummy object so we can query annotations using 'Viz' objects just like
         regular datasources.
@@ -283,6 +323,236 @@ class SqlMetric(Model, BaseMetric):
         return import_datasource.import_simple_obj(db.session, i_metric, lookup_obj)
 
 
+class TableRollup(Model, AuditMixinNullable):
+
+    """A pre-aggregated copy of a table, materialized in its database
+
+    Rollups group the rows of the table by a few of its columns and by its
+    time column truncated to a time grain, and keep additive metrics only,
+    so that queries on a subset of these can read the rollup instead.
+    """
+
+    __tablename__ = "table_rollups"
+    id = Column(Integer, primary_key=True)
+    table_id = Column(Integer, ForeignKey("tables.id"), nullable=False)
+    table = relationship(
+        "SqlaTable",
+        backref=backref("rollups", cascade="all, delete-orphan"),
+        foreign_keys=[table_id],
+    )
+    groupby = Column(Text)
+    metrics = Column(Text)
+    time_column = Column(String(255))
+    time_grain_sqla = Column(String(32))
+    rollup_table = Column(String(250))
+    rowcount = Column(Integer)
+    refreshed_on = Column(DateTime)
+
+    def __repr__(self):
+        return self.rollup_table or "rollup {}".format(self.id)
+
+    @property
+    def groupby_list(self) -> List[str]:
+        return json.loads(self.groupby or "[]")
+
+    @property
+    def metric_list(self) -> List[str]:
+        return json.loads(self.metrics or "[]")
+
+    @property
+    def grain_seconds(self) -> int:
+        return rollups.FIXED_GRAINS[self.time_grain_sqla][0]
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether the rollup is materialized and recent enough to be read"""
+        if not self.rollup_table or not self.refreshed_on:
+            return False
+        max_age = config.get("ROLLUP_TABLE_MAX_AGE")
+        return not max_age or datetime.now() - self.refreshed_on < timedelta(
+            seconds=max_age
+        )
+
+    def validate(self) -> None:
+        """Raises if the rollup can't be materialized from its table"""
+        if self.time_grain_sqla not in rollups.FIXED_GRAINS:
+            raise Exception(
+                _("Rollups need a time grain of at most a day, not %(grain)s")
+                % {"grain": self.time_grain_sqla}
+            )
+        columns = {col.column_name for col in self.table.columns}
+        if self.time_column not in self.table.dttm_cols:
+            raise Exception(
+                _("%(col)s isn't a time column") % {"col": self.time_column}
+            )
+        for col in self.groupby_list:
+            if col not in columns:
+                raise Exception(_("Column '%(col)s' does not exist") % {"col": col})
+        saved_metrics = {m.metric_name: m.expression for m in self.table.metrics}
+        if not self.metric_list:
+            raise Exception(_("Rollups need at least one metric"))
+        for metric in self.metric_list:
+            if metric not in saved_metrics:
+                raise Exception(_("Metric '%(metric)s' does not exist", metric=metric))
+            if not rollups.metric_rollup_function(metric, saved_metrics):
+                raise Exception(
+                    _(
+                        "Metric '%(metric)s' isn't a SUM, COUNT, MIN or MAX",
+                        metric=metric,
+                    )
+                )
+
+    def covers(self, query_obj: Dict) -> bool:
+        """Whether the rollup holds all the data a query needs"""
+        extras = query_obj.get("extras") or {}
+        if (
+            extras.get("where")
+            or extras.get("having")
+            or query_obj.get("columns")
+            or query_obj.get("orderby")
+        ):
+            return False
+        granularity = query_obj.get("granularity")
+        if granularity != self.time_column and (
+            granularity or query_obj.get("is_timeseries")
+        ):
+            return False
+
+        groupby = self.groupby_list
+        if not set(query_obj.get("groupby") or []) <= set(groupby):
+            return False
+        for flt in query_obj.get("filter") or []:
+            if flt.get("col") and flt.get("op") and flt["col"] not in groupby:
+                return False
+
+        metrics = self.metric_list
+        if not query_obj.get("metrics"):
+            return False
+        if any(metric not in metrics for metric in query_obj["metrics"]):
+            return False
+        limit_metric = query_obj.get("timeseries_limit_metric")
+        if limit_metric and limit_metric not in metrics:
+            return False
+
+        if query_obj.get("is_timeseries"):
+            grain = extras.get("time_grain_sqla") or None
+            # the database truncates to weeks the same way from any day
+            if not rollups.can_roll_up_grain(self.time_grain_sqla, grain) and not (
+                grain and "P1W" in grain
+            ):
+                return False
+        # rollups only hold whole time buckets
+        for key in ("from_dttm", "to_dttm", "inner_from_dttm", "inner_to_dttm"):
+            dttm = query_obj.get(key)
+            if dttm and (dttm - EPOCH).total_seconds() % self.grain_seconds:
+                return False
+        return True
+
+    def get_table(self, base: "SqlaTable") -> "SqlaTable":
+        """
+        A transient table over the materialized rollup, with the columns and
+        the metrics of the rollup, for `base` to delegate its queries to.
+
+        Nothing is set through relationships, which would add the transient
+        objects to the session of `base`.
+        """
+        rollup = SqlaTable(
+            table_name=self.rollup_table,
+            schema=base.schema,
+            main_dttm_col=utils.DTTM_ALIAS,
+        )
+        set_committed_value(rollup, "database", base.database)
+        set_committed_value(rollup, "rollups", [])
+
+        base_cols = base.get_snapshot().columns
+        time_col = base_cols[self.time_column]
+        columns = [
+            TableColumn(
+                column_name=utils.DTTM_ALIAS,
+                type=time_col.type,
+                is_dttm=True,
+                python_date_format=None
+                if time_col.python_date_format in ("epoch_s", "epoch_ms")
+                else time_col.python_date_format,
+            )
+        ]
+        for name in self.groupby_list:
+            columns.append(TableColumn(column_name=name, type=base_cols[name].type))
+
+        quote = base.database.get_dialect().identifier_preparer.quote
+        saved_metrics = {
+            name: metric.expression
+            for name, metric in base.get_snapshot().metrics.items()
+        }
+        metrics = []
+        for name in self.metric_list:
+            function = rollups.metric_rollup_function(name, saved_metrics) or "sum"
+            expression = "{}({})".format(function.upper(), quote(name))
+            metrics.append(SqlMetric(metric_name=name, expression=expression))
+
+        for obj in columns + metrics:
+            set_committed_value(obj, "table", rollup)
+        set_committed_value(rollup, "columns", columns)
+        set_committed_value(rollup, "metrics", metrics)
+        return rollup
+
+    def refresh(self) -> Optional[str]:
+        """
+        Materializes the rollup in a new table of the database, through a
+        CREATE TABLE AS of the aggregating query. The caller commits the
+        session, then drops the table previously holding the rollup with
+        `drop_rollup_table`, which other processes read until the commit.
+
+        :returns: the name of the table previously holding the rollup, if any
+        """
+        self.validate()
+        table = self.table
+        database = table.database
+        if not database.allow_ctas:
+            raise Exception(
+                _("%(database)s doesn't allow CREATE TABLE AS", database=database)
+            )
+        start_ts = now_as_float()
+        sqlaq = table.get_sqla_query(
+            groupby=self.groupby_list,
+            metrics=self.metric_list,
+            granularity=self.time_column,
+            from_dttm=None,
+            to_dttm=None,
+            filter=[],
+            is_timeseries=True,
+            timeseries_limit=0,
+            extras={"time_grain_sqla": self.time_grain_sqla},
+            use_rollups=False,
+        )
+        select_sql = database.compile_sqla_query(sqlaq.sqla_query)
+        rollup_table = "{}{}_{}_{}".format(
+            config.get("ROLLUP_TABLE_PREFIX"), table.id, self.id, int(start_ts)
+        )
+        engine = database.get_sqla_engine(schema=table.schema)
+        preparer = engine.dialect.identifier_preparer
+        full_name = preparer.quote(rollup_table)
+        if table.schema:
+            full_name = f"{preparer.quote_schema(table.schema)}.{full_name}"
+        engine.execute(ParsedQuery(select_sql).as_create_table(full_name))
+        rowcount = engine.execute(f"SELECT COUNT(*) FROM {full_name}").scalar()
+        stats_logger.timing("rollup_table.refresh", now_as_float() - start_ts)
+
+        previous = self.rollup_table
+        self.rollup_table = rollup_table
+        self.rowcount = rowcount
+        self.refreshed_on = datetime.now()
+        return previous if previous != rollup_table else None
+
+    def drop_rollup_table(self, rollup_table: str) -> None:
+        """Drops a table that held the rollup before its last refresh"""
+        table = self.table
+        engine = table.database.get_sqla_engine(schema=table.schema)
+        table.database.db_engine_spec.drop_table(
+            engine, rollup_table, schema=table.schema
+        )
+
+
 sqlatable_user = Table(
     "sqlatable_user",
     metadata,
@@ -319,6 +589,9 @@ class SqlaTable(Model, BaseDatasource):
     sql = Column(Text)
     is_sqllab_view = Column(Boolean, default=False)
     template_params = Column(Text)
+    # bumped on every change of the table and of its columns, metrics and
+    # rollups, versioning its cached snapshots
+    version = Column(Integer, default=0, onupdate=literal_column("version") + 1)
 
     baselink = "tablemodelview"
 
@@ -330,6 +603,7 @@ class SqlaTable(Model, BaseDatasource):
         "database_id",
         "offset",
         "cache_timeout",
+        "stale_cache_timeout",
         "schema",
         "sql",
         "params",
@@ -482,10 +756,70 @@ class SqlaTable(Model, BaseDatasource):
         )
 
     def get_col(self, col_name):
-        columns = self.columns
-        for col in columns:
-            if col_name == col.column_name:
-                return col
+        return self.get_snapshot().columns.get(col_name)
+
+    @property
+    def snapshot_version(self) -> Tuple[Any, ...]:
+        return (self.version, self.database.version)
+
+    def make_snapshot(self) -> SqlaTableSnapshot:
+        return SqlaTableSnapshot(
+            version=self.snapshot_version,
+            columns={col.column_name: col for col in self.columns},
+            metrics={m.metric_name: m for m in self.metrics},
+            dttm_cols=self.dttm_cols,
+            template_params=self.template_params_dict,
+            rollups=list(self.rollups),
+        )
+
+    @classmethod
+    def load_snapshot(cls, table_id: int) -> SqlaTableSnapshot:
+        """Builds a snapshot from a session of its own, so that its columns
+        and metrics are fully loaded and detached once it's closed"""
+        session = db.create_session({})()
+        try:
+            table = (
+                session.query(cls)
+                .options(
+                    subqueryload(cls.columns),
+                    subqueryload(cls.metrics),
+                    subqueryload(cls.rollups),
+                    joinedload(cls.database),
+                )
+                .filter_by(id=table_id)
+                .one()
+            )
+            snapshot = table.make_snapshot()
+            for obj in list(snapshot.columns.values()) + list(
+                snapshot.metrics.values()
+            ):
+                obj.table
+            return snapshot
+        finally:
+            session.close()
+
+    def get_snapshot(self) -> SqlaTableSnapshot:
+        """Returns the columns, metrics and template params of the table
+
+        Snapshots are cached per process and reused for as long as the
+        ``version`` of the table and of its database are unchanged.
+        Tables that are new or being edited in the current session get a
+        snapshot of their own state instead.
+        """
+        session = object_session(self)
+        if self.id is None or session is None or session.new or session.dirty:
+            return self.make_snapshot()
+
+        version = self.snapshot_version
+        snapshot = _snapshots.get(self.id)
+        if snapshot is None or snapshot.version != version:
+            snapshot = self.load_snapshot(self.id)
+            with _snapshots_lock:
+                _snapshots[self.id] = snapshot
+        if snapshot.version != version:
+            # the session holds changes that aren't committed yet
+            return self.make_snapshot()
+        return snapshot
 
     @property
     def data(self):
@@ -505,8 +839,7 @@ class SqlaTable(Model, BaseDatasource):
         """Runs query against sqla to retrieve some
         sample values for the given column.
         """
-        cols = {col.column_name: col for col in self.columns}
-        target_col = cols[column_name]
+        target_col = self.get_snapshot().columns[column_name]
         tp = self.get_template_processor()
 
         qry = (
@@ -541,16 +874,160 @@ class SqlaTable(Model, BaseDatasource):
     def get_template_processor(self, **kwargs):
         return get_template_processor(table=self, database=self.database, **kwargs)
 
-    def get_query_str_extended(self, query_obj) -> QueryStringExtended:
+    def render_templates(
+        self,
+        from_dttm=None,
+        groupby=None,
+        metrics=None,
+        row_limit=None,
+        to_dttm=None,
+        filter=None,  # noqa
+        extras=None,
+        **kwargs,
+    ) -> RenderedTemplates:
+        """
+        Renders the templated parts of a query, which are the SQL of the table
+        and its ``where`` and ``having`` extras, without building the query.
+
+        Renderings are kept on the table, so that the query built after its
+        extra cache keys were computed reuses them instead of rendering again.
+
+        :return: the rendered parts and the extra cache keys they recorded
+        """
+        extras = extras or {}
+        snapshot = self.get_snapshot()
+        key = json.dumps(
+            [
+                snapshot.version,
+                from_dttm,
+                groupby,
+                metrics,
+                row_limit,
+                to_dttm,
+                filter,
+                extras.get("where"),
+                extras.get("having"),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        renderings: Dict[str, RenderedTemplates] = getattr(self, "_renderings", {})
+        self._renderings = renderings
+        rendered = renderings.get(key)
+        if rendered:
+            return rendered
+
+        template_kwargs = {
+            "from_dttm": from_dttm,
+            "groupby": groupby,
+            "metrics": metrics,
+            "row_limit": row_limit,
+            "to_dttm": to_dttm,
+            "filter": filter,
+            "columns": dict(snapshot.columns),
+        }
+        template_kwargs.update(snapshot.template_params)
+        extra_cache_keys: List[Any] = []
+        template_kwargs["extra_cache_keys"] = extra_cache_keys
+        tp = self.get_template_processor(**template_kwargs)
+
+        def render(statement):
+            return tp.process_template(statement) if statement else statement
+
+        rendered = RenderedTemplates(
+            extra_cache_keys=extra_cache_keys,
+            from_sql=render(self.sql),
+            where=render(extras.get("where")),
+            having=render(extras.get("having")),
+        )
+        if len(renderings) >= 32:
+            renderings.clear()
+        renderings[key] = rendered
+        return rendered
+
+    def is_templated(self, query_obj: Dict) -> bool:
+        """Whether the SQL of a query object goes through the template engine"""
+        extras = query_obj.get("extras") or {}
+        statements = [self.sql, extras.get("where"), extras.get("having")]
+        return any(s and ("{{" in s or "{%" in s) for s in statements)
+
+    def compiled_query_key(self, query_obj: Dict) -> Optional[str]:
+        """
+        Key of the compiled SQL of a query object, derived from the query object
+        and from the version of the table's metadata.
+
+        :param query_obj: query object to compile
+        :return: the key, or None if the SQL is templated and may depend on
+            more than the query object
+        """
+        if self.id is None or self.is_templated(query_obj):
+            return None
+        snapshot = self.get_snapshot()
+        rollup_ids = [r.id for r in snapshot.rollups if r.is_fresh]
+        key = json.dumps(
+            [self.id, snapshot.version, rollup_ids, query_obj],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    def compile_query(self, query_obj: Dict) -> QueryStringExtended:
+        """Compiles a query object, reusing the SQL of identical queries"""
+        max_size = config.get("COMPILED_QUERY_CACHE_SIZE")
+        key = self.compiled_query_key(query_obj) if max_size else None
+        if key:
+            with _compiled_queries_lock:
+                compiled = _compiled_queries.get(key)
+                if compiled:
+                    _compiled_queries.move_to_end(key)
+            if compiled:
+                stats_logger.incr("compiled_query_cache.hit")
+                return compiled
+            stats_logger.incr("compiled_query_cache.miss")
+
+        start_ts = now_as_float()
         sqlaq = self.get_sqla_query(**query_obj)
         sql = self.database.compile_sqla_query(sqlaq.sqla_query)
-        logging.info(sql)
         sql = sqlparse.format(sql, reindent=True)
-        sql = self.mutate_query_from_config(sql)
-        return QueryStringExtended(
+        stats_logger.timing("compiled_query_cache.compile", now_as_float() - start_ts)
+        compiled = QueryStringExtended(
             labels_expected=sqlaq.labels_expected, sql=sql, prequeries=sqlaq.prequeries
         )
 
+        # prequeries embed the results of a query, they can't be reused
+        if key and not sqlaq.prequeries:
+            with _compiled_queries_lock:
+                _compiled_queries[key] = compiled
+                while len(_compiled_queries) > max_size:
+                    _compiled_queries.popitem(last=False)
+        return compiled
+
+    def find_rollup(self, query_obj: Dict) -> Optional[TableRollup]:
+        """The smallest fresh rollup of the table holding the data of a query"""
+        snapshot = self.get_snapshot()
+        fresh = [r for r in snapshot.rollups if r.is_fresh]
+        if not fresh or self.is_templated(query_obj):
+            return None
+        granularity = query_obj.get("granularity")
+        if granularity not in snapshot.dttm_cols:
+            granularity = self.main_dttm_col
+        query_obj = dict(query_obj, granularity=granularity)
+        covering = [r for r in fresh if r.covers(query_obj)]
+        if not covering:
+            stats_logger.incr("rollup_table.miss")
+            return None
+        stats_logger.incr("rollup_table.hit")
+        return min(covering, key=lambda r: r.rowcount or 0)
+
+    def get_query_str_extended(self, query_obj) -> QueryStringExtended:
+        compiled = self.compile_query(query_obj)
+        logging.info(compiled.sql)
+        return QueryStringExtended(
+            labels_expected=list(compiled.labels_expected),
+            sql=self.mutate_query_from_config(compiled.sql),
+            prequeries=list(compiled.prequeries),
+        )
+
     def get_query_str(self, query_obj):
         query_str_ext = self.get_query_str_extended(query_obj)
         all_queries = query_str_ext.prequeries + [query_str_ext.sql]
@@ -562,11 +1039,13 @@ class SqlaTable(Model, BaseDatasource):
             tbl.schema = self.schema
         return tbl
 
-    def get_from_clause(self, template_processor=None):
+    def get_from_clause(self, template_processor=None, rendered_sql=None):
         # Supporting arbitrary SQL statements in place of tables
         if self.sql:
             from_sql = self.sql
-            if template_processor:
+            if rendered_sql is not None:
+                from_sql = rendered_sql
+            elif template_processor:
                 from_sql = template_processor.process_template(from_sql)
             from_sql = sqlparse.format(from_sql, strip_comments=True)
             return TextAsFrom(sa.text(from_sql), []).alias("expr_qry")
@@ -617,35 +1096,58 @@ class SqlaTable(Model, BaseDatasource):
         extras=None,
         columns=None,
         order_desc=True,
+        use_rollups=True,
     ):
         """Querying any sqla table from this common interface"""
-        template_kwargs = {
-            "from_dttm": from_dttm,
-            "groupby": groupby,
-            "metrics": metrics,
-            "row_limit": row_limit,
-            "to_dttm": to_dttm,
-            "filter": filter,
-            "columns": {col.column_name: col for col in self.columns},
-        }
-        template_kwargs.update(self.template_params_dict)
-        extra_cache_keys: List[Any] = []
-        template_kwargs["extra_cache_keys"] = extra_cache_keys
-        template_processor = self.get_template_processor(**template_kwargs)
+        snapshot = self.get_snapshot()
+        if use_rollups and snapshot.rollups:
+            query_obj = {
+                "groupby": groupby,
+                "metrics": metrics,
+                "granularity": granularity,
+                "from_dttm": from_dttm,
+                "to_dttm": to_dttm,
+                "filter": filter,
+                "is_timeseries": is_timeseries,
+                "timeseries_limit": timeseries_limit,
+                "timeseries_limit_metric": timeseries_limit_metric,
+                "row_limit": row_limit,
+                "inner_from_dttm": inner_from_dttm,
+                "inner_to_dttm": inner_to_dttm,
+                "orderby": orderby,
+                "extras": extras,
+                "columns": columns,
+                "order_desc": order_desc,
+            }
+            rollup = self.find_rollup(query_obj)
+            if rollup:
+                return rollup.get_table(self).get_sqla_query(
+                    **self.get_rollup_query_obj(query_obj)
+                )
+        rendered = self.render_templates(
+            from_dttm=from_dttm,
+            groupby=groupby,
+            metrics=metrics,
+            row_limit=row_limit,
+            to_dttm=to_dttm,
+            filter=filter,
+            extras=extras,
+        )
+        extra_cache_keys = list(rendered.extra_cache_keys)
         db_engine_spec = self.database.db_engine_spec
         prequeries: List[str] = []
 
         orderby = orderby or []
 
         # For backward compatibility
-        if granularity not in self.dttm_cols:
+        if granularity not in snapshot.dttm_cols:
             granularity = self.main_dttm_col
 
         # Database spec supports join-free timeslot grouping
         time_groupby_inline = db_engine_spec.time_groupby_inline
 
-        cols = {col.column_name: col for col in self.columns}
-        metrics_dict = {m.metric_name: m for m in self.metrics}
+        cols = snapshot.columns
+        metrics_dict = snapshot.metrics
 
         if not granularity and is_timeseries:
             raise Exception(
@@ -707,7 +1209,7 @@ class SqlaTable(Model, BaseDatasource):
             # Use main dttm column to support index with secondary dttm columns
             if (
                 db_engine_spec.time_secondary_columns
-                and self.main_dttm_col in self.dttm_cols
+                and self.main_dttm_col in snapshot.dttm_cols
                 and self.main_dttm_col != dttm_col.column_name
             ):
                 time_filters.append(
@@ -724,7 +1226,7 @@ class SqlaTable(Model, BaseDatasource):
         )
         qry = sa.select(select_exprs)
 
-        tbl = self.get_from_clause(template_processor)
+        tbl = self.get_from_clause(rendered_sql=rendered.from_sql)
 
         if not columns:
             qry = qry.group_by(*groupby_exprs_with_timestamp.values())
@@ -775,12 +1277,10 @@ class SqlaTable(Model, BaseDatasource):
         if extras:
             where = extras.get("where")
             if where:
-                where = template_processor.process_template(where)
-                where_clause_and += [sa.text("({})".format(where))]
+                where_clause_and += [sa.text("({})".format(rendered.where))]
             having = extras.get("having")
             if having:
-                having = template_processor.process_template(having)
-                having_clause_and += [sa.text("({})".format(having))]
+                having_clause_and += [sa.text("({})".format(rendered.having))]
         if granularity:
             qry = qry.where(and_(*(time_filters + where_clause_and)))
         else:
@@ -887,6 +1387,23 @@ class SqlaTable(Model, BaseDatasource):
             prequeries=prequeries,
         )
 
+    def get_rollup_query_obj(self, query_obj: Dict) -> Dict:
+        """Maps a query of the table to a query of one of its rollups"""
+        granularity = query_obj["granularity"]
+        if granularity not in self.get_snapshot().dttm_cols:
+            granularity = self.main_dttm_col
+        query_obj = dict(query_obj, granularity=utils.DTTM_ALIAS)
+        if not granularity:
+            query_obj.update(
+                from_dttm=None, to_dttm=None, inner_from_dttm=None, inner_to_dttm=None
+            )
+        # the time buckets of the rollup start at their timestamp, so the
+        # ends of the time ranges are made exclusive
+        for key in ("to_dttm", "inner_to_dttm"):
+            if query_obj.get(key):
+                query_obj[key] -= timedelta(microseconds=1)
+        return query_obj
+
     def _get_timeseries_orderby(self, timeseries_limit_metric, metrics_dict, cols):
         if utils.is_adhoc_metric(timeseries_limit_metric):
             ob = self.adhoc_metric_to_sqla(timeseries_limit_metric, cols)
@@ -1093,11 +1610,39 @@ class SqlaTable(Model, BaseDatasource):
 
     def get_extra_cache_keys(self, query_obj: Dict) -> List[Any]:
         if self.has_extra_cache_keys(query_obj):
-            sqla_query = self.get_sqla_query(**query_obj)
-            extra_cache_keys = sqla_query.extra_cache_keys
-            return extra_cache_keys
+            return list(self.render_templates(**query_obj).extra_cache_keys)
         return []
 
 
+def touch_table(mapper, connection, target):
+    """Bumps the ``version`` of the table of an edited column, metric or
+    rollup, so that the cached snapshots of the table are refreshed"""
+    if target.table_id is None:
+        return
+    changed_on = datetime.now()
+    tables = SqlaTable.__table__
+    connection.execute(
+        tables.update()
+        .where(tables.c.id == target.table_id)
+        .values(changed_on=changed_on, version=tables.c.version + 1)
+    )
+    table = target.__dict__.get("table")
+    if table is not None:
+        version = connection.scalar(
+            sa.select([tables.c.version]).where(tables.c.id == target.table_id)
+        )
+        set_committed_value(table, "changed_on", changed_on)
+        set_committed_value(table, "version", version)
+
+
 sa.event.listen(SqlaTable, "after_insert", security_manager.set_perm)
 sa.event.listen(SqlaTable, "after_update", security_manager.set_perm)
+sa.event.listen(TableColumn, "after_insert", touch_table)
+sa.event.listen(TableColumn, "after_update", touch_table)
+sa.event.listen(TableColumn, "after_delete", touch_table)
+sa.event.listen(SqlMetric, "after_insert", touch_table)
+sa.event.listen(SqlMetric, "after_update", touch_table)
+sa.event.listen(SqlMetric, "after_delete", touch_table)
+sa.event.listen(TableRollup, "after_insert", touch_table)
+sa.event.listen(TableRollup, "after_update", touch_table)
+sa.event.listen(TableRollup, "after_delete", touch_table)
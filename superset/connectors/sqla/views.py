@@ -219,6 +219,68 @@ class SqlMetricInlineView(CompactCRUDMixin, SupersetModelView):  # noqa
 appbuilder.add_view_no_menu(SqlMetricInlineView)
 
 
+class TableRollupInlineView(CompactCRUDMixin, SupersetModelView):  # noqa
+    datamodel = SQLAInterface(models.TableRollup)
+
+    list_title = _("Rollups")
+    show_title = _("Show Rollup")
+    add_title = _("Add Rollup")
+    edit_title = _("Edit Rollup")
+
+    list_columns = ["groupby", "metrics", "time_grain_sqla", "rowcount", "refreshed_on"]
+    edit_columns = ["table", "groupby", "metrics", "time_column", "time_grain_sqla"]
+    add_columns = edit_columns
+    show_columns = edit_columns + ["rollup_table", "rowcount", "refreshed_on"]
+    description_columns = {
+        "groupby": _(
+            "JSON list of the columns the rollup groups by, e.g. "
+            '["country", "state"]'
+        ),
+        "metrics": _(
+            "JSON list of the metrics the rollup keeps. Only metrics "
+            "aggregating with SUM, COUNT, MIN or MAX can be rolled up"
+        ),
+        "time_grain_sqla": _(
+            "Time grain of the rollup, at most a day, e.g. P1D. Charts at "
+            "this grain or at a coarser one can read the rollup"
+        ),
+        "refreshed_on": _(
+            "When the rollup was last materialized, charts only read rollups "
+            "refreshed recently enough"
+        ),
+    }
+    label_columns = {
+        "table": _("Table"),
+        "groupby": _("Group by"),
+        "metrics": _("Metrics"),
+        "time_column": _("Time Column"),
+        "time_grain_sqla": _("Time Grain"),
+        "rollup_table": _("Rollup Table"),
+        "rowcount": _("Row Count"),
+        "refreshed_on": _("Refreshed On"),
+    }
+
+    add_form_extra_fields = {
+        "table": QuerySelectField(
+            "Table",
+            query_factory=lambda: db.session().query(models.SqlaTable),
+            allow_blank=True,
+            widget=Select2Widget(extra_classes="readonly"),
+        )
+    }
+
+    edit_form_extra_fields = add_form_extra_fields
+
+    def pre_add(self, rollup):
+        rollup.validate()
+
+    def pre_update(self, rollup):
+        rollup.validate()
+
+
+appbuilder.add_view_no_menu(TableRollupInlineView)
+
+
 class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
     datamodel = SQLAInterface(models.SqlaTable)
 
@@ -243,12 +305,13 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
         "default_endpoint",
         "offset",
         "cache_timeout",
+        "stale_cache_timeout",
         "is_sqllab_view",
         "template_params",
     ]
     base_filters = [["id", DatasourceFilter, lambda: []]]
     show_columns = edit_columns + ["perm", "slices"]
-    related_views = [TableColumnInlineView, SqlMetricInlineView]
+    related_views = [TableColumnInlineView, SqlMetricInlineView, TableRollupInlineView]
     base_order = ("changed_on", "desc")
     search_columns = ("database", "schema", "table_name", "owners", "is_sqllab_view")
     description_columns = {
@@ -301,6 +364,12 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
             "A timeout of 0 indicates that the cache never expires. "
             "Note this defaults to the database timeout if undefined."
         ),
+        "stale_cache_timeout": _(
+            "Duration (in seconds) past the caching timeout during which "
+            "charts are still served from the cache while their data is "
+            "refreshed in the background. "
+            "Note this defaults to STALE_CACHE_TIMEOUT if undefined."
+        ),
     }
     label_columns = {
         "slices": _("Associated Charts"),
@@ -314,6 +383,7 @@ class TableModelView(DatasourceModelView, DeleteMixin, YamlExportMixin):  # noqa
         "default_endpoint": _("Default Endpoint"),
         "offset": _("Offset"),
         "cache_timeout": _("Cache Timeout"),
+        "stale_cache_timeout": _("Stale Cache Timeout"),
         "table_name": _("Table Name"),
         "fetch_values_predicate": _("Fetch Values Predicate"),
         "owners": _("Owners"),
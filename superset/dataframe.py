@@ -27,7 +27,6 @@ import logging
 
 import numpy as np
 import pandas as pd
-from pandas.core.common import maybe_box_datetimelike
 from pandas.core.dtypes.dtypes import ExtensionDtype
 
 from superset.utils.core import JS_MAX_INTEGER
@@ -106,22 +105,40 @@ class SupersetDataFrame(object):
 
     @property
     def data(self):
-        # work around for https://github.com/pandas-dev/pandas/issues/18372
-        data = [
-            dict(
-                (k, maybe_box_datetimelike(v))
-                for k, v in zip(self.df.columns, np.atleast_1d(row))
-            )
-            for row in self.df.values
-        ]
-        for d in data:
-            for k, v in list(d.items()):
-                # if an int is too big for Java Script to handle
-                # convert it to a string
-                if isinstance(v, int):
-                    if abs(v) > JS_MAX_INTEGER:
-                        d[k] = str(v)
-        return data
+        """Returns the rows as records
+
+        Values are converted column by column, the records are then zipped
+        out of the converted columns without touching individual values.
+        """
+        names = list(self.df.columns)
+        columns = [self.column_values(self.df[col]) for col in names]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    @staticmethod
+    def column_values(series):
+        """Converts a column to a list of JSON friendly python objects"""
+        values = series.values
+        if series.dtype.kind in ("i", "u"):
+            # if an int is too big for Java Script to handle
+            # convert it to a string
+            too_big = np.abs(values) > JS_MAX_INTEGER
+            if too_big.any():
+                values = values.astype(np.object_)
+                values[too_big] = [str(v) for v in values[too_big]]
+                return list(values)
+            return values.tolist()
+        if series.dtype.kind == "O":
+            return [
+                str(v) if isinstance(v, int) and abs(v) > JS_MAX_INTEGER else v
+                for v in values
+            ]
+        if series.dtype.kind == "M":
+            # much cheaper than boxing each value as a pandas Timestamp
+            return list(series.dt.to_pydatetime())
+        if series.dtype.kind == "m":
+            # pandas Timedeltas, which tolist() would turn into nanoseconds
+            return list(series.astype(object))
+        return values.tolist()
 
     @classmethod
     def db_type(cls, dtype):
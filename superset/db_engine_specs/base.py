@@ -19,12 +19,13 @@ from collections import namedtuple
 import hashlib
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from flask import g
 from flask_babel import lazy_gettext as _
 import pandas as pd
-from sqlalchemy import column, DateTime, select
+from pandas.api.types import is_float_dtype, is_integer_dtype
+from sqlalchemy import column, DateTime, MetaData, select, Table
 from sqlalchemy.engine import create_engine
 from sqlalchemy.engine.reflection import Inspector
 from sqlalchemy.ext.compiler import compiles
@@ -114,6 +115,12 @@ class BaseEngineSpec:
     arraysize = 0
     max_column_name_length = 0
     try_remove_schema_from_table_name = True
+    # whether a cursor can stay open while its rows are streamed to the client
+    allows_cursor_streaming = True
+    # most parameters bound by a multi-row INSERT of uploaded rows
+    max_insert_parameters = 2000
+    # whether csv uploads are loaded by upload_csv(), which can run in a worker
+    allows_async_csv_upload = True
 
     @classmethod
     def get_timestamp_expr(
@@ -253,36 +260,82 @@ class BaseEngineSpec:
         return parsed_query.get_query_with_new_limit(limit)
 
     @staticmethod
-    def csv_to_df(**kwargs) -> pd.DataFrame:
-        """ Read csv into Pandas DataFrame
-        :param kwargs: params to be passed to DataFrame.read_csv
-        :return: Pandas DataFrame containing data from csv
+    def csv_to_chunks(
+        sample_size: int, chunksize: int, **kwargs
+    ) -> Tuple[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """ Read csv into Pandas DataFrames of ``chunksize`` rows, whose column
+        types are inferred from the first ``sample_size`` rows of the file.
+        Columns holding strings or only nulls in the sample are read as strings.
+        :param sample_size: number of rows the column types are inferred from
+        :param chunksize: number of rows per DataFrame
+        :param kwargs: params to be passed to DataFrame.read_csv, with a seekable
+        file object as ``filepath_or_buffer``
+        :return: the sample, and an iterator over the DataFrames of the file
         """
-        kwargs["filepath_or_buffer"] = (
-            config["UPLOAD_FOLDER"] + kwargs["filepath_or_buffer"]
-        )
+        buffer = kwargs["filepath_or_buffer"]
         kwargs["encoding"] = "utf-8"
-        kwargs["iterator"] = True
-        chunks = pd.read_csv(**kwargs)
-        df = pd.concat(chunk for chunk in chunks)
-        return df
+        nrows = kwargs.get("nrows")
+        sample = pd.read_csv(
+            **dict(kwargs, nrows=min(nrows, sample_size) if nrows else sample_size)
+        )
+        buffer.seek(0)
+        kwargs["dtype"] = {
+            col: "object"
+            for col, dtype in sample.dtypes.items()
+            if dtype == object or sample[col].isnull().all()
+        }
+        sample = sample.astype(kwargs["dtype"])
+
+        def conform(chunk: pd.DataFrame) -> pd.DataFrame:
+            for col, dtype in sample.dtypes.items():
+                if col not in chunk or chunk[col].dtype == dtype:
+                    continue
+                values = chunk[col]
+                if is_integer_dtype(dtype) and is_float_dtype(values):
+                    # integers with nulls, which pandas reads as floats
+                    if (values.dropna() % 1 == 0).all():
+                        chunk[col] = [None if pd.isnull(v) else int(v) for v in values]
+                elif is_float_dtype(dtype) and is_integer_dtype(values):
+                    chunk[col] = values.astype(dtype)
+            return chunk
+
+        chunks = pd.read_csv(chunksize=chunksize, **kwargs)
+        return sample, (conform(chunk) for chunk in chunks)
+
+    @classmethod
+    def get_df_insert_method(cls, con: Any = None) -> Optional[Union[str, Callable]]:
+        """ The method DataFrame.to_sql() inserts rows with: "multi" to insert
+        many rows per INSERT statement, None for an executemany of single row
+        INSERTs, or a callable taking the pandas table, connection, column names
+        and row iterator, e.g. for a bulk loading path of the engine.
+        :param con: the engine or connection the rows are inserted through
+        """
+        return "multi"
 
     @classmethod
     def df_to_sql(cls, df: pd.DataFrame, **kwargs):
         """ Upload data from a Pandas DataFrame to a database. For
-        regular engines this calls the DataFrame.to_sql() method. Can be
-        overridden for engines that don't work well with to_sql(), e.g.
-        BigQuery.
+        regular engines this calls the DataFrame.to_sql() method, with the
+        insert method of the engine. Can be overridden for engines that don't
+        work well with to_sql(), e.g. BigQuery.
         :param df: Dataframe with data to be uploaded
         :param kwargs: kwargs to be passed to to_sql() method
         """
-        df.to_sql(**kwargs)
+        method = cls.get_df_insert_method(kwargs.get("con"))
+        if method == "multi":
+            # statements bind one parameter per value
+            columns = len(df.columns)
+            if kwargs.get("index", True):
+                columns += len(df.index.names)
+            kwargs["chunksize"] = max(1, cls.max_insert_parameters // columns)
+        df.to_sql(method=method, **kwargs)
 
-    @classmethod
-    def create_table_from_csv(cls, form, table):
-        """ Create table (including metadata in backend) from contents of a csv.
+    @staticmethod
+    def get_csv_upload_params(form) -> Dict[str, Any]:
+        """ Parameters of the upload of a csv, from the csv upload form
         :param form: Parameters defining how to process data
-        :param table: Metadata of new table to be created
+        :return: the file name, and the kwargs of DataFrame.read_csv() and
+        DataFrame.to_sql()
         """
 
         def _allowed_file(filename: str) -> bool:
@@ -295,33 +348,76 @@ class BaseEngineSpec:
         filename = secure_filename(form.csv_file.data.filename)
         if not _allowed_file(filename):
             raise Exception("Invalid file type selected")
-        csv_to_df_kwargs = {
-            "filepath_or_buffer": filename,
-            "sep": form.sep.data,
-            "header": form.header.data if form.header.data else 0,
-            "index_col": form.index_col.data,
-            "mangle_dupe_cols": form.mangle_dupe_cols.data,
-            "skipinitialspace": form.skipinitialspace.data,
-            "skiprows": form.skiprows.data,
-            "nrows": form.nrows.data,
-            "skip_blank_lines": form.skip_blank_lines.data,
-            "parse_dates": form.parse_dates.data,
-            "infer_datetime_format": form.infer_datetime_format.data,
-            "chunksize": 10000,
-        }
-        df = cls.csv_to_df(**csv_to_df_kwargs)
-
-        df_to_sql_kwargs = {
-            "df": df,
-            "name": form.name.data,
-            "con": create_engine(form.con.data.sqlalchemy_uri_decrypted, echo=False),
-            "schema": form.schema.data,
-            "if_exists": form.if_exists.data,
-            "index": form.index.data,
-            "index_label": form.index_label.data,
-            "chunksize": 10000,
+        return {
+            "filename": filename,
+            "read_csv": {
+                "sep": form.sep.data,
+                "header": form.header.data if form.header.data else 0,
+                "index_col": form.index_col.data,
+                "mangle_dupe_cols": form.mangle_dupe_cols.data,
+                "skipinitialspace": form.skipinitialspace.data,
+                "skiprows": form.skiprows.data,
+                "nrows": form.nrows.data,
+                "skip_blank_lines": form.skip_blank_lines.data,
+                "parse_dates": form.parse_dates.data,
+                "infer_datetime_format": form.infer_datetime_format.data,
+            },
+            "to_sql": {
+                "name": form.name.data,
+                "schema": form.schema.data,
+                "if_exists": form.if_exists.data,
+                "index": form.index.data,
+                "index_label": form.index_label.data,
+            },
         }
-        cls.df_to_sql(**df_to_sql_kwargs)
+
+    @classmethod
+    def upload_csv(
+        cls,
+        database,
+        params: Dict[str, Any],
+        progress: Optional[Callable[[int, int, int], None]] = None,
+    ) -> int:
+        """ Stream an uploaded csv into a table, a chunk of rows at a time. The
+        table is created from the types inferred from a sample of the file, and
+        all the chunks are inserted in a single transaction.
+        :param database: Database to upload the csv to
+        :param params: Parameters of the upload, see get_csv_upload_params()
+        :param progress: called after each chunk with the number of rows
+        inserted, the number of bytes read and the size of the file
+        :return: the number of rows inserted
+        """
+        path = config["UPLOAD_FOLDER"] + params["filename"]
+        size = os.path.getsize(path)
+        rows = 0
+        engine = create_engine(database.sqlalchemy_uri_decrypted, echo=False)
+        try:
+            with open(path, "rb") as csv_file, engine.begin() as con:
+                sample, chunks = cls.csv_to_chunks(
+                    sample_size=config["CSV_UPLOAD_SAMPLE_SIZE"],
+                    chunksize=config["CSV_UPLOAD_CHUNK_SIZE"],
+                    filepath_or_buffer=csv_file,
+                    **params["read_csv"],
+                )
+                to_sql_kwargs = dict(params["to_sql"], con=con)
+                cls.df_to_sql(df=sample.head(0), **to_sql_kwargs)
+                to_sql_kwargs["if_exists"] = "append"
+                for chunk in chunks:
+                    cls.df_to_sql(df=chunk, **to_sql_kwargs)
+                    rows += len(chunk)
+                    if progress:
+                        progress(rows, csv_file.tell(), size)
+        finally:
+            engine.dispose()
+        return rows
+
+    @classmethod
+    def create_table_from_csv(cls, form, table):
+        """ Create table (including metadata in backend) from contents of a csv.
+        :param form: Parameters defining how to process data
+        :param table: Metadata of new table to be created
+        """
+        cls.upload_csv(form.con.data, cls.get_csv_upload_params(form))
 
         table.user_id = g.user.id
         table.schema = form.schema.data
@@ -329,6 +425,16 @@ class BaseEngineSpec:
         db.session.add(table)
         db.session.commit()
 
+    @classmethod
+    def drop_table(cls, engine, table_name: str, schema: Optional[str] = None):
+        """ Drop a table if it exists. The dialect checks that the table exists
+        and quotes its name, as DROP TABLE IF EXISTS isn't supported everywhere.
+        :param engine: SqlAlchemy engine of the database holding the table
+        :param table_name: name of the table to drop
+        :param schema: schema of the table
+        """
+        Table(table_name, MetaData(), schema=schema).drop(engine, checkfirst=True)
+
     @classmethod
     def convert_dttm(cls, target_type, dttm):
         return "'{}'".format(dttm.strftime("%Y-%m-%d %H:%M:%S"))
@@ -18,7 +18,6 @@
 import logging
 import os
 import re
-import time
 from typing import List
 from urllib import parse
 
@@ -34,6 +33,7 @@ from superset import app, conf
 from superset.db_engine_specs.base import BaseEngineSpec
 from superset.db_engine_specs.presto import PrestoEngineSpec
 from superset.utils import core as utils
+from superset.utils.query_progress import QueryProgressPoller
 
 QueryStatus = utils.QueryStatus
 config = app.config
@@ -47,6 +47,8 @@ class HiveEngineSpec(PrestoEngineSpec):
 
     engine = "hive"
     max_column_name_length = 767
+    # csv uploads are copied to S3 by create_table_from_csv()
+    allows_async_csv_upload = False
 
     # Scoping regex at class level to avoid recompiling
     # 17/02/07 19:36:38 INFO ql.Driver: Total jobs = 5
@@ -248,13 +250,13 @@ class HiveEngineSpec(PrestoEngineSpec):
             hive.ttypes.TOperationState.INITIALIZED_STATE,
             hive.ttypes.TOperationState.RUNNING_STATE,
         )
+        poller = QueryProgressPoller(query, session, min_interval=hive_poll_interval)
         polled = cursor.poll()
         last_log_line = 0
         tracking_url = None
         job_id = None
         while polled.operationState in unfinished_states:
-            query = session.query(type(query)).filter_by(id=query.id).one()
-            if query.status == QueryStatus.STOPPED:
+            if poller.is_stopped():
                 cursor.cancel()
                 break
 
@@ -263,10 +265,7 @@ class HiveEngineSpec(PrestoEngineSpec):
                 log_lines = log.splitlines()
                 progress = cls.progress(log_lines)
                 logging.info("Progress total: {}".format(progress))
-                needs_commit = False
-                if progress > query.progress:
-                    query.progress = progress
-                    needs_commit = True
+                poller.set_progress(progress)
                 if not tracking_url:
                     tracking_url = cls.get_tracking_url(log_lines)
                     if tracking_url:
@@ -276,7 +275,7 @@ class HiveEngineSpec(PrestoEngineSpec):
                         logging.info("Transformation applied: {}".format(tracking_url))
                         query.tracking_url = tracking_url
                         logging.info("Job id: {}".format(job_id))
-                        needs_commit = True
+                        poller.commit()
                 if job_id and len(log_lines) > last_log_line:
                     # Wait for job id before logging things out
                     # this allows for prefixing all log lines and becoming
@@ -284,9 +283,7 @@ class HiveEngineSpec(PrestoEngineSpec):
                     for l in log_lines[last_log_line:]:
                         logging.info("[{}] {}".format(job_id, l))
                     last_log_line = len(log_lines)
-                if needs_commit:
-                    session.commit()
-            time.sleep(hive_poll_interval)
+            poller.sleep()
             polled = cursor.poll()
 
     @classmethod
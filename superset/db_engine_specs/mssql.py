@@ -27,6 +27,8 @@ class MssqlEngineSpec(BaseEngineSpec):
     epoch_to_dttm = "dateadd(S, {col}, '1970-01-01')"
     limit_method = LimitMethod.WRAP_SQL
     max_column_name_length = 128
+    # INSERT statements take at most 1000 rows of values
+    max_insert_parameters = 1000
 
     _time_grain_functions = {
         None: "{col}",
@@ -42,3 +42,8 @@ class OracleEngineSpec(PostgresBaseEngineSpec):
         return ("""TO_TIMESTAMP('{}', 'YYYY-MM-DD"T"HH24:MI:SS.ff6')""").format(
             dttm.isoformat()
         )
+
+    @classmethod
+    def get_df_insert_method(cls, con=None):
+        # INSERT statements take a single row of VALUES
+        return None
@@ -15,6 +15,9 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+import csv
+import io
+
 from superset.db_engine_specs.base import BaseEngineSpec, LimitMethod
 
 
@@ -63,3 +66,24 @@ class PostgresEngineSpec(PostgresBaseEngineSpec):
         tables = inspector.get_table_names(schema)
         tables.extend(inspector.get_foreign_table_names(schema))
         return sorted(tables)
+
+    @classmethod
+    def get_df_insert_method(cls, con=None):
+        # COPY goes through the copy_expert of psycopg2 cursors
+        if con is not None and con.dialect.driver == "psycopg2":
+            return cls.copy_rows
+        return "multi"
+
+    @staticmethod
+    def copy_rows(table, con, keys, data_iter):
+        """Insert the rows of a DataFrame with COPY, the bulk load of Postgres"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(data_iter)
+        buffer.seek(0)
+        quote = con.dialect.identifier_preparer.quote
+        name = quote(table.name)
+        if table.schema:
+            name = f"{quote(table.schema)}.{name}"
+        columns = ", ".join(quote(key) for key in keys)
+        with con.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {name} ({columns}) FROM STDIN WITH CSV", buffer)
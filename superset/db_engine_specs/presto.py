@@ -20,7 +20,6 @@ from distutils.version import StrictVersion
 import logging
 import re
 import textwrap
-import time
 from typing import List, Set, Tuple
 from urllib import parse
 
@@ -34,6 +33,7 @@ from superset.db_engine_specs.base import BaseEngineSpec
 from superset.exceptions import SupersetTemplateException
 from superset.models.sql_types.presto_sql_types import type_map as presto_type_map
 from superset.utils import core as utils
+from superset.utils.query_progress import QueryProgressPoller
 
 QueryStatus = utils.QueryStatus
 
@@ -814,6 +814,7 @@ class PrestoEngineSpec(BaseEngineSpec):
     def handle_cursor(cls, cursor, query, session):
         """Updates progress information"""
         logging.info("Polling the cursor for progress")
+        poller = QueryProgressPoller(query, session)
         polled = cursor.poll()
         # poll returns dict -- JSON status information or ``None``
         # if the query is done
@@ -823,8 +824,7 @@ class PrestoEngineSpec(BaseEngineSpec):
             # Update the object and wait for the kill signal.
             stats = polled.get("stats", {})
 
-            query = session.query(type(query)).filter_by(id=query.id).one()
-            if query.status in [QueryStatus.STOPPED, QueryStatus.TIMED_OUT]:
+            if poller.is_stopped():
                 cursor.cancel()
                 break
 
@@ -843,10 +843,8 @@ class PrestoEngineSpec(BaseEngineSpec):
                         "Query progress: {} / {} "
                         "splits".format(completed_splits, total_splits)
                     )
-                    if progress > query.progress:
-                        query.progress = progress
-                    session.commit()
-            time.sleep(1)
+                    poller.set_progress(progress)
+            poller.sleep()
             logging.info("Polling the cursor for progress")
             polled = cursor.poll()
 
@@ -23,6 +23,8 @@ from superset.utils import core as utils
 
 class SqliteEngineSpec(BaseEngineSpec):
     engine = "sqlite"
+    # an open read cursor locks the whole database file for writers
+    allows_cursor_streaming = False
 
     _time_grain_functions = {
         None: "{col}",
@@ -41,6 +43,11 @@ class SqliteEngineSpec(BaseEngineSpec):
     def epoch_to_dttm(cls):
         return "datetime({col}, 'unixepoch')"
 
+    @classmethod
+    def get_df_insert_method(cls, con=None):
+        # executemany runs a prepared INSERT, faster than multi-row VALUES
+        return None
+
     @classmethod
     def get_all_datasource_names(
         cls, db, datasource_type: str
@@ -58,3 +58,7 @@ class SpatialException(SupersetException):
 
 class DatabaseNotFound(SupersetException):
     status = 400
+
+
+class CacheCodecException(SupersetException):
+    pass
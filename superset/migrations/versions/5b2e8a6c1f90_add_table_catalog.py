@@ -0,0 +1,54 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Add table_catalog
+
+Revision ID: 5b2e8a6c1f90
+Revises: 3c9f2d7a41e5
+Create Date: 2026-10-17 23:48:12.417093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5b2e8a6c1f90"
+down_revision = "3c9f2d7a41e5"
+
+
+def upgrade():
+    op.create_table(
+        "table_catalog",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("database_id", sa.Integer(), nullable=False),
+        sa.Column("schema", sa.String(length=255), nullable=True),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("type", sa.String(length=16), nullable=False),
+        sa.Column("added_on", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["database_id"], ["dbs.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_table_catalog_database_id_name",
+        "table_catalog",
+        ["database_id", "name"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_table_catalog_database_id_name", table_name="table_catalog")
+    op.drop_table("table_catalog")
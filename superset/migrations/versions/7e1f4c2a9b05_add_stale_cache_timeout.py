@@ -0,0 +1,43 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Add stale_cache_timeout to datasources
+
+Revision ID: 7e1f4c2a9b05
+Revises: def97f26fdfb
+Create Date: 2026-10-17 21:20:14.512367
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7e1f4c2a9b05"
+down_revision = "def97f26fdfb"
+
+
+def upgrade():
+    for table in ("tables", "datasources"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column("stale_cache_timeout", sa.Integer(), nullable=True)
+            )
+
+
+def downgrade():
+    for table in ("tables", "datasources"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("stale_cache_timeout")
@@ -0,0 +1,43 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Add version to tables and dbs
+
+Revision ID: a4e6b1c9d2f3
+Revises: 5b2e8a6c1f90
+Create Date: 2026-10-17 23:12:40.361458
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a4e6b1c9d2f3"
+down_revision = "5b2e8a6c1f90"
+
+
+def upgrade():
+    for table in ("tables", "dbs"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column("version", sa.Integer(), nullable=True, server_default="0")
+            )
+
+
+def downgrade():
+    for table in ("tables", "dbs"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("version")
@@ -18,3 +18,4 @@ from . import core  # noqa
 from . import sql_lab  # noqa
 from . import user_attributes  # noqa
 from . import schedules  # noqa
+from . import catalog  # noqa
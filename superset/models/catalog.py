@@ -0,0 +1,225 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""A persistent catalog of the tables and views of databases
+
+SQL Lab searches the catalog instead of listing the tables of a database on
+each keystroke. The catalog of a database is refreshed by a Celery task,
+which only writes the tables and views added or dropped since the last
+refresh.
+"""
+from datetime import datetime
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from flask_appbuilder import Model
+from sqlalchemy import and_, case, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import backref, relationship
+
+from superset.utils.core import DatasourceName
+
+TABLE = "table"
+VIEW = "view"
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class CatalogEntry(Model):
+
+    """A table or view of a database, as of the last refresh of its catalog"""
+
+    __tablename__ = "table_catalog"
+    __table_args__ = (
+        Index("ix_table_catalog_database_id_name", "database_id", "name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    database_id = Column(Integer, ForeignKey("dbs.id"), nullable=False)
+    database = relationship(
+        "Database",
+        backref=backref(
+            "catalog_entries", lazy="dynamic", cascade="all, delete-orphan"
+        ),
+        foreign_keys=[database_id],
+    )
+    schema = Column(String(255))
+    name = Column(String(255), nullable=False)
+    type = Column(String(16), nullable=False)
+    added_on = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def datasource_name(self) -> DatasourceName:
+        return DatasourceName(table=self.name, schema=self.schema)
+
+    @classmethod
+    def has_catalog(cls, session, database) -> bool:
+        """Whether the catalog of the database was refreshed at least once"""
+        query = session.query(cls.id).filter(cls.database_id == database.id)
+        return session.query(query.exists()).scalar()
+
+    @classmethod
+    def search(
+        cls,
+        session,
+        database,
+        substr: Optional[str] = None,
+        schema: Optional[str] = None,
+        schemas: Optional[List[str]] = None,
+        names: Optional[Set[Tuple[Optional[str], str]]] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, List["CatalogEntry"]]:
+        """
+        Searches the catalog of a database, tables whose name starts with
+        `substr` first, then the ones containing it.
+
+        Tables starting with `substr` are looked up in the index on the names.
+        The catalog is only scanned for the tables containing it when these
+        don't fill the page, so the count is the number of tables starting
+        with `substr` when they do.
+
+        A `substr` with a dot matches schema and table names on either side.
+
+        :param schema: only return the entries of this schema
+        :param schemas: only return the entries of these schemas
+        :param names: only return the entries of these (schema, name), a None
+            schema standing for the default schema of the database
+        :returns: the number of matching entries, and the page of them
+        """
+        query = session.query(cls).filter(cls.database_id == database.id)
+        if schema:
+            query = query.filter(cls.schema == schema)
+        if schemas is not None:
+            query = query.filter(cls.schema.in_(schemas))
+        if names is not None:
+            granted_names = names
+            default_schema = None
+            if any(name_schema is None for name_schema, _ in names):
+                default_schema = database.inspector.default_schema_name
+
+            def granted(entry: CatalogEntry) -> bool:
+                # a table registered without a schema is in the default one,
+                # any of them when the dialect doesn't tell it, e.g. SQLite
+                return (entry.schema, entry.name) in granted_names or (
+                    (None, entry.name) in granted_names
+                    and default_schema in (None, entry.schema)
+                )
+
+            # the few tables a user was granted access to, by name
+            tables = {name for _, name in names}
+            query = query.filter(cls.name.in_(tables or [""]))
+
+        prefix = substr
+        if substr and "." in substr and not schema:
+            schema_part, prefix = substr.rsplit(".", 1)
+            query = query.filter(
+                cls.schema.like("%" + escape_like(schema_part), escape="\\")
+            )
+        order = [cls.type, cls.schema, cls.name]
+        if prefix:
+            # a range of names the index answers, narrowed by LIKE for
+            # collations where the range holds more
+            starts = and_(
+                cls.name >= prefix,
+                cls.name < prefix[:-1] + chr(ord(prefix[-1]) + 1),
+                cls.name.like(escape_like(prefix) + "%", escape="\\"),
+            )
+            contains = cls.name.like("%" + escape_like(prefix) + "%", escape="\\")
+
+        if names is not None:
+            if prefix:
+                query = query.filter(contains)
+                order.insert(0, case([(starts, 0)], else_=1))
+            matches = [e for e in query.order_by(*order) if granted(e)]
+            return len(matches), matches[offset : offset + limit if limit else None]
+        if not prefix:
+            count = query.count()
+            return count, query.order_by(*order).offset(offset).limit(limit).all()
+
+        prefix_query = query.filter(starts)
+        prefix_count = prefix_query.count()
+        entries: List[CatalogEntry] = []
+        if offset < prefix_count:
+            entries = prefix_query.order_by(*order).offset(offset).limit(limit).all()
+        if limit and prefix_count >= offset + limit:
+            return prefix_count, entries
+
+        # too few tables start with the search to fill the page
+        contains_query = query.filter(contains, ~starts)
+        entries += (
+            contains_query.order_by(*order)
+            .offset(max(offset - prefix_count, 0))
+            .limit(limit - len(entries) if limit else None)
+            .all()
+        )
+        return prefix_count + contains_query.count(), entries
+
+    @classmethod
+    def refresh(cls, session, database) -> Dict[str, int]:
+        """
+        Brings the catalog of a database up to date with its tables and views
+
+        Schemas that fail to list keep their previous entries. Each schema is
+        committed on its own.
+
+        :returns: the number of entries added and removed
+        """
+        counts = {"added": 0, "removed": 0}
+        schemas = database.get_all_schema_names(cache=False) or []
+        now = datetime.utcnow()
+        for schema in schemas:
+            tables = database.get_all_table_names_in_schema(schema=schema, cache=False)
+            views = database.get_all_view_names_in_schema(schema=schema, cache=False)
+            if tables is None or views is None:
+                logging.warning(f"Could not list the tables of {database}.{schema}")
+                continue
+            current = {(TABLE, t.table) for t in tables}
+            current |= {(VIEW, v.table) for v in views}
+            entries = (
+                session.query(cls)
+                .filter(cls.database_id == database.id, cls.schema == schema)
+                .all()
+            )
+            known = set()
+            for entry in entries:
+                if (entry.type, entry.name) in current:
+                    known.add((entry.type, entry.name))
+                else:
+                    session.delete(entry)
+                    counts["removed"] += 1
+            for type_, name in sorted(current - known):
+                session.add(
+                    cls(
+                        database_id=database.id,
+                        schema=schema,
+                        name=name,
+                        type=type_,
+                        added_on=now,
+                    )
+                )
+                counts["added"] += 1
+            session.commit()
+
+        # dropped schemas
+        dropped = session.query(cls).filter(cls.database_id == database.id)
+        if schemas:
+            dropped = dropped.filter(~cls.schema.in_(schemas))
+        counts["removed"] += dropped.delete(synchronize_session=False)
+        session.commit()
+        return counts
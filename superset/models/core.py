@@ -16,7 +16,7 @@
 # under the License.
 # pylint: disable=C,R,W
 """A collection of ORM sqlalchemy models for Superset"""
-from contextlib import closing
+from contextlib import closing, contextmanager
 from copy import copy, deepcopy
 from datetime import datetime
 import json
@@ -49,6 +49,7 @@ from sqlalchemy.orm import relationship, sessionmaker, subqueryload
 from sqlalchemy.orm.session import make_transient
 from sqlalchemy.pool import NullPool
 from sqlalchemy.schema import UniqueConstraint
+from sqlalchemy.sql import literal_column
 from sqlalchemy_utils import EncryptedType
 import sqlparse
 
@@ -58,7 +59,7 @@ from superset.legacy import update_time_range
 from superset.models.helpers import AuditMixinNullable, ImportMixin
 from superset.models.tags import ChartUpdater, DashboardUpdater, FavStarUpdater
 from superset.models.user_attributes import UserAttribute
-from superset.utils import cache as cache_util, core as utils
+from superset.utils import cache as cache_util, core as utils, engine_pools
 from superset.viz import viz_types
 from urllib import parse  # noqa
 
@@ -71,6 +72,13 @@ metadata = Model.metadata  # pylint: disable=no-member
 PASSWORD_MASK = "X" * 10
 
 
+def dispose_engine(engine):
+    """Closes the connections of an engine evicted from the engine cache,
+    unless it's shared with other databases objects by `engine_pools`"""
+    if not engine_pools.is_shared(engine):
+        engine.dispose()
+
+
 def set_related_perm(mapper, connection, target):  # noqa
     src_class = target.cls_model
     id_ = target.datasource_id
@@ -750,6 +758,8 @@ class Database(Model, AuditMixinNullable, ImportMixin):
     )
     perm = Column(String(1000))
     impersonate_user = Column(Boolean, default=False)
+    # bumped on every change, versioning the cached snapshots of its tables
+    version = Column(Integer, default=0, onupdate=literal_column("version") + 1)
     export_fields = (
         "database_name",
         "sqlalchemy_uri",
@@ -860,8 +870,21 @@ class Database(Model, AuditMixinNullable, ImportMixin):
                 effective_username = g.user.username
         return effective_username
 
-    @utils.memoized(watch=("impersonate_user", "sqlalchemy_uri_decrypted", "extra"))
-    def get_sqla_engine(self, schema=None, nullpool=True, user_name=None, source=None):
+    @utils.memoized(
+        watch=("impersonate_user", "sqlalchemy_uri_decrypted", "extra"),
+        maxsize=config.get("SQLA_ENGINE_CACHE_SIZE"),
+        ttl=config.get("SQLA_ENGINE_CACHE_TTL"),
+        on_evict=dispose_engine,
+        stats_logger=stats_logger,
+        stats_prefix="engine_cache",
+    )
+    def get_sqla_engine(self, schema=None, nullpool=None, user_name=None, source=None):
+        """Returns the engine used to connect to the database
+
+        Unless ``nullpool`` is set explicitly, databases with an ``engine_pool``
+        in their extra get an engine shared across requests, with a pool of
+        connections per effective user. Other engines don't pool connections.
+        """
         extra = self.get_extra()
         url = make_url(self.sqlalchemy_uri_decrypted)
         url = self.db_engine_spec.adjust_database_uri(url, schema)
@@ -877,7 +900,11 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         logging.info("Database.get_sqla_engine(). Masked URL: {0}".format(masked_url))
 
         params = extra.get("engine_params", {})
-        if nullpool:
+        pool_params = extra.get("engine_pool") if nullpool is None else None
+        pooled = pool_params is not None and self.id is not None
+        if pooled:
+            params.update(pool_params)
+        elif nullpool is not False:
             params["poolclass"] = NullPool
 
         # If using Hive, this will set hive.server2.proxy.user=$effective_username
@@ -897,6 +924,14 @@ class Database(Model, AuditMixinNullable, ImportMixin):
             url, params = DB_CONNECTION_MUTATOR(
                 url, params, effective_username, security_manager, source
             )
+        if pooled:
+            return engine_pools.get_engine(
+                (self.id, effective_username, schema),
+                url,
+                params,
+                stats_logger=stats_logger,
+                stats_prefix="engine_pool.{}".format(self.id),
+            )
         return create_engine(url, **params)
 
     def get_reserved_words(self):
@@ -905,8 +940,11 @@ class Database(Model, AuditMixinNullable, ImportMixin):
     def get_quoter(self):
         return self.get_dialect().identifier_preparer.quote
 
-    def get_df(self, sql, schema, mutator=None):
-        sqls = [str(s).strip().strip(";") for s in sqlparse.parse(sql)]
+    @contextmanager
+    def _execute_sql(self, sql, schema):
+        """Runs all the statements in ``sql`` and yields the cursor of the last one"""
+        statements = sqlparse.parse(sql)
+        sqls = [str(s).strip().strip(";") for s in statements]
         source_key = None
         if request and request.referrer:
             if "/superset/dashboard/" in request.referrer:
@@ -918,18 +956,13 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         )
         username = utils.get_username()
 
-        def needs_conversion(df_series):
-            if df_series.empty:
-                return False
-            if isinstance(df_series[0], (list, dict)):
-                return True
-            return False
-
         def _log_query(sql):
             if log_query:
                 log_query(engine.url, sql, schema, username, __name__, security_manager)
 
         with closing(engine.raw_connection()) as conn:
+            if any(s.get_type() != "SELECT" for s in statements):
+                engine_pools.mark_session_changed(conn)
             with closing(conn.cursor()) as cursor:
                 for sql in sqls[:-1]:
                     _log_query(sql)
@@ -938,23 +971,66 @@ class Database(Model, AuditMixinNullable, ImportMixin):
 
                 _log_query(sqls[-1])
                 self.db_engine_spec.execute(cursor, sqls[-1])
+                yield cursor
 
-                if cursor.description is not None:
-                    columns = [col_desc[0] for col_desc in cursor.description]
-                else:
-                    columns = []
+    @staticmethod
+    def _cursor_columns(cursor):
+        if cursor.description is not None:
+            return [col_desc[0] for col_desc in cursor.description]
+        return []
 
+    @staticmethod
+    def _stringify_nested_values(df):
+        def needs_conversion(df_series):
+            if df_series.empty:
+                return False
+            if isinstance(df_series[0], (list, dict)):
+                return True
+            return False
+
+        for k, v in df.dtypes.items():
+            if v.type == numpy.object_ and needs_conversion(df[k]):
+                df[k] = df[k].apply(utils.json_dumps_w_dates)
+        return df
+
+    def get_df(self, sql, schema, mutator=None):
+        with self._execute_sql(sql, schema) as cursor:
+            df = pd.DataFrame.from_records(
+                data=list(cursor.fetchall()),
+                columns=self._cursor_columns(cursor),
+                coerce_float=True,
+            )
+
+            if mutator:
+                df = mutator(df)
+
+            return self._stringify_nested_values(df)
+
+    def get_df_chunks(self, sql, schema, chunksize, mutator=None):
+        """Same as ``get_df``, but yields dataframes of at most ``chunksize`` rows
+
+        Rows are fetched from the cursor as the chunks are consumed, so that
+        memory usage is bounded by the chunk size, not by the size of the
+        result set. At least one, possibly empty, dataframe is always yielded.
+        """
+        if not self.db_engine_spec.allows_cursor_streaming:
+            yield from utils.df_chunks(self.get_df(sql, schema, mutator), chunksize)
+            return
+
+        with self._execute_sql(sql, schema) as cursor:
+            columns = self._cursor_columns(cursor)
+            is_first = True
+            while True:
+                rows = cursor.fetchmany(chunksize) if columns else []
+                if not rows and not is_first:
+                    break
+                is_first = False
                 df = pd.DataFrame.from_records(
-                    data=list(cursor.fetchall()), columns=columns, coerce_float=True
+                    data=list(rows), columns=columns, coerce_float=True
                 )
-
                 if mutator:
                     df = mutator(df)
-
-                for k, v in df.dtypes.items():
-                    if v.type == numpy.object_ and needs_conversion(df[k]):
-                        df[k] = df[k].apply(utils.json_dumps_w_dates)
-                return df
+                yield self._stringify_nested_values(df)
 
     def compile_sqla_query(self, qry, schema=None):
         engine = self.get_sqla_engine(schema=schema)
@@ -37,6 +37,7 @@ from sqlalchemy.orm import backref, relationship
 from superset import security_manager
 from superset.models.helpers import AuditMixinNullable, ExtraJSONMixin
 from superset.models.tags import QueryUpdater
+from superset.sql_parse import ParsedQuery
 from superset.utils.core import QueryStatus, user_label
 
 
@@ -126,6 +127,14 @@ class Query(Model, ExtraJSONMixin):
             "extra": self.extra,
         }
 
+    @property
+    def tables(self):
+        """The names of the tables the SQL reads, as analyzed when it was run"""
+        tables = self.extra.get("tables")
+        if tables is None:
+            tables = sorted(ParsedQuery(self.sql).tables)
+        return tables
+
     @property
     def name(self):
         """Name property"""
@@ -17,9 +17,21 @@
 # pylint: disable=C,R,W
 """A set of constants and methods to manage permissions and security"""
 import logging
-from typing import Callable, List, Optional, Set, Tuple, TYPE_CHECKING, Union
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+    Union,
+)
+import uuid
 
-from flask import current_app, g
+from flask import current_app, g, has_app_context
 from flask_appbuilder import Model
 from flask_appbuilder.security.sqla import models as ab_models
 from flask_appbuilder.security.sqla.manager import SecurityManager
@@ -30,8 +42,9 @@ from flask_appbuilder.security.views import (
     UserModelView,
 )
 from flask_appbuilder.widgets import ListWidget
-from sqlalchemy import or_
+from sqlalchemy import event, or_
 from sqlalchemy.engine.base import Connection
+from sqlalchemy.orm import object_session, Session
 from sqlalchemy.orm.mapper import Mapper
 
 from superset import sql_parse
@@ -131,6 +144,152 @@ class SupersetSecurityManager(SecurityManager):
 
     ACCESSIBLE_PERMS = {"can_userinfo"}
 
+    PERMISSIONS_VERSION_KEY = "security/permissions_version"
+
+    def __init__(self, appbuilder):
+        super().__init__(appbuilder)
+        self._permissions_version = uuid.uuid4().hex
+        models = (
+            self.role_model,
+            self.permission_model,
+            self.viewmenu_model,
+            self.permissionview_model,
+        )
+        for model in models:
+            for name in ("after_insert", "after_update", "after_delete"):
+                event.listen(model, name, self._on_permissions_change)
+        event.listen(Session, "after_commit", self._on_commit)
+
+    def _on_permissions_change(
+        self, mapper: Mapper, connection: Connection, target: Model
+    ) -> None:
+        session = object_session(target)
+        if session is not None:
+            session.info["permissions_changed"] = True
+
+    def _on_commit(self, session: Session) -> None:
+        if session.info.pop("permissions_changed", False):
+            self.bump_permissions_version()
+
+    @property
+    def permissions_index_timeout(self) -> int:
+        """
+        How long permission indexes and their version are cached. Processes that
+        don't share the cache of the process changing permissions see the change
+        once their version expires.
+        """
+
+        return current_app.config["PERMISSIONS_INDEX_TIMEOUT"]
+
+    def get_permissions_version(self) -> str:
+        """
+        Return the version of the roles and permissions, shared by the processes
+        using the same cache.
+
+        :returns: The roles and permissions version
+        """
+
+        from superset import cache
+
+        if not cache:
+            return self._permissions_version
+        try:
+            version = cache.get(self.PERMISSIONS_VERSION_KEY)
+            if version is None:
+                cache.add(
+                    self.PERMISSIONS_VERSION_KEY,
+                    uuid.uuid4().hex,
+                    timeout=self.permissions_index_timeout,
+                )
+                version = cache.get(self.PERMISSIONS_VERSION_KEY)
+        except Exception as e:
+            logging.exception(e)
+            version = None
+        return version or self._permissions_version
+
+    def bump_permissions_version(self) -> None:
+        """
+        Invalidate the permission indexes, once roles or permissions changed.
+        """
+
+        from superset import cache
+
+        self._permissions_version = uuid.uuid4().hex
+        if has_app_context():
+            g.pop("permissions_version", None)
+            g.pop("permissions_indexes", None)
+        if cache:
+            try:
+                cache.set(
+                    self.PERMISSIONS_VERSION_KEY,
+                    self._permissions_version,
+                    timeout=self.permissions_index_timeout,
+                )
+            except Exception as e:
+                logging.exception(e)
+
+    def get_permissions_index(self, user) -> Dict[str, FrozenSet[str]]:
+        """
+        Return the view-menu names of each FAB permission granted to the user by
+        the roles stored in the database.
+
+        The index of each set of roles is cached until roles or permissions
+        change, or for PERMISSIONS_INDEX_TIMEOUT seconds at most. The index and
+        its version are memoized for the duration of the request, so that only
+        the first check of a request reads the cache.
+
+        :param user: The FAB user
+        :returns: The set of view-menu names by permission name
+        """
+
+        from superset import cache
+
+        role_ids = sorted(
+            role.id for role in user.roles if role.name not in self.builtin_roles
+        )
+        roles = ",".join(str(i) for i in role_ids)
+        indexes = g.setdefault("permissions_indexes", {})
+        if roles in indexes:
+            return indexes[roles]
+
+        if "permissions_version" not in g:
+            g.permissions_version = self.get_permissions_version()
+        key = "security/permissions_index/{}/{}".format(g.permissions_version, roles)
+        index = None
+        if cache:
+            try:
+                index = cache.get(key)
+            except Exception as e:
+                logging.exception(e)
+        if index is None:
+            index = self._build_permissions_index(role_ids)
+            if cache:
+                try:
+                    cache.set(key, index, timeout=self.permissions_index_timeout)
+                except Exception as e:
+                    logging.exception(e)
+        indexes[roles] = index
+        return index
+
+    def _build_permissions_index(
+        self, role_ids: List[int]
+    ) -> Dict[str, FrozenSet[str]]:
+        index: Dict[str, Set[str]] = {}
+        if role_ids:
+            rows = (
+                self.get_session.query(
+                    self.permission_model.name, self.viewmenu_model.name
+                )
+                .join(self.permissionview_model.permission)
+                .join(self.permissionview_model.view_menu)
+                .join(self.permissionview_model.role)
+                .filter(self.role_model.id.in_(role_ids))
+                .distinct()
+            )
+            for permission_name, view_menu_name in rows:
+                index.setdefault(permission_name, set()).add(view_menu_name)
+        return {name: frozenset(views) for name, views in index.items()}
+
     def get_schema_perm(
         self, database: Union["Database", str], schema: Optional[str] = None
     ) -> Optional[str]:
@@ -163,7 +322,13 @@ class SupersetSecurityManager(SecurityManager):
         user = g.user
         if user.is_anonymous:
             return self.is_item_public(permission_name, view_name)
-        return self._has_view_access(user, permission_name, view_name)
+        for role in user.roles:
+            if role.name in self.builtin_roles and self._has_access_builtin_roles(
+                role, permission_name, view_name
+            ):
+                return True
+        index = self.get_permissions_index(user)
+        return view_name in index.get(permission_name, ())
 
     def can_only_access_owned_queries(self) -> bool:
         """
@@ -357,7 +522,13 @@ class SupersetSecurityManager(SecurityManager):
             database, table_name, schema=table_schema
         )
 
-    def rejected_tables(self, sql: str, database: "Database", schema: str) -> List[str]:
+    def rejected_tables(
+        self,
+        sql: str,
+        database: "Database",
+        schema: str,
+        tables: Optional[Iterable[str]] = None,
+    ) -> List[str]:
         """
         Return the list of rejected SQL table names.
 
@@ -366,14 +537,16 @@ class SupersetSecurityManager(SecurityManager):
         :param sql: The SQL statement
         :param database: The SQL database
         :param schema: The SQL database schema
+        :param tables: The table names of the SQL statement, if already known
         :returns: The rejected table names
         """
 
-        superset_query = sql_parse.ParsedQuery(sql)
+        if tables is None:
+            tables = sql_parse.ParsedQuery(sql).tables
 
         return [
             t
-            for t in superset_query.tables
+            for t in tables
             if not self._datasource_access_by_fullname(database, t, schema)
         ]
 
@@ -384,12 +557,7 @@ class SupersetSecurityManager(SecurityManager):
         :returns: The set of FAB permission view-menu names
         """
 
-        datasource_perms = set()
-        for r in g.user.roles:
-            for perm in r.permissions:
-                if perm.permission and "datasource_access" == perm.permission.name:
-                    datasource_perms.add(perm.view_menu.name)
-        return datasource_perms
+        return set(self.get_permissions_index(g.user).get("datasource_access", ()))
 
     def schemas_accessible_by_user(
         self, database: "Database", schemas: List[str], hierarchical: bool = True
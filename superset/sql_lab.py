@@ -24,7 +24,6 @@ import uuid
 from celery.exceptions import SoftTimeLimitExceeded
 from contextlib2 import contextmanager
 from flask_babel import lazy_gettext as _
-import simplejson as json
 import sqlalchemy
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
@@ -33,7 +32,8 @@ from superset import app, dataframe, db, results_backend, security_manager
 from superset.models.sql_lab import Query
 from superset.sql_parse import ParsedQuery
 from superset.tasks.celery_app import app as celery_app
-from superset.utils.core import json_iso_dttm_ser, QueryStatus, sources, zlib_compress
+from superset.utils import paged_results
+from superset.utils.core import QueryStatus, sources
 from superset.utils.dates import now_as_float
 from superset.utils.decorators import stats_timing
 
@@ -322,13 +322,16 @@ def execute_sql_statements(
         key = str(uuid.uuid4())
         logging.info(f"Storing results in results backend, key: {key}")
         with stats_timing("sqllab.query.results_backend_write", stats_logger):
-            json_payload = json.dumps(
-                payload, default=json_iso_dttm_ser, ignore_nan=True
-            )
             cache_timeout = database.cache_timeout
             if cache_timeout is None:
                 cache_timeout = config.get("CACHE_DEFAULT_TIMEOUT", 0)
-            results_backend.set(key, zlib_compress(json_payload), cache_timeout)
+            paged_results.store_results(
+                results_backend,
+                key,
+                payload,
+                page_size=config.get("RESULTS_BACKEND_PAGE_SIZE"),
+                timeout=cache_timeout,
+            )
         query.results_key = key
 
     query.status = QueryStatus.SUCCESS
@@ -15,33 +15,72 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+import hashlib
 import logging
-from typing import Optional
+from typing import FrozenSet, NamedTuple, Optional, Set
 
 import sqlparse
 from sqlparse.sql import Identifier, IdentifierList, remove_quotes, Token, TokenList
 from sqlparse.tokens import Keyword, Name, Punctuation, String, Whitespace
 from sqlparse.utils import imt
 
+from superset.utils.core import memoized
+
 RESULT_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT", "SELECT"}
 ON_KEYWORD = "ON"
 PRECEDES_TABLE_NAME = {"FROM", "JOIN", "DESCRIBE", "WITH", "LEFT JOIN", "RIGHT JOIN"}
 CTE_PREFIX = "CTE__"
 
+# number of SQL texts whose analysis is kept
+PARSE_CACHE_SIZE = 512
+
+
+class SqlAnalysis(NamedTuple):
+    """What `ParsedQuery` extracts from a SQL text, shared by its instances"""
+
+    tables: FrozenSet[str]
+    limit: Optional[int]
+    statement_type: Optional[str]
+
 
 class ParsedQuery(object):
+    # only set while analyzing a query, see `analyze`
+    _alias_names: Set[str]
+
     def __init__(self, sql_statement):
         self.sql = sql_statement
-        self._table_names = set()
-        self._alias_names = set()
-        self._limit = None
+        self._parsed_statements = None
+        analysis = get_analysis(self.stripped())
+        self._table_names = analysis.tables
+        self._limit = analysis.limit
+        self._statement_type = analysis.statement_type
+
+    @classmethod
+    def analyze(cls, sql: str) -> SqlAnalysis:
+        """Parses a stripped SQL text, use `get_analysis` to cache the result"""
+        query = cls.__new__(cls)
+        query.sql = sql
+        query._table_names = set()
+        query._alias_names = set()
+        query._limit = None
+
+        logging.info("Parsing with sqlparse statement {}".format(sql))
+        query._parsed_statements = sqlparse.parse(sql)
+        for statement in query._parsed:
+            query.__extract_from_token(statement)
+            query._limit = query._extract_limit_from_query(statement)
+        return SqlAnalysis(
+            tables=frozenset(query._table_names - query._alias_names),
+            limit=query._limit,
+            statement_type=query._parsed[0].get_type() if query._parsed else None,
+        )
 
-        logging.info("Parsing with sqlparse statement {}".format(self.sql))
-        self._parsed = sqlparse.parse(self.stripped())
-        for statement in self._parsed:
-            self.__extract_from_token(statement)
-            self._limit = self._extract_limit_from_query(statement)
-        self._table_names = self._table_names - self._alias_names
+    @property
+    def _parsed(self):
+        # the parse tree isn't cached: it is large, and rarely needed
+        if self._parsed_statements is None:
+            self._parsed_statements = sqlparse.parse(self.stripped())
+        return self._parsed_statements
 
     @property
     def tables(self):
@@ -52,7 +91,7 @@ class ParsedQuery(object):
         return self._limit
 
     def is_select(self):
-        return self._parsed[0].get_type() == "SELECT"
+        return self._statement_type == "SELECT"
 
     def is_explain(self):
         return self.stripped().upper().startswith("EXPLAIN")
@@ -211,3 +250,13 @@ class ParsedQuery(object):
         for i in statement.tokens:
             str_res += str(i.value)
         return str_res
+
+
+def sql_digest(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+@memoized(maxsize=PARSE_CACHE_SIZE, key=sql_digest)
+def get_analysis(sql: str) -> SqlAnalysis:
+    """`ParsedQuery.analyze`, caching the analyses of the most recent texts"""
+    return ParsedQuery.analyze(sql)
@@ -42,7 +42,7 @@ class BaseStatsLogger(object):
     def timing(self, key, value):
         raise NotImplementedError()
 
-    def gauge(self, key):
+    def gauge(self, key, value):
         """Setup a gauge"""
         raise NotImplementedError()
 
@@ -97,9 +97,8 @@ try:
         def timing(self, key, value):
             self.client.timing(key, value)
 
-        def gauge(self, key):
-            # pylint: disable=no-value-for-parameter
-            self.client.gauge(key)
+        def gauge(self, key, value):
+            self.client.gauge(key, value)
 
 
 except Exception:
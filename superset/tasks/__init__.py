@@ -17,3 +17,6 @@
 # under the License.
 from . import schedules  # noqa
 from . import cache  # noqa
+from . import rollups  # noqa
+from . import catalog  # noqa
+from . import csv_upload  # noqa
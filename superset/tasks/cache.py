@@ -16,21 +16,28 @@
 # under the License.
 # pylint: disable=too-few-public-methods
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import json
 import logging
-from urllib import request
-from urllib.error import URLError
 
 from celery.utils.log import get_task_logger
 from sqlalchemy import and_, func
 
-from superset import app, db
+from superset import app, cache, db, viz
+from superset.connectors.connector_registry import ConnectorRegistry
 from superset.models.core import Dashboard, Log, Slice
 from superset.models.tags import Tag, TaggedObject
 from superset.tasks.celery_app import app as celery_app
-from superset.utils.core import parse_human_datetime
+from superset.utils import cache_codecs
+from superset.utils.cache import release_lease
+from superset.utils.core import copy_current_context, parse_human_datetime, QueryStatus
+from superset.utils.dates import now_as_float
 
 
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
 logger = get_task_logger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -86,8 +93,9 @@ class Strategy:
     """
     A cache warm up strategy.
 
-    Each strategy defines a `get_urls` method that returns a list of URLs to
-    be fetched from the `/superset/warm_up_cache/` endpoint.
+    Each strategy defines a `get_charts` method that returns a list of
+    `(chart, dashboard)` tuples, the charts to warm up as shown on the
+    dashboard, or on their own when the dashboard is None.
 
     Strategies can be configured in `superset/config.py`:
 
@@ -108,8 +116,12 @@ class Strategy:
     def __init__(self):
         pass
 
+    def get_charts(self):
+        raise NotImplementedError("Subclasses must implement get_charts!")
+
     def get_urls(self):
-        raise NotImplementedError("Subclasses must implement get_urls!")
+        """The URLs of the charts to warm up"""
+        return [get_url(chart) for chart, _ in self.get_charts()]
 
 
 class DummyStrategy(Strategy):
@@ -130,11 +142,11 @@ class DummyStrategy(Strategy):
 
     name = "dummy"
 
-    def get_urls(self):
+    def get_charts(self):
         session = db.create_scoped_session()
         charts = session.query(Slice).all()
 
-        return [get_url(chart) for chart in charts]
+        return [(chart, None) for chart in charts]
 
 
 class TopNDashboardsStrategy(Strategy):
@@ -162,8 +174,8 @@ class TopNDashboardsStrategy(Strategy):
         self.top_n = top_n
         self.since = parse_human_datetime(since)
 
-    def get_urls(self):
-        urls = []
+    def get_charts(self):
+        charts = []
         session = db.create_scoped_session()
 
         records = (
@@ -178,9 +190,9 @@ class TopNDashboardsStrategy(Strategy):
         dashboards = session.query(Dashboard).filter(Dashboard.id.in_(dash_ids)).all()
         for dashboard in dashboards:
             for chart in dashboard.slices:
-                urls.append(get_url(chart))
+                charts.append((chart, dashboard))
 
-        return urls
+        return charts
 
 
 class DashboardTagsStrategy(Strategy):
@@ -205,8 +217,8 @@ class DashboardTagsStrategy(Strategy):
         super(DashboardTagsStrategy, self).__init__()
         self.tags = tags or []
 
-    def get_urls(self):
-        urls = []
+    def get_charts(self):
+        charts = []
         session = db.create_scoped_session()
 
         tags = session.query(Tag).filter(Tag.name.in_(self.tags)).all()
@@ -227,7 +239,7 @@ class DashboardTagsStrategy(Strategy):
         tagged_dashboards = session.query(Dashboard).filter(Dashboard.id.in_(dash_ids))
         for dashboard in tagged_dashboards:
             for chart in dashboard.slices:
-                urls.append(get_url(chart))
+                charts.append((chart, dashboard))
 
         # add charts that are tagged
         tagged_objects = (
@@ -243,12 +255,240 @@ class DashboardTagsStrategy(Strategy):
         chart_ids = [tagged_object.object_id for tagged_object in tagged_objects]
         tagged_charts = session.query(Slice).filter(Slice.id.in_(chart_ids))
         for chart in tagged_charts:
-            urls.append(get_url(chart))
+            charts.append((chart, None))
+
+        return charts
+
+
+class PredictiveStrategy(Strategy):
+    """
+    Warm up the charts most likely to be viewed soon, within a budget.
+
+    The views of a chart in the coming hour are predicted from its views,
+    explored or on dashboards, during the same hour of the week over the past weeks, the most recent
+    weeks weighing the most. Charts not viewed lately at all are left out.
+    The charts most likely to be viewed are picked first, for as long as
+    their queries, timed by their slowest views, fit in `budget_seconds`.
+    Run it shortly before each hour:
+
+        CELERYBEAT_SCHEDULE = {
+            'cache-warmup-predictive': {
+                'task': 'cache-warmup',
+                'schedule': crontab(minute=45, hour='*'),
+                'kwargs': {
+                    'strategy_name': 'predictive',
+                    'budget_seconds': 600,
+                    'lead_minutes': 15,
+                },
+            },
+        }
+
+    """
+
+    name = "predictive"
+
+    def __init__(
+        self, budget_seconds=600, lead_minutes=15, weeks=4, decay=0.5, recent_days=7
+    ):
+        super(PredictiveStrategy, self).__init__()
+        self.budget_seconds = budget_seconds
+        self.lead_minutes = lead_minutes
+        self.weeks = weeks
+        self.decay = decay
+        self.recent_days = recent_days
+
+    def get_predictions(self, now=None):
+        """
+        Predicts the views of the charts in the hour starting `lead_minutes`
+        after `now`.
+
+        :return: a list of `(chart_id, views, seconds)` tuples, the expected
+            views of each chart and the time its query takes, most viewed
+            charts first
+        """
+        now = now or datetime.utcnow()
+        slot_start = now + timedelta(minutes=self.lead_minutes)
+        session = db.create_scoped_session()
+        views = session.query(Log).filter(
+            Log.action.in_(["explore_json", "dashboard_chart_json"]), Log.slice_id > 0
+        )
+
+        recent = views.filter(Log.dttm >= now - timedelta(days=self.recent_days))
+        recent_ids = {
+            row.slice_id for row in recent.with_entities(Log.slice_id).distinct()
+        }
+
+        counts = defaultdict(float)
+        durations = defaultdict(int)
+        total_weight = 0
+        for week in range(1, self.weeks + 1):
+            weight = self.decay ** (week - 1)
+            total_weight += weight
+            start = slot_start - timedelta(weeks=week)
+            rows = (
+                views.filter(Log.dttm >= start, Log.dttm < start + timedelta(hours=1))
+                .with_entities(
+                    Log.slice_id, func.count(Log.id), func.max(Log.duration_ms)
+                )
+                .group_by(Log.slice_id)
+            )
+            for chart_id, count, duration in rows:
+                if chart_id in recent_ids:
+                    counts[chart_id] += weight * count
+                    durations[chart_id] = max(durations[chart_id], duration or 0)
+
+        predictions = [
+            (chart_id, count / total_weight, durations[chart_id] / 1000)
+            for chart_id, count in counts.items()
+        ]
+        return sorted(predictions, key=lambda p: (-p[1], p[2], p[0]))
+
+    def select(self, predictions):
+        """The ids of the charts to warm up within the budget"""
+        chart_ids = []
+        budget = self.budget_seconds
+        for chart_id, _, seconds in predictions:
+            if seconds <= budget:
+                chart_ids.append(chart_id)
+                budget -= seconds
+        return chart_ids
+
+    def get_charts(self):
+        chart_ids = self.select(self.get_predictions())
+        session = db.create_scoped_session()
+        charts = {
+            chart.id: chart
+            for chart in session.query(Slice).filter(Slice.id.in_(chart_ids))
+        }
+        return [(charts[i], None) for i in chart_ids if i in charts]
+
+
+strategies = [
+    DummyStrategy,
+    TopNDashboardsStrategy,
+    DashboardTagsStrategy,
+    PredictiveStrategy,
+]
 
-        return urls
 
+def get_viz(chart, dashboard=None):
+    """Builds the viz of a chart, with the default filters of `dashboard`"""
+    form_data = chart.form_data
+    form_data.update(get_form_data(chart.id, dashboard))
+    return viz.viz_types[chart.viz_type](chart.datasource, form_data=form_data)
 
-strategies = [DummyStrategy, TopNDashboardsStrategy, DashboardTagsStrategy]
+
+def get_cached_dttm(cache_key):
+    """When the data at `cache_key` was cached, None if it isn't"""
+    cache_value = cache.get(cache_key) if cache else None
+    if not cache_value:
+        return None
+    try:
+        return cache_codecs.deserialize_meta(cache_value)["dttm"]
+    except Exception:
+        logger.exception(f"Error reading cache key {cache_key}")
+        return None
+
+
+def warm_up_chart(chart_id, viz_obj):
+    """Loads the data of a chart, returns the time it took in ms"""
+    start_ts = now_as_float()
+    viz_obj.load_thread_datasource()
+    payload = viz_obj.get_payload()
+    duration = now_as_float() - start_ts
+    stats_logger.timing("cache_warmup.chart", duration)
+    if payload.get("status") == QueryStatus.FAILED:
+        raise Exception(payload.get("error"))
+    logger.info(f"Warmed up chart {chart_id} in {duration:.0f} ms")
+    return duration
+
+
+def warm_up_charts(charts):
+    """
+    Warm up the cache of charts, in-process.
+
+    Charts whose data is cached under the same key as a previous chart are
+    only loaded once, and charts whose data is still fresh in the cache are
+    skipped. Stale data is refreshed. The others are loaded at most
+    CACHE_WARMUP_MAX_CONCURRENCY_PER_DATABASE at a time against each
+    database.
+
+    """
+    results = {"success": [], "errors": [], "fresh": [], "duplicates": []}
+    jobs = defaultdict(list)
+    cache_keys = set()
+    for chart, dashboard in charts:
+        try:
+            viz_obj = get_viz(chart, dashboard)
+            cache_key = viz_obj.cache_key(viz_obj.query_obj())
+            if cache_key in cache_keys:
+                results["duplicates"].append(chart.id)
+                continue
+            cache_keys.add(cache_key)
+            cached_dttm = get_cached_dttm(cache_key)
+            if cached_dttm and not viz_obj.is_stale(cached_dttm):
+                results["fresh"].append(chart.id)
+                continue
+            viz_obj.force = bool(cached_dttm)
+        except Exception as e:
+            logger.exception(f"Error warming up chart {chart.id}")
+            results["errors"].append({"chart_id": chart.id, "error": str(e)})
+            continue
+        datasource = viz_obj.datasource
+        database_key = (
+            datasource.type,
+            getattr(datasource, "database_id", None)
+            or getattr(datasource, "cluster_name", None),
+        )
+        jobs[database_key].append((chart.id, viz_obj))
+
+    max_workers = config.get("CACHE_WARMUP_MAX_CONCURRENCY_PER_DATABASE") or 1
+    executors = [ThreadPoolExecutor(max_workers=max_workers) for _ in jobs]
+    try:
+        futures = [
+            (
+                chart_id,
+                executor.submit(copy_current_context(warm_up_chart), chart_id, viz_obj),
+            )
+            for executor, database_jobs in zip(executors, jobs.values())
+            for chart_id, viz_obj in database_jobs
+        ]
+        for chart_id, future in futures:
+            try:
+                duration = future.result()
+                results["success"].append({"chart_id": chart_id, "duration": duration})
+            except Exception as e:
+                logger.exception(f"Error warming up chart {chart_id}")
+                results["errors"].append({"chart_id": chart_id, "error": str(e)})
+    finally:
+        for executor in executors:
+            executor.shutdown()
+    return results
+
+
+def get_datasource_charts(datasource):
+    """The charts of a datasource, alone and on each of their dashboards"""
+    charts = []
+    query = db.session.query(Slice).filter_by(
+        datasource_type=datasource.type, datasource_id=datasource.id
+    )
+    for chart in query:
+        charts.append((chart, None))
+        charts.extend((chart, dashboard) for dashboard in chart.dashboards)
+    return charts
+
+
+@celery_app.task(name="cache.warm_up_datasource")
+def warm_up_datasource(datasource_type, datasource_id):
+    """
+    Warm up the cache of the charts of a datasource, e.g. once it's reloaded.
+
+    """
+    with app.app_context():
+        datasource = ConnectorRegistry.get_datasource(
+            datasource_type, datasource_id, db.session
+        )
+        return warm_up_charts(get_datasource_charts(datasource))
 
 
 @celery_app.task(name="cache-warmup")
@@ -278,14 +518,28 @@ def cache_warmup(strategy_name, *args, **kwargs):
         logger.exception(message)
         return message
 
-    results = {"success": [], "errors": []}
-    for url in strategy.get_urls():
-        try:
-            logger.info(f"Fetching {url}")
-            request.urlopen(url)
-            results["success"].append(url)
-        except URLError:
-            logger.exception("Error warming up cache!")
-            results["errors"].append(url)
+    with app.app_context():
+        return warm_up_charts(strategy.get_charts())
 
-    return results
+
+@celery_app.task(name="cache.refresh_chart_data")
+def refresh_chart_data(datasource_type, datasource_id, form_data, cache_key):
+    """
+    Refresh the cached data of a chart that was served stale.
+
+    The caller holds the lease on `cache_key` while the refresh is pending,
+    it is released once the new data is cached.
+
+    """
+    try:
+        with app.app_context():
+            datasource = ConnectorRegistry.get_datasource(
+                datasource_type, datasource_id, db.session
+            )
+            viz_type = form_data.get("viz_type", "table")
+            viz_obj = viz.viz_types[viz_type](
+                datasource, form_data=form_data, force=True
+            )
+            viz_obj.get_payload()
+    finally:
+        release_lease(cache_key)
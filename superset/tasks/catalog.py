@@ -0,0 +1,56 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Celery task refreshing the table catalog SQL Lab searches"""
+import logging
+
+from celery.utils.log import get_task_logger
+
+from superset import app, db
+from superset.models.catalog import CatalogEntry
+from superset.models.core import Database
+from superset.tasks.celery_app import app as celery_app
+
+logger = get_task_logger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@celery_app.task(name="catalog.refresh_table_catalog")
+def refresh_table_catalog(database_id=None):
+    """
+    Refresh the table catalog of a database, or of all the SQL Lab databases.
+
+    A database failing to list its tables keeps its previous catalog.
+
+    """
+    results = {"success": {}, "errors": []}
+    with app.app_context():
+        query = db.session.query(Database)
+        if database_id is not None:
+            query = query.filter(Database.id == database_id)
+        else:
+            query = query.filter(Database.expose_in_sqllab.is_(True))
+        for database in query.all():
+            try:
+                logger.info(f"Refreshing the table catalog of {database}")
+                counts = CatalogEntry.refresh(db.session, database)
+                results["success"][database.id] = counts
+            except Exception:
+                logger.exception(f"Error refreshing the table catalog of {database}")
+                db.session.rollback()
+                results["errors"].append(database.id)
+    return results
@@ -18,10 +18,20 @@
 
 """Utility functions used across Superset"""
 
+from celery.signals import worker_process_init
+
 # Superset framework imports
 from superset import app
+from superset.utils import engine_pools
 from superset.utils.core import get_celery_app
 
 # Globals
 config = app.config
 app = get_celery_app(config)
+
+
+@worker_process_init.connect
+def dispose_engines(**kwargs):
+    """Pooled connections are inherited from the parent process, which keeps
+    using them"""
+    engine_pools.dispose_engines()
@@ -0,0 +1,110 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Celery task loading uploaded CSV files into tables
+
+The progress of each upload is kept in the cache, where the CSV upload view
+reads it from.
+"""
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from celery.utils.log import get_task_logger
+
+from superset import app, cache, db
+from superset.connectors.sqla.models import SqlaTable
+from superset.models.core import Database
+from superset.tasks.celery_app import app as celery_app
+
+logger = get_task_logger(__name__)
+logger.setLevel(logging.INFO)
+
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCESS = "success"
+FAILED = "failed"
+
+
+def upload_status_key(upload_id: str) -> str:
+    return f"csv_upload/{upload_id}"
+
+
+def get_upload_status(upload_id: str) -> Optional[Dict[str, Any]]:
+    return cache.get(upload_status_key(upload_id))
+
+
+def set_upload_status(upload_id: str, status: Dict[str, Any]) -> None:
+    cache.set(
+        upload_status_key(upload_id),
+        status,
+        timeout=config["CSV_UPLOAD_STATUS_TIMEOUT"],
+    )
+
+
+@celery_app.task(name="csv.upload_csv")
+def upload_csv(upload_id, database_id, params, user_id):
+    """
+    Load an uploaded csv into a table, and add the table to Superset.
+
+    The file is removed once loaded, whether it succeeded or not.
+
+    """
+    status = {
+        "state": RUNNING,
+        "user_id": user_id,
+        "table_name": params["to_sql"]["name"],
+        "rows": 0,
+        "bytes": 0,
+        "total_bytes": 0,
+    }
+
+    def progress(rows, read, size):
+        status.update(rows=rows, bytes=read, total_bytes=size)
+        set_upload_status(upload_id, status)
+
+    set_upload_status(upload_id, status)
+    with app.app_context():
+        try:
+            database = db.session.query(Database).get(database_id)
+            database.db_engine_spec.upload_csv(database, params, progress)
+            table = SqlaTable(
+                table_name=params["to_sql"]["name"],
+                schema=params["to_sql"]["schema"],
+                database=database,
+            )
+            table.user_id = user_id
+            table.fetch_metadata()
+            db.session.add(table)
+            db.session.commit()
+            status.update(state=SUCCESS, table_id=table.id)
+            stats_logger.incr("successful_csv_upload")
+        except Exception as e:
+            logger.exception(f"Error uploading {params['filename']}")
+            db.session.rollback()
+            status.update(state=FAILED, error=str(e))
+            stats_logger.incr("failed_csv_upload")
+        finally:
+            try:
+                os.remove(config["UPLOAD_FOLDER"] + params["filename"])
+            except OSError:
+                pass
+    set_upload_status(upload_id, status)
+    return status
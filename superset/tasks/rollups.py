@@ -0,0 +1,62 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Celery task materializing the rollups of SQL tables"""
+import logging
+
+from celery.utils.log import get_task_logger
+
+from superset import app, db
+from superset.connectors.sqla.models import TableRollup
+from superset.tasks.celery_app import app as celery_app
+
+logger = get_task_logger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@celery_app.task(name="rollups.refresh_rollup_tables")
+def refresh_rollup_tables(table_id=None):
+    """
+    Refresh the rollups of a table, or of all the tables.
+
+    Each rollup is refreshed and committed on its own, a rollup failing to
+    refresh keeps serving its previous table until it gets too old. The
+    previous table of a rollup is only dropped once the new one is committed.
+
+    """
+    results = {"success": [], "errors": []}
+    with app.app_context():
+        query = db.session.query(TableRollup)
+        if table_id is not None:
+            query = query.filter(TableRollup.table_id == table_id)
+        for rollup in query.all():
+            try:
+                logger.info(f"Refreshing rollup {rollup.id} of {rollup.table}")
+                previous = rollup.refresh()
+                db.session.commit()
+                results["success"].append(rollup.id)
+            except Exception:
+                logger.exception(f"Error refreshing rollup {rollup.id}")
+                db.session.rollback()
+                results["errors"].append(rollup.id)
+                continue
+            if previous:
+                try:
+                    rollup.drop_rollup_table(previous)
+                except Exception:
+                    logger.exception(f"Error dropping the previous table {previous}")
+    return results
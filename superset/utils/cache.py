@@ -15,9 +15,19 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+from datetime import datetime
+import hashlib
+import logging
+import time
+from typing import Any, List, Optional
+
+from contextlib2 import contextmanager
 from flask import request
 
-from superset import tables_cache
+from superset import app, cache, tables_cache
+
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
 
 
 def view_cache_key(*unused_args, **unused_kwargs) -> str:
@@ -70,3 +80,177 @@ def memoized_func(key=view_cache_key, attribute_in_key=None):
         return wrapped_f
 
     return wrap
+
+
+def lease_key(key: str) -> str:
+    return "{}__lease".format(key)
+
+
+def acquire_lease(key: str) -> bool:
+    """Takes the lease to load the value of a cache key
+
+    Concurrent cache misses on a key only load its value once: the caller
+    getting the lease loads it, the others call `wait_for_key`. Leases expire
+    after QUERY_COALESCING_LEASE_TIMEOUT seconds, in case their holder dies.
+
+    :returns: False if another caller holds the lease
+    """
+    timeout = config.get("QUERY_COALESCING_LEASE_TIMEOUT")
+    if not cache or not timeout:
+        return True
+    try:
+        return bool(cache.add(lease_key(key), True, timeout=timeout))
+    except Exception as e:
+        logging.exception(e)
+        return True
+
+
+def release_lease(key: str) -> None:
+    try:
+        cache.delete(lease_key(key))
+    except Exception as e:
+        logging.exception(e)
+
+
+def wait_for_key(key: str) -> Optional[Any]:
+    """Waits for the holder of the lease on a key to load its value
+
+    Gives up after QUERY_COALESCING_WAIT_TIMEOUT seconds, or once the lease
+    is released without a value, e.g. when the query failed.
+
+    :returns: the value, or None if the caller should load it itself
+    """
+    deadline = time.time() + config.get("QUERY_COALESCING_WAIT_TIMEOUT")
+    interval = 0.05
+    while time.time() < deadline:
+        time.sleep(interval)
+        interval = min(interval * 2, 1)
+        value = cache.get(key)
+        if value:
+            stats_logger.incr("coalesced_query")
+            return value
+        if not cache.get(lease_key(key)):
+            break
+    stats_logger.incr("coalesced_query_timeout")
+    return None
+
+
+def datasource_index_key(datasource_uid: str, shard: int) -> str:
+    return "datasource_index/{}/{}".format(datasource_uid, shard)
+
+
+def index_shard(cache_key: str) -> int:
+    """The shard of its datasource's index a cache key is recorded in"""
+    digest = hashlib.md5(cache_key.encode("utf-8")).hexdigest()
+    return int(digest, 16) % config.get("CACHE_INDEX_SHARDS")
+
+
+@contextmanager
+def index_lock(key: str, timeout: float = 1):
+    """Serializes the updates of a cache index, on a best effort basis
+
+    Waits up to `timeout` seconds for the lease on the index, then goes on
+    without it rather than failing the request.
+    """
+    deadline = time.time() + timeout
+    leased = False
+    try:
+        while True:
+            leased = bool(cache.add(lease_key(key), True, timeout=5))
+            if leased or time.time() >= deadline:
+                break
+            time.sleep(0.01)
+    except Exception as e:
+        logging.exception(e)
+    if not leased:
+        stats_logger.incr("cache_index.lock_timeout")
+    try:
+        yield
+    finally:
+        if leased:
+            release_lease(key)
+
+
+def index_cache_key(
+    datasource_uid: str,
+    cache_key: str,
+    timeout: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> None:
+    """Records that the value cached at `cache_key` derives from a datasource
+
+    The index of a datasource maps the keys of its cached data to the time
+    range they hold, None meaning unbounded, so that `invalidate_datasource`
+    can evict them. It is split in CACHE_INDEX_SHARDS cache values, so that
+    writes only lock and rewrite a small part of it. Expired keys are pruned
+    as new ones are added, and only the CACHE_INDEX_MAX_KEYS most recent ones
+    are kept.
+
+    :param timeout: the timeout `cache_key` was set with, 0 or None for none
+    """
+    max_keys = config.get("CACHE_INDEX_MAX_KEYS")
+    if not cache or not max_keys:
+        return
+    key = datasource_index_key(datasource_uid, index_shard(cache_key))
+    max_keys = max(1, max_keys // config.get("CACHE_INDEX_SHARDS"))
+    now = time.time()
+    try:
+        with index_lock(key):
+            entries = {
+                k: v
+                for k, v in (cache.get(key) or {}).items()
+                if k != cache_key and (v[2] is None or v[2] > now)
+            }
+            entries[cache_key] = (start, end, now + timeout if timeout else None)
+            if len(entries) > max_keys:
+                stats_logger.incr("cache_index.overflow")
+                entries = dict(list(entries.items())[-max_keys:])
+            written = cache.set(key, entries, timeout=0)
+    except Exception as e:
+        logging.exception(e)
+        written = False
+    if not written:
+        # the keys of this shard can't be invalidated anymore
+        logging.warning("Could not index cache key {}".format(cache_key))
+        stats_logger.incr("cache_index.write_failed")
+
+
+def invalidate_datasource(
+    datasource_uid: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[str]:
+    """Evicts the cached data derived from a datasource
+
+    :param since: only evict the data of time ranges ending after this
+    :param until: only evict the data of time ranges starting before this
+    :returns: the evicted cache keys
+    """
+    if not cache:
+        return []
+    keys: List[str] = []
+    for shard in range(config.get("CACHE_INDEX_SHARDS")):
+        key = datasource_index_key(datasource_uid, shard)
+        with index_lock(key):
+            entries = cache.get(key) or {}
+            shard_keys = [
+                k
+                for k, (start, end, _) in entries.items()
+                if (since is None or end is None or end > since)
+                and (until is None or start is None or start < until)
+            ]
+            for k in shard_keys:
+                del entries[k]
+            if shard_keys and entries:
+                cache.set(key, entries, timeout=0)
+            elif shard_keys:
+                cache.delete(key)
+        keys += shard_keys
+    if keys:
+        cache.delete_many(*keys)
+    stats_logger.incr("cache_index.invalidate")
+    logging.info(
+        "Evicted {} cache keys of datasource {}".format(len(keys), datasource_uid)
+    )
+    return keys
@@ -0,0 +1,247 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Codecs used to serialize the dataframe payloads stored in the data cache
+
+Every payload written by this module starts with a small header made of a
+magic string, a format version and the name of the codec used for the
+dataframe. Entries written by older versions of Superset are plain pickles,
+which never start with the magic string, so they can still be read back.
+"""
+import json
+import logging
+import pickle as pkl
+import struct
+from typing import Any, Dict, Optional, Tuple, Type, Union
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from superset.exceptions import CacheCodecException
+
+MAGIC = b"SSDF"
+FORMAT_VERSION = 1
+
+# magic, format version, length of the codec name
+_HEADER = struct.Struct("!4sBB")
+# length of the pickled metadata
+_META_LENGTH = struct.Struct("!I")
+
+# string columns with at most this ratio of distinct values per row get
+# dictionary encoded by the arrow codec
+DICTIONARY_MAX_RATIO = 0.5
+DICTIONARY_COLUMNS_KEY = b"superset.dictionary_columns"
+
+
+class BaseCodec(object):
+    """Serializes a pandas dataframe to and from bytes"""
+
+    name = ""
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        raise NotImplementedError()
+
+
+class PickleCodec(BaseCodec):
+    name = "pickle"
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        return pkl.dumps(df, protocol=pkl.HIGHEST_PROTOCOL)
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        return pkl.loads(data)
+
+
+class ArrowCodec(BaseCodec):
+    """Arrow IPC stream, optionally zlib compressed
+
+    Low cardinality string columns are dictionary encoded. Decoding maps the
+    columnar buffers directly, which is much cheaper than unpickling the
+    object arrays of a large frame.
+    """
+
+    name = "arrow"
+
+    def __init__(self, compression_level: int = 0, dictionary_encode: bool = True):
+        self.compression_level = compression_level
+        self.dictionary_encode = dictionary_encode
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        import pyarrow as pa
+
+        dictionary_columns = []
+        if self.dictionary_encode and len(df.index):
+            df = df.copy(deep=False)
+            for col in df.columns:
+                if (
+                    df[col].dtype == np.object_
+                    and df[col].nunique() <= len(df.index) * DICTIONARY_MAX_RATIO
+                ):
+                    df[col] = df[col].astype("category")
+                    dictionary_columns.append(col)
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[DICTIONARY_COLUMNS_KEY] = json.dumps(dictionary_columns)
+        table = table.replace_schema_metadata(metadata)
+
+        sink = pa.BufferOutputStream()
+        writer = pa.RecordBatchStreamWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        data = sink.getvalue().to_pybytes()
+        if self.compression_level:
+            return b"z" + zlib.compress(data, self.compression_level)
+        return b"r" + data
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        import pyarrow as pa
+
+        flag, data = data[:1], data[1:]
+        if flag == b"z":
+            data = zlib.decompress(data)
+        table = pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+        df = table.to_pandas()
+        metadata = table.schema.metadata or {}
+        for col in json.loads(metadata.get(DICTIONARY_COLUMNS_KEY, b"[]")):
+            df[col] = df[col].astype(np.object_)
+        return df
+
+
+class ParquetCodec(BaseCodec):
+    """Parquet with dictionary encoding, trading encode time for payload size"""
+
+    name = "parquet"
+
+    def __init__(self, compression: Optional[str] = "snappy"):
+        self.compression = compression
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        pq.write_table(
+            table, sink, compression=self.compression or "none", use_dictionary=True
+        )
+        return sink.getvalue().to_pybytes()
+
+    def decode(self, data: bytes) -> pd.DataFrame:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        return pq.read_table(pa.BufferReader(data)).to_pandas()
+
+
+registered_codecs: Dict[str, Type[BaseCodec]] = {
+    "pickle": PickleCodec,
+    "arrow": ArrowCodec,
+    "parquet": ParquetCodec,
+}
+
+
+def register_codec(codec: Type[BaseCodec]) -> None:
+    """Makes a custom codec available for both writing and reading"""
+    registered_codecs[codec.name] = codec
+
+
+def get_codec(codec: Union[str, BaseCodec, None]) -> BaseCodec:
+    if isinstance(codec, BaseCodec):
+        return codec
+    if codec not in registered_codecs:
+        raise CacheCodecException("Unknown cache codec: {}".format(codec))
+    return registered_codecs[codec]()
+
+
+def serialize(
+    payload: Dict[str, Any], codec: Union[str, BaseCodec] = "pickle"
+) -> bytes:
+    """Serializes a cached payload, encoding its `df` entry with `codec`
+
+    If the codec can't handle the dataframe (mixed type object columns
+    for instance), the dataframe is pickled instead.
+    """
+    codec = get_codec(codec)
+    df = payload.get("df")
+    meta = {k: v for k, v in payload.items() if k != "df"}
+    body = b""
+    if df is not None:
+        try:
+            body = codec.encode(df)
+        except Exception as e:
+            logging.warning(
+                "Could not encode dataframe with the {} codec, "
+                "falling back to pickle: {}".format(codec.name, e)
+            )
+            codec = PickleCodec()
+            body = codec.encode(df)
+    meta["has_df"] = df is not None
+    meta_bytes = pkl.dumps(meta, protocol=pkl.HIGHEST_PROTOCOL)
+    name = codec.name.encode("utf-8")
+    return b"".join(
+        [
+            _HEADER.pack(MAGIC, FORMAT_VERSION, len(name)),
+            name,
+            _META_LENGTH.pack(len(meta_bytes)),
+            meta_bytes,
+            body,
+        ]
+    )
+
+
+def _read_meta(data: bytes) -> Tuple[Dict[str, Any], str, int]:
+    """Reads the metadata of a payload, the name of its codec and the offset
+    of its encoded dataframe"""
+    _, version, name_length = _HEADER.unpack_from(data)
+    if version > FORMAT_VERSION:
+        raise CacheCodecException(
+            "Unsupported cache payload version: {}".format(version)
+        )
+    offset = _HEADER.size
+    name = data[offset : offset + name_length].decode("utf-8")
+    offset += name_length
+    (meta_length,) = _META_LENGTH.unpack_from(data, offset)
+    offset += _META_LENGTH.size
+    payload = pkl.loads(data[offset : offset + meta_length])
+    return payload, name, offset + meta_length
+
+
+def deserialize(data: bytes) -> Dict[str, Any]:
+    """Reads back a payload written by `serialize` or a legacy pickled dict"""
+    if not data.startswith(MAGIC):
+        return pkl.loads(data)
+
+    payload, name, offset = _read_meta(data)
+    has_df = payload.pop("has_df", False)
+    payload["df"] = get_codec(name).decode(data[offset:]) if has_df else None
+    return payload
+
+
+def deserialize_meta(data: bytes) -> Dict[str, Any]:
+    """Same as `deserialize`, without decoding the dataframe of the payload"""
+    if not data.startswith(MAGIC):
+        payload = pkl.loads(data)
+    else:
+        payload, _, _ = _read_meta(data)
+        payload.pop("has_df", None)
+    payload.pop("df", None)
+    return payload
@@ -16,6 +16,7 @@
 # under the License.
 # pylint: disable=C,R,W
 """Utility functions used across Superset"""
+from collections import OrderedDict
 from datetime import date, datetime, time, timedelta
 import decimal
 from email.mime.application import MIMEApplication
@@ -31,7 +32,8 @@ import os
 import signal
 import smtplib
 import sys
-from time import struct_time
+import threading
+from time import monotonic, struct_time
 import traceback
 from typing import List, NamedTuple, Optional, Tuple
 from urllib.parse import unquote_plus
@@ -42,7 +44,17 @@ import bleach
 import celery
 from dateutil.parser import parse
 from dateutil.relativedelta import relativedelta
-from flask import current_app, flash, Flask, g, Markup, render_template
+from flask import (
+    current_app,
+    flash,
+    Flask,
+    g,
+    has_app_context,
+    has_request_context,
+    Markup,
+    render_template,
+)
+from flask.globals import _request_ctx_stack
 from flask_appbuilder.security.sqla.models import User
 from flask_babel import gettext as __
 from flask_babel import lazy_gettext as _
@@ -115,30 +127,108 @@ class _memoized:  # noqa
 
     Define ``watch`` as a tuple of attribute names if this Decorator
     should account for instance variable changes.
+
+    Set ``maxsize`` to keep only that many values, the least recently used
+    being evicted first, and ``ttl`` to evict values that many seconds after
+    they were computed. ``on_evict`` is called with each evicted value, e.g.
+    to release its resources. Given a ``stats_logger``, hits, misses and
+    evictions are counted under ``stats_prefix``. ``key`` computes the key of
+    the values from the arguments, e.g. a digest of large arguments so that
+    they aren't kept by the cache.
     """
 
-    def __init__(self, func, watch=()):
+    def __init__(
+        self,
+        func,
+        watch=(),
+        maxsize=None,
+        ttl=None,
+        on_evict=None,
+        stats_logger=None,
+        stats_prefix="memoized",
+        key=None,
+    ):
         self.func = func
-        self.cache = {}
+        self.key = key
+        self.cache = OrderedDict()
         self.is_method = False
-        self.watch = watch
+        self.watch = watch or ()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.stats_logger = stats_logger
+        self.stats_prefix = stats_prefix
+        self.lock = threading.Lock()
+
+    def incr(self, name):
+        if self.stats_logger:
+            self.stats_logger.incr("{}.{}".format(self.stats_prefix, name))
+
+    def evict(self, values):
+        for value in values:
+            self.incr("eviction")
+            if self.on_evict:
+                try:
+                    self.on_evict(value)
+                except Exception as e:
+                    logging.exception(e)
 
     def __call__(self, *args, **kwargs):
-        key = [args, frozenset(kwargs.items())]
-        if self.is_method:
-            key.append(tuple([getattr(args[0], v, None) for v in self.watch]))
-        key = tuple(key)
-        if key in self.cache:
-            return self.cache[key]
+        if self.key:
+            key = self.key(*args, **kwargs)
+        else:
+            key = [args, frozenset(kwargs.items())]
+            if self.is_method:
+                key.append(tuple([getattr(args[0], v, None) for v in self.watch]))
+            key = tuple(key)
         try:
-            value = self.func(*args, **kwargs)
-            self.cache[key] = value
-            return value
+            hash(key)
         except TypeError:
             # uncachable -- for instance, passing a list as an argument.
             # Better to not cache than to blow up entirely.
             return self.func(*args, **kwargs)
 
+        now = monotonic()
+        evicted = []
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and entry[1] is not None and entry[1] <= now:
+                evicted.append(self.cache.pop(key)[0])
+                entry = None
+            if entry:
+                self.cache.move_to_end(key)
+        self.evict(evicted)
+        if entry:
+            self.incr("hit")
+            return entry[0]
+
+        self.incr("miss")
+        value = self.func(*args, **kwargs)
+        expires = now + self.ttl if self.ttl else None
+        evicted = []
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry:
+                # computed concurrently, keep the value returned first
+                evicted.append(value)
+                value = entry[0]
+            else:
+                self.cache[key] = (value, expires)
+            if self.ttl:
+                expired = [k for k, (_, e) in self.cache.items() if e and e <= now]
+                evicted.extend(self.cache.pop(k)[0] for k in expired)
+            while self.maxsize and len(self.cache) > self.maxsize:
+                evicted.append(self.cache.popitem(last=False)[1][0])
+        self.evict(evicted)
+        return value
+
+    def clear(self):
+        """Evicts all the cached values"""
+        with self.lock:
+            evicted = [value for value, _ in self.cache.values()]
+            self.cache.clear()
+        self.evict(evicted)
+
     def __repr__(self):
         """Return the function's docstring."""
         return self.func.__doc__
@@ -150,13 +240,13 @@ class _memoized:  # noqa
         return functools.partial(self.__call__, obj)
 
 
-def memoized(func=None, watch=None):
+def memoized(func=None, watch=None, **kwargs):
     if func:
         return _memoized(func)
     else:
 
         def wrapper(f):
-            return _memoized(f, watch)
+            return _memoized(f, watch, **kwargs)
 
         return wrapper
 
@@ -821,6 +911,37 @@ def zlib_decompress_to_string(blob):
     return zlib.decompress(blob)
 
 
+def gzip_chunks(chunks, encoding="utf-8"):
+    """
+    Gzip an iterable of strings incrementally, yielding compressed bytes
+    >>> data = b''.join(gzip_chunks(['a,b\\n', '1,2\\n']))
+    >>> zlib.decompress(data, zlib.MAX_WBITS | 16)
+    b'a,b\\n1,2\\n'
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def df_to_csv_chunks(dfs, **kwargs):
+    """Converts an iterable of dataframes to CSV, one string per dataframe
+
+    Only the first chunk gets a header row."""
+    header = kwargs.pop("header", True)
+    for df in dfs:
+        yield df.to_csv(header=header, **kwargs)
+        header = False
+
+
+def df_chunks(df, chunksize):
+    """Splits a dataframe in slices of at most ``chunksize`` rows"""
+    for i in range(0, max(len(df.index), 1), chunksize):
+        yield df.iloc[i : i + chunksize]
+
+
 _celery_app = None
 
 
@@ -1196,6 +1317,32 @@ def get_username() -> Optional[str]:
         return None
 
 
+def copy_current_context(f):
+    """Wraps ``f`` so that it can run in another thread
+
+    The wrapped function runs within a new context of the current app, with
+    the current ``g.user`` and, if there is one, a copy of the current
+    request, so that security checks and jinja macros behave the same as
+    in the calling thread. Outside of an app context ``f`` is left as is.
+    """
+    if not has_app_context():
+        return f
+    app = current_app._get_current_object()
+    user = getattr(g, "user", None)
+    request_ctx = _request_ctx_stack.top if has_request_context() else None
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            g.user = user
+            if request_ctx is None:
+                return f(*args, **kwargs)
+            with request_ctx.copy():
+                return f(*args, **kwargs)
+
+    return wrapper
+
+
 def MediumText() -> Variant:
     return Text().with_variant(MEDIUMTEXT(), "mysql")
 
@@ -22,6 +22,7 @@ from contextlib2 import contextmanager
 from flask import request
 
 from superset import app, cache
+from superset.utils.cache import index_cache_key
 from superset.utils.dates import now_as_float
 
 
@@ -53,7 +54,9 @@ def etag_cache(max_age, check_perms=bool):
 
     If a cache is set, the decorator will cache GET responses, bypassing the
     dataframe serialization. POST requests will still benefit from the
-    dataframe cache for requests that produce the same SQL.
+    dataframe cache for requests that produce the same SQL. When `check_perms`
+    returns the datasource of the response, the response is indexed under it
+    so that invalidating the datasource evicts it too.
 
     """
 
@@ -61,7 +64,7 @@ def etag_cache(max_age, check_perms=bool):
         @wraps(f)
         def wrapper(*args, **kwargs):
             # check if the user can access the resource
-            check_perms(*args, **kwargs)
+            datasource = check_perms(*args, **kwargs)
 
             # for POST requests we can't set cache headers, use the response
             # cache nor use conditional requests; this will still use the
@@ -88,6 +91,11 @@ def etag_cache(max_age, check_perms=bool):
             if response is None:
                 response = f(*args, **kwargs)
 
+                # streamed responses (CSV exports) can't get an etag nor be
+                # cached without reading the whole stream into memory
+                if response.is_streamed:
+                    return response
+
                 # add headers for caching: Last Modified, Expires and ETag
                 response.cache_control.public = True
                 response.last_modified = datetime.utcnow()
@@ -101,6 +109,9 @@ def etag_cache(max_age, check_perms=bool):
                 if cache:
                     try:
                         cache.set(cache_key, response, timeout=max_age)
+                        # responses of datasources are evicted with their data
+                        if getattr(datasource, "uid", None):
+                            index_cache_key(datasource.uid, cache_key, max_age)
                     except Exception:  # pylint: disable=broad-except
                         if app.debug:
                             raise
@@ -0,0 +1,136 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Engines with a pool of connections, shared across requests
+
+Engines are kept per database, effective user and schema, so that
+impersonated users never share connections. When the URL or the engine
+parameters of a database change, its stale engines are disposed of the
+next time they are requested.
+
+Connections flagged with ``mark_session_changed`` are closed instead of
+going back to the pool, so that session state never leaks to the next
+query, and forked processes dispose of the engines inherited from their
+parent before using them.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from superset.utils.dates import now_as_float
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool reporting checkout wait times and saturation"""
+
+    stats_logger = None
+    stats_prefix = "engine_pool"
+
+    def saturation(self) -> float:
+        """Ratio of the connections checked out to the most the pool allows"""
+        capacity = self.size() + max(self._max_overflow, 0)
+        return self.checkedout() / capacity if capacity else 0.0
+
+    def _do_get(self):
+        start_ts = now_as_float()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats_logger:
+                self.stats_logger.incr(self.stats_prefix + ".checkout_timeout")
+            raise
+        finally:
+            if self.stats_logger:
+                self.stats_logger.timing(
+                    self.stats_prefix + ".checkout_wait", now_as_float() - start_ts
+                )
+                self.stats_logger.gauge(
+                    self.stats_prefix + ".saturation", self.saturation()
+                )
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._pre_ping = self._pre_ping
+        pool.stats_logger = self.stats_logger
+        pool.stats_prefix = self.stats_prefix
+        return pool
+
+
+_engines: Dict[Hashable, Tuple[str, Engine]] = {}
+_lock = threading.Lock()
+
+
+def get_engine(
+    key: Hashable,
+    url: Any,
+    params: Dict[str, Any],
+    stats_logger: Any = None,
+    stats_prefix: Optional[str] = None,
+) -> Engine:
+    """Returns the pooled engine for ``key``, creating it if needed"""
+    signature = json.dumps([str(url), params], sort_keys=True, default=str)
+    with _lock:
+        current = _engines.get(key)
+        if current and current[0] == signature:
+            return current[1]
+
+        engine = create_engine(url, poolclass=InstrumentedQueuePool, **params)
+        event.listen(engine, "checkin", reset_session)
+        engine.pool.stats_logger = stats_logger
+        if stats_prefix:
+            engine.pool.stats_prefix = stats_prefix
+        _engines[key] = (signature, engine)
+    if current:
+        current[1].dispose()
+    return engine
+
+
+def is_shared(engine: Engine) -> bool:
+    """Whether ``engine`` is one of the pooled engines, owned by this module"""
+    with _lock:
+        return any(engine is shared for _, shared in _engines.values())
+
+
+def mark_session_changed(connection: Any) -> None:
+    """Flags a pooled connection whose session state was changed, e.g. by a
+    SET statement, to be closed rather than reused once checked in"""
+    connection.info["session_changed"] = True
+
+
+def reset_session(dbapi_connection: Any, connection_record: Any) -> None:
+    if connection_record.info.pop("session_changed", False):
+        connection_record.invalidate()
+
+
+def dispose_engines() -> None:
+    """Closes the pooled connections of all the engines, e.g. after a fork"""
+    with _lock:
+        engines = [engine for _, engine in _engines.values()]
+        _engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+# forked processes can't share the connections of their parent, Celery
+# workers also dispose of them when started, see tasks/celery_app.py
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=dispose_engines)  # type: ignore
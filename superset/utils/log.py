@@ -16,14 +16,19 @@
 # under the License.
 # pylint: disable=C,R,W
 from abc import ABC, abstractmethod
+import atexit
 from datetime import datetime
 import functools
 import inspect
 import json
 import logging
+import os
+from queue import Empty, Full, Queue
 import textwrap
+import threading
 from typing import Any, cast, Type
 
+from celery.signals import worker_process_shutdown
 from flask import current_app, g, request
 
 
@@ -52,7 +57,7 @@ class AbstractEventLogger(ABC):
                 slice_id = int(
                     slice_id or json.loads(d.get("form_data")).get("slice_id")
                 )
-            except (ValueError, TypeError):
+            except (AttributeError, ValueError, TypeError):
                 slice_id = 0
 
             self.stats_logger.incr(f.__name__)
@@ -130,29 +135,116 @@ class DBEventLogger(AbstractEventLogger):
     def log(self, user_id, action, *args, **kwargs):
         from superset.models.core import Log
 
+        logs = [Log(**row) for row in self.get_rows(user_id, action, **kwargs)]
+        sesh = current_app.appbuilder.get_session
+        sesh.bulk_save_objects(logs)
+        sesh.commit()
+
+    @staticmethod
+    def get_rows(user_id, action, **kwargs):
+        """The column values of the rows of the `logs` table for an event"""
         records = kwargs.get("records", list())
         dashboard_id = kwargs.get("dashboard_id")
         slice_id = kwargs.get("slice_id")
         duration_ms = kwargs.get("duration_ms")
         referrer = kwargs.get("referrer")
 
-        logs = list()
+        rows = list()
         for record in records:
             try:
                 json_string = json.dumps(record)
             except Exception:
                 json_string = None
-            log = Log(
-                action=action,
-                json=json_string,
-                dashboard_id=dashboard_id,
-                slice_id=slice_id,
-                duration_ms=duration_ms,
-                referrer=referrer,
-                user_id=user_id,
+            rows.append(
+                dict(
+                    action=action,
+                    json=json_string,
+                    dashboard_id=dashboard_id,
+                    slice_id=slice_id,
+                    duration_ms=duration_ms,
+                    referrer=referrer,
+                    user_id=user_id,
+                )
             )
-            logs.append(log)
+        return rows
 
-        sesh = current_app.appbuilder.get_session
-        sesh.bulk_save_objects(logs)
-        sesh.commit()
+
+class BufferedDBEventLogger(DBEventLogger):
+    """Logs events to the database in batches, off the request
+
+    Events are queued in memory and inserted by a background thread, once
+    `batch_size` of them are queued or every `flush_interval` seconds. At
+    most `max_queue_size` events are queued, the ones logged past that are
+    dropped and counted. The queue is flushed when the process exits,
+    including Celery worker processes.
+    """
+
+    def __init__(self, max_queue_size=10000, batch_size=500, flush_interval=5):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._queue = None
+        self._app = None
+        atexit.register(self.flush)
+        worker_process_shutdown.connect(self.flush, weak=False)
+
+    def log(self, user_id, action, *args, **kwargs):
+        dttm = datetime.utcnow()
+        queue = self.get_queue()
+        for row in self.get_rows(user_id, action, **kwargs):
+            row["dttm"] = dttm
+            try:
+                queue.put_nowait(row)
+            except Full:
+                self.stats_logger.incr("event_logger.dropped")
+        if queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def get_queue(self):
+        """The queue of this process, starting its flushing thread if needed"""
+        with self._lock:
+            # the thread and the events of a parent process aren't forked
+            if self._pid != os.getpid():
+                self._app = current_app._get_current_object()
+                self._queue = Queue(maxsize=self.max_queue_size)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+            return self._queue
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self, *args, **kwargs):
+        """Inserts the queued events, in batches"""
+        if self._pid != os.getpid():
+            return
+        with self._flush_lock:
+            while True:
+                rows = []
+                while len(rows) < self.batch_size:
+                    try:
+                        rows.append(self._queue.get_nowait())
+                    except Empty:
+                        break
+                if not rows:
+                    break
+                self.insert(rows)
+
+    def insert(self, rows):
+        from superset import db
+        from superset.models.core import Log
+
+        stats_logger = self._app.config.get("STATS_LOGGER")
+        try:
+            db.get_engine(self._app).execute(Log.__table__.insert(), rows)
+            stats_logger.gauge("event_logger.batch_size", len(rows))
+        except Exception as e:
+            logging.exception(e)
+            stats_logger.incr("event_logger.insert_error")
@@ -0,0 +1,124 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Storage of SQL Lab results as pages in the results backend
+
+The results of a query are stored under their key as a manifest, which is
+the payload without its rows plus a ``paging`` entry, while the rows are
+stored by pages under ``<key>/<page>``. Serving a window of the rows only
+reads and parses the pages it overlaps.
+
+Results stored before pages were introduced are a single blob holding all
+the rows, and are still read as such.
+"""
+from typing import Any, Dict, Iterator, List, Optional
+
+import simplejson as json
+
+from superset.exceptions import SupersetException
+from superset.utils.core import (
+    json_iso_dttm_ser,
+    zlib_compress,
+    zlib_decompress_to_string,
+)
+
+
+def page_key(key: str, page: int) -> str:
+    return f"{key}/{page}"
+
+
+def _dumps(obj: Any) -> bytes:
+    return zlib_compress(json.dumps(obj, default=json_iso_dttm_ser, ignore_nan=True))
+
+
+def _loads(blob: Any) -> Any:
+    return json.loads(zlib_decompress_to_string(blob))
+
+
+def store_results(
+    backend: Any, key: str, payload: Dict[str, Any], page_size: int, timeout: int
+) -> None:
+    """Stores the rows of a payload by pages, then its manifest"""
+    rows = payload.get("data") or []
+    pages = 0
+    for start in range(0, len(rows), page_size):
+        backend.set(
+            page_key(key, pages), _dumps(rows[start : start + page_size]), timeout
+        )
+        pages += 1
+
+    manifest = {k: v for k, v in payload.items() if k != "data"}
+    manifest["paging"] = {"rows": len(rows), "page_size": page_size, "pages": pages}
+    # the manifest goes last, readers never see results with missing pages
+    backend.set(key, _dumps(manifest), timeout)
+
+
+def read_manifest(backend: Any, key: str) -> Optional[Dict[str, Any]]:
+    """Returns the manifest of some results, None if they expired"""
+    blob = backend.get(key)
+    return _loads(blob) if blob else None
+
+
+def read_page(backend: Any, key: str, page: int) -> List[Any]:
+    blob = backend.get(page_key(key, page))
+    if not blob:
+        raise SupersetException(f"Page {page} of the results {key} expired")
+    return _loads(blob)
+
+
+def read_rows(
+    backend: Any,
+    key: str,
+    manifest: Dict[str, Any],
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> List[Any]:
+    """Returns ``limit`` rows of some results, starting at ``offset``"""
+    paging = manifest.get("paging")
+    end = offset + limit if limit is not None else None
+    if not paging:
+        return manifest.get("data", [])[offset:end]
+
+    page_size = paging["page_size"]
+    last = paging["rows"] if end is None else min(end, paging["rows"])
+    if offset >= last:
+        return []
+    first_page = offset // page_size
+    rows: List[Any] = []
+    for page in range(first_page, (last - 1) // page_size + 1):
+        rows += read_page(backend, key, page)
+    start = offset - first_page * page_size
+    return rows[start : start + last - offset]
+
+
+def iter_pages(
+    backend: Any, key: str, manifest: Dict[str, Any], chunk_size: int
+) -> Iterator[List[Any]]:
+    """Yields all the rows of some results, one page at a time
+
+    Empty results still yield one, empty, page."""
+    paging = manifest.get("paging")
+    if not paging:
+        rows = manifest.get("data", [])
+        for start in range(0, max(len(rows), 1), chunk_size):
+            yield rows[start : start + chunk_size]
+        return
+
+    if not paging["pages"]:
+        yield []
+    for page in range(paging["pages"]):
+        yield read_page(backend, key, page)
@@ -0,0 +1,103 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Pacing of the progress polling of long running queries
+
+Engines like Presto and Hive report the progress of a query while it runs.
+Rather than reloading the query from the metadata database on every poll,
+stop requests are signaled through the cache, progress is committed only
+once it moved significantly, and polls get further apart as a query runs.
+"""
+import time
+
+from superset import app, cache
+from superset.utils.core import QueryStatus
+from superset.utils.dates import now_as_float
+
+config = app.config
+
+
+def stop_signal_key(query_id: int) -> str:
+    return f"query_stop_signal_{query_id}"
+
+
+def signal_stop(query) -> None:
+    """Notifies the pollers of a query that it was stopped"""
+    if cache:
+        cache.set(
+            stop_signal_key(query.id),
+            True,
+            timeout=config.get("SQLLAB_ASYNC_TIME_LIMIT_SEC"),
+        )
+
+
+class QueryProgressPoller:
+    """Paces the polling of a running query and the updates of its progress
+
+    Polls are spaced by intervals growing from ``min_interval`` up to
+    ``max_interval``. When a cache is configured, stop signals are read from
+    it, the status of the query only being read from the metadata database
+    once every ``max_interval`` seconds. Otherwise it is read on every poll.
+    Status reads begin a new transaction, committing the pending progress.
+    """
+
+    def __init__(self, query, session, min_interval=None, max_interval=None):
+        self.query = query
+        self.session = session
+        self.interval = min_interval or config.get("SQLLAB_POLL_MIN_INTERVAL")
+        self.max_interval = max(
+            max_interval or config.get("SQLLAB_POLL_MAX_INTERVAL"), self.interval
+        )
+        self.backoff = config.get("SQLLAB_POLL_BACKOFF")
+        self.min_progress_delta = config.get("SQLLAB_PROGRESS_MIN_DELTA")
+        self.committed_progress = query.progress or 0
+        self.status_checked_at = now_as_float()
+
+    def is_stopped(self) -> bool:
+        """Whether the query was stopped or timed out"""
+        if cache:
+            if cache.get(stop_signal_key(self.query.id)):
+                return True
+            # now_as_float is in milliseconds, max_interval in seconds
+            if now_as_float() - self.status_checked_at < self.max_interval * 1000:
+                return False
+        self.status_checked_at = now_as_float()
+        # end the transaction, whose snapshot may predate the status change
+        self.commit()
+        status = (
+            self.session.query(type(self.query).status)
+            .filter_by(id=self.query.id)
+            .scalar()
+        )
+        return status in (QueryStatus.STOPPED, QueryStatus.TIMED_OUT)
+
+    def set_progress(self, progress: float) -> None:
+        """Updates the progress, committing it when it moved enough"""
+        if progress <= (self.query.progress or 0):
+            return
+        self.query.progress = progress
+        if progress - self.committed_progress >= self.min_progress_delta:
+            self.commit()
+
+    def commit(self) -> None:
+        self.session.commit()
+        self.committed_progress = self.query.progress or 0
+
+    def sleep(self) -> None:
+        """Waits until the next poll, backing off a little more each time"""
+        time.sleep(self.interval)
+        self.interval = min(self.interval * self.backoff, self.max_interval)
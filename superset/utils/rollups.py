@@ -0,0 +1,252 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Answers chart queries by rolling up cached results of finer queries
+
+Cached results are indexed by everything in their query object but their
+group by, metrics, time grain and row limit. A query can be answered from
+an indexed result that is complete, groups by a superset of its columns
+at a time grain that nests in its own, and has all its metrics, as long
+as these metrics are additive (SUM, COUNT, MIN or MAX).
+"""
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import simplejson as json
+
+from superset import cache
+from superset.utils import cache_codecs
+from superset.utils.core import DTTM_ALIAS, get_metric_name, is_adhoc_metric
+
+# how the aggregates of finer groups combine into the aggregate of a group
+ROLLUP_FUNCTIONS = {"SUM": "sum", "COUNT": "sum", "MIN": "min", "MAX": "max"}
+
+# pandas frequencies of the time grains that truncate like they do in SQL
+FIXED_GRAINS = {
+    "PT1S": (1, "S"),
+    "PT1M": (60, "T"),
+    "PT5M": (5 * 60, "5T"),
+    "PT10M": (10 * 60, "10T"),
+    "PT15M": (15 * 60, "15T"),
+    "PT0.5H": (30 * 60, "30T"),
+    "PT1H": (60 * 60, "H"),
+    "P1D": (24 * 60 * 60, "D"),
+}
+CALENDAR_GRAINS = {"P1M": (1, "M"), "P0.25Y": (3, "Q"), "P1Y": (12, "A")}
+
+# most results indexed under the same key
+MAX_INDEX_ENTRIES = 20
+
+AGGREGATE_RE = re.compile(
+    r"^\s*(SUM|COUNT|MIN|MAX)\s*\((?!\s*DISTINCT\b)([^()]|\([^()]*\))*\)\s*$",
+    re.IGNORECASE,
+)
+
+
+def metric_rollup_function(metric: Any, saved_metrics: Dict[str, str]) -> Optional[str]:
+    """The pandas aggregation rolling a metric up, None if it isn't additive"""
+    if not is_adhoc_metric(metric):
+        expression = saved_metrics.get(metric)
+    elif metric.get("expressionType") == "SIMPLE":
+        aggregate = (metric.get("aggregate") or "").upper()
+        return ROLLUP_FUNCTIONS.get(aggregate)
+    else:
+        expression = metric.get("sqlExpression")
+    match = AGGREGATE_RE.match(expression or "")
+    return ROLLUP_FUNCTIONS[match.group(1).upper()] if match else None
+
+
+def can_roll_up_grain(source: Optional[str], target: Optional[str]) -> bool:
+    """Whether the time buckets of grain `target` are unions of `source`'s"""
+    if source == target:
+        return True
+    if not source:
+        return target in FIXED_GRAINS or target in CALENDAR_GRAINS
+    if source in FIXED_GRAINS:
+        if target in FIXED_GRAINS:
+            return FIXED_GRAINS[target][0] % FIXED_GRAINS[source][0] == 0
+        return target in CALENDAR_GRAINS
+    if source in CALENDAR_GRAINS and target in CALENDAR_GRAINS:
+        return CALENDAR_GRAINS[target][0] % CALENDAR_GRAINS[source][0] == 0
+    return False
+
+
+def truncate(series: pd.Series, grain: Optional[str]) -> pd.Series:
+    """Truncates timestamps to the start of their time grain"""
+    if grain in FIXED_GRAINS:
+        return series.dt.floor(FIXED_GRAINS[grain][1])
+    if grain in CALENDAR_GRAINS:
+        return series.dt.to_period(CALENDAR_GRAINS[grain][1]).dt.to_timestamp()
+    return series
+
+
+def index_key(query_obj: Dict[str, Any], **extra: Any) -> Optional[str]:
+    """
+    Key of the index of the results `query_obj` may be rolled up from,
+    plus any other key/values in `extra`.
+
+    :return: the key, or None if the query can't be answered by a rollup
+    """
+    extras = dict(query_obj.get("extras") or {})
+    if (
+        not query_obj.get("metrics")
+        or query_obj.get("columns")
+        or query_obj.get("orderby")
+        or query_obj.get("timeseries_limit")
+        or query_obj.get("prequeries")
+        or extras.get("having")
+        or extras.get("having_druid")
+    ):
+        return None
+    index_dict = {
+        k: v
+        for k, v in query_obj.items()
+        if k
+        not in (
+            "groupby",
+            "metrics",
+            "row_limit",
+            "order_desc",
+            "timeseries_limit_metric",
+        )
+    }
+    extras.pop("time_grain_sqla", None)
+    index_dict["extras"] = extras
+    index_dict.update(extra)
+    json_data = json.dumps(index_dict, sort_keys=True, default=str)
+    return "rollup/" + hashlib.md5(json_data.encode("utf-8")).hexdigest()
+
+
+def make_entry(query_obj: Dict[str, Any], cache_key: str, rowcount: int) -> Dict:
+    """The index entry of a result cached at `cache_key`"""
+    row_limit = query_obj.get("row_limit")
+    return {
+        "cache_key": cache_key,
+        "groupby": list(query_obj.get("groupby") or []),
+        "metrics": list(query_obj.get("metrics") or []),
+        "grain": (query_obj.get("extras") or {}).get("time_grain_sqla") or None,
+        "complete": not row_limit or rowcount < row_limit,
+    }
+
+
+def register(key: str, entry: Dict, timeout: Optional[int]) -> None:
+    """Adds the entry of a cached result to the index at `key`"""
+    entries = [e for e in cache.get(key) or [] if e["cache_key"] != entry["cache_key"]]
+    entries = (entries + [entry])[-MAX_INDEX_ENTRIES:]
+    cache.set(key, entries, timeout=timeout)
+
+
+def subsumes(entry: Dict, query_obj: Dict[str, Any], regrain: bool = True) -> bool:
+    """
+    Whether the result of an index entry holds the data of `query_obj`
+
+    :param regrain: whether the timestamps of the result can be truncated to
+        a coarser time grain, which they can't once shifted by an offset
+    """
+    if not entry["complete"]:
+        return False
+    if not set(query_obj.get("groupby") or []) <= set(entry["groupby"]):
+        return False
+    if any(metric not in entry["metrics"] for metric in query_obj["metrics"]):
+        return False
+    if not query_obj.get("is_timeseries"):
+        return True
+    grain = (query_obj.get("extras") or {}).get("time_grain_sqla") or None
+    if not regrain:
+        return entry["grain"] == grain
+    return can_roll_up_grain(entry["grain"], grain)
+
+
+def roll_up(
+    df: pd.DataFrame, query_obj: Dict[str, Any], functions: Dict[str, str]
+) -> Optional[pd.DataFrame]:
+    """
+    Aggregates a finer result to the group by and time grain of `query_obj`
+
+    :param df: the finer result
+    :param query_obj: the query to answer
+    :param functions: the rollup function of each metric, by label
+    :return: the result of the query, or None if `df` can't be rolled up
+    """
+    keys: List[str] = list(query_obj.get("groupby") or [])
+    if query_obj.get("is_timeseries"):
+        keys = [DTTM_ALIAS] + keys
+    columns = keys + list(functions)
+    if any(col not in df.columns for col in columns):
+        return None
+    # SQL groups nulls together, pandas drops them
+    if df[keys].isnull().values.any():
+        return None
+
+    df = df[columns].copy()
+    if query_obj.get("is_timeseries"):
+        grain = (query_obj.get("extras") or {}).get("time_grain_sqla") or None
+        df[DTTM_ALIAS] = truncate(df[DTTM_ALIAS], grain)
+    # SQL sums only nulls to NULL, where pandas sums them to 0
+    sums = [label for label, f in functions.items() if f == "sum"]
+    if keys:
+        grouped = df.groupby(keys, sort=False)
+        rolled = grouped.agg(functions)
+        if sums:
+            rolled[sums] = grouped[sums].sum(min_count=1)
+        df = rolled.reset_index()
+    else:
+        df = pd.DataFrame(
+            {
+                label: [
+                    df[label].sum(min_count=1) if label in sums else df[label].agg(f)
+                ]
+                for label, f in functions.items()
+            }
+        )
+    df = df[columns]
+
+    # same order and limit as the SQL of the query
+    label = get_metric_name(query_obj["metrics"][0])
+    df = df.sort_values(label, ascending=not query_obj.get("order_desc", True))
+    if query_obj.get("row_limit"):
+        df = df.head(query_obj["row_limit"])
+    return df.reset_index(drop=True)
+
+
+def find_rollup(
+    key: str, query_obj: Dict[str, Any], functions: Dict[str, str], regrain: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Looks for a cached result `query_obj` can be rolled up from
+
+    :return: the cached value with its `df` rolled up, or None
+    """
+    for entry in reversed(cache.get(key) or []):
+        if not subsumes(entry, query_obj, regrain):
+            continue
+        cache_value = cache.get(entry["cache_key"])
+        if not cache_value:
+            continue
+        try:
+            cache_value = cache_codecs.deserialize(cache_value)
+            df = roll_up(cache_value["df"], query_obj, functions)
+        except Exception as e:
+            logging.exception(e)
+            continue
+        if df is not None:
+            cache_value["df"] = df
+            return cache_value
+    return None
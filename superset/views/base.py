@@ -17,11 +17,21 @@
 # pylint: disable=C,R,W
 from datetime import datetime
 import functools
+import itertools
 import logging
 import traceback
 from typing import Any, Dict
 
-from flask import abort, flash, g, get_flashed_messages, redirect, Response
+from flask import (
+    abort,
+    flash,
+    g,
+    get_flashed_messages,
+    redirect,
+    request,
+    Response,
+    stream_with_context,
+)
 from flask_appbuilder import BaseView, ModelView
 from flask_appbuilder.actions import action
 from flask_appbuilder.forms import DynamicForm
@@ -351,6 +361,24 @@ class CsvResponse(Response):
     charset = conf.get("CSV_EXPORT").get("encoding", "utf-8")
 
 
+def csv_stream_response(chunks, filename=None, mimetype="text/csv"):
+    """Streams CSV chunks to the client, gzipped when the client accepts it
+
+    The first chunk is produced before the response is returned, so that
+    errors raised while running the query still surface as regular errors.
+    """
+    chunks = iter(chunks)
+    chunks = itertools.chain([next(chunks)], chunks)
+    headers = generate_download_headers("csv", filename)
+    headers["Vary"] = "Accept-Encoding"
+    if "gzip" in request.headers.get("Accept-Encoding", "").lower():
+        chunks = utils.gzip_chunks(chunks, CsvResponse.charset)
+        headers["Content-Encoding"] = "gzip"
+    return CsvResponse(
+        stream_with_context(chunks), status=200, headers=headers, mimetype=mimetype
+    )
+
+
 def check_ownership(obj, raise_if_false=True):
     """Meant to be used in `pre_update` hooks on models to enforce ownership
 
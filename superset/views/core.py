@@ -15,6 +15,7 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+from concurrent.futures import as_completed, ThreadPoolExecutor
 from contextlib import closing
 from datetime import datetime, timedelta
 import logging
@@ -31,6 +32,7 @@ from flask import (
     render_template,
     request,
     Response,
+    stream_with_context,
     url_for,
 )
 from flask_appbuilder import expose
@@ -59,6 +61,7 @@ from superset import (
     sql_lab,
     viz,
 )
+from superset.connectors.base.models import BaseDatasource
 from superset.connectors.connector_registry import ConnectorRegistry
 from superset.connectors.sqla.models import AnnotationDatasource
 from superset.exceptions import (
@@ -68,20 +71,24 @@ from superset.exceptions import (
 )
 from superset.jinja_context import get_template_processor
 from superset.legacy import update_time_range
+from superset.models.catalog import CatalogEntry
 import superset.models.core as models
 from superset.models.sql_lab import Query
 from superset.models.user_attributes import UserAttribute
 from superset.sql_parse import ParsedQuery
 from superset.sql_validators import get_validator_by_name
+from superset.tasks.cache import warm_up_datasource
 from superset.utils import core as utils
-from superset.utils import dashboard_import_export
+from superset.utils import dashboard_import_export, paged_results
+from superset.utils.cache import invalidate_datasource
 from superset.utils.dates import now_as_float
 from superset.utils.decorators import etag_cache
+from superset.utils.query_progress import signal_stop
 from .base import (
     api,
     BaseSupersetView,
     check_ownership,
-    CsvResponse,
+    csv_stream_response,
     data_payload_response,
     DeleteMixin,
     generate_download_headers,
@@ -99,6 +106,7 @@ from .utils import (
     get_datasource_info,
     get_form_data,
     get_viz,
+    only_overrides_filters,
 )
 
 config = app.config
@@ -135,7 +143,7 @@ def is_owner(obj, user):
 
 def check_datasource_perms(
     self, datasource_type: str = None, datasource_id: int = None
-) -> None:
+) -> BaseDatasource:
     """
     Check if user can access a cached response from explore_json.
 
@@ -144,6 +152,7 @@ def check_datasource_perms(
 
     :param datasource_type: The datasource type, i.e., 'druid' or 'table'
     :param datasource_id: The datasource ID
+    :returns: The datasource, to index the cached response under
     :raises SupersetSecurityException: If the user cannot access the resource
     """
 
@@ -164,6 +173,7 @@ def check_datasource_perms(
     )
 
     security_manager.assert_datasource_permission(viz_obj.datasource)
+    return viz_obj.datasource
 
 
 def check_slice_perms(self, slice_id):
@@ -173,6 +183,7 @@ def check_slice_perms(self, slice_id):
     This function takes `self` since it must have the same signature as the
     the decorated method.
 
+    Returns the datasource of the slice, to index the cached response under.
     """
     form_data, slc = get_form_data(slice_id, use_slice_data=True)
     datasource_type = slc.datasource.type
@@ -184,6 +195,7 @@ def check_slice_perms(self, slice_id):
         force=False,
     )
     security_manager.assert_datasource_permission(viz_obj.datasource)
+    return viz_obj.datasource
 
 
 class SliceFilter(SupersetFilter):
@@ -999,11 +1011,8 @@ class Superset(BaseSupersetView):
         self, viz_obj, csv=False, query=False, results=False, samples=False
     ):
         if csv:
-            return CsvResponse(
-                viz_obj.get_csv(),
-                status=200,
-                headers=generate_download_headers("csv"),
-                mimetype="application/csv",
+            return csv_stream_response(
+                viz_obj.get_csv_chunks(), mimetype="application/csv"
             )
 
         if query:
@@ -1097,6 +1106,152 @@ class Superset(BaseSupersetView):
             viz_obj, csv=csv, query=query, results=results, samples=samples
         )
 
+    def get_chart_payload_json(self, viz_obj):
+        """Returns the status and payload `explore_json` would respond with,
+        querying the datasource through the session of the calling thread"""
+        try:
+            viz_obj.load_thread_datasource()
+            payload = viz_obj.get_payload()
+            payload_json, has_error = viz_obj.payload_json_and_has_error(payload)
+            return 400 if has_error else 200, payload_json
+        except Exception as e:
+            logging.exception(e)
+            return 500, self.chart_error_json(e)
+
+    @staticmethod
+    def chart_error_json(e):
+        return json.dumps(
+            {
+                "error": utils.error_msg_from_exception(e),
+                "stacktrace": utils.get_stacktrace(),
+            }
+        )
+
+    @event_logger.log_this
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose("/dashboard_charts_json/<dashboard_id>/", methods=["POST"])
+    def dashboard_charts_json(self, dashboard_id):
+        """Serves the payloads of many charts of a dashboard in one request
+
+        The request POSTs a list of `form_data`, each one of them holding
+        the `slice_id` of a chart of the dashboard. Access to datasources is
+        checked once for all the charts using them, and each chart queries
+        its own instance of its datasource.
+
+        The charts are queried concurrently and their payloads are streamed
+        back, as they complete, as lines of JSON holding the `slice_id`, the
+        HTTP `status` that `explore_json` would have responded with, and the
+        `payload` itself.
+        """
+        force = request.args.get("force") == "true"
+        dash = (
+            db.session.query(models.Dashboard).filter_by(id=dashboard_id).one_or_none()
+        )
+        if not dash:
+            abort(404)
+        dashboard_id = dash.id
+        slices = {slc.id: slc for slc in dash.slices}
+
+        datasources = {}
+        viz_objs = []
+        errors = []
+        for form_data in json.loads(request.form.get("form_data") or "[]"):
+            if not isinstance(form_data, dict):
+                error = __("The form data of a chart must be an object")
+                errors.append((None, 400, json.dumps({"error": error})))
+                continue
+            form_data = {
+                k: v for k, v in form_data.items() if k not in FORM_DATA_KEY_BLACKLIST
+            }
+            slice_id = form_data.get("slice_id")
+            slc = slices.get(slice_id) if isinstance(slice_id, int) else None
+            if not slc:
+                error = __("The chart does not belong to this dashboard")
+                errors.append((slice_id, 404, json.dumps({"error": error})))
+                continue
+
+            if only_overrides_filters(form_data):
+                form_data = dict(slc.form_data, **form_data)
+            update_time_range(form_data)
+
+            try:
+                datasource_id, datasource_type = get_datasource_info(
+                    None, None, form_data
+                )
+                key = (datasource_type, datasource_id)
+                if key not in datasources:
+                    try:
+                        datasources[key] = ConnectorRegistry.get_datasource(
+                            datasource_type, datasource_id, db.session
+                        )
+                        security_manager.assert_datasource_permission(datasources[key])
+                    except Exception as e:
+                        datasources[key] = e
+                if isinstance(datasources[key], Exception):
+                    raise datasources[key]
+
+                viz_type = form_data.get("viz_type", "table")
+                viz_obj = viz.viz_types[viz_type](
+                    datasources[key], form_data=form_data, force=force
+                )
+                viz_objs.append((slice_id, viz_obj))
+            except Exception as e:
+                logging.exception(e)
+                status = getattr(e, "status", 500)
+                errors.append((slice_id, status, self.chart_error_json(e)))
+
+        def chart_line(slice_id, status, payload_json):
+            return '{{"slice_id": {}, "status": {}, "payload": {}}}\n'.format(
+                json.dumps(slice_id), status, payload_json
+            )
+
+        def chart_payload_json(viz_obj):
+            start_dttm = datetime.now()
+            status, payload_json = self.get_chart_payload_json(viz_obj)
+            duration_ms = (datetime.now() - start_dttm).total_seconds() * 1000
+            return status, payload_json, duration_ms
+
+        # the views of the charts are logged one by one, like `explore_json` logs
+        # them, the batch itself being logged without a chart
+        user_id = g.user.get_id() if g.user else None
+        referrer = request.referrer[:1000] if request.referrer else None
+
+        def generate():
+            for error in errors:
+                yield chart_line(*error)
+            if not viz_objs:
+                return
+
+            max_workers = min(
+                len(viz_objs), config.get("DASHBOARD_MAX_CONCURRENT_CHARTS") or 1
+            )
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        utils.copy_current_context(chart_payload_json), viz_obj
+                    ): (slice_id, viz_obj)
+                    for slice_id, viz_obj in viz_objs
+                }
+                for future in as_completed(futures):
+                    slice_id, viz_obj = futures[future]
+                    status, payload_json, duration_ms = future.result()
+                    event_logger.log(
+                        user_id,
+                        "dashboard_chart_json",
+                        records=[viz_obj.form_data],
+                        dashboard_id=dashboard_id,
+                        slice_id=slice_id,
+                        duration_ms=duration_ms,
+                        referrer=referrer,
+                    )
+                    yield chart_line(slice_id, status, payload_json)
+
+        return Response(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
+        )
+
     @event_logger.log_this
     @has_access
     @expose("/import_dashboards", methods=["GET", "POST"])
@@ -1449,6 +1604,12 @@ class Superset(BaseSupersetView):
         substr = utils.parse_js_uri_path_item(substr, eval_undefined=True)
         database = db.session.query(models.Database).filter_by(id=db_id).one()
 
+        # tables created since the last refresh of the catalog are only listed
+        # when forcing a refresh, which lists them from the database
+        if not force_refresh and CatalogEntry.has_catalog(db.session, database):
+            payload = self.search_table_catalog(database, schema, substr)
+            return json_success(json.dumps(payload))
+
         if schema:
             tables = (
                 database.get_all_table_names_in_schema(
@@ -1527,6 +1688,63 @@ class Superset(BaseSupersetView):
         payload = {"tableLength": len(tables) + len(views), "options": table_options}
         return json_success(json.dumps(payload))
 
+    def search_table_catalog(self, database, schema, substr):
+        """Answers `tables` from the table catalog, a page of at most
+        MAX_TABLE_NAMES tables and views at a time
+
+        :returns: the payload of the response
+        """
+        page = request.args.get("page", 0, type=int)
+        limit = config.get("MAX_TABLE_NAMES")
+
+        names = None
+        if not (
+            security_manager.database_access(database)
+            or security_manager.all_datasource_access()
+            or (
+                schema
+                and security_manager.can_access(
+                    "schema_access", security_manager.get_schema_perm(database, schema)
+                )
+            )
+        ):
+            names = {
+                (d.schema, d.table_name)
+                for d in ConnectorRegistry.query_datasources_by_permissions(
+                    db.session, database, security_manager._user_datasource_perms()
+                )
+            }
+
+        schemas = None
+        if not schema and database.default_schemas:
+            user_schema = g.user.email.split("@")[0]
+            schemas = database.default_schemas + [user_schema]
+
+        count, entries = CatalogEntry.search(
+            db.session,
+            database,
+            substr=substr,
+            schema=schema,
+            schemas=schemas,
+            names=names,
+            offset=page * limit if limit else 0,
+            limit=limit,
+        )
+        options = []
+        for entry in entries:
+            label = entry.name if schema else f"{entry.schema}.{entry.name}"
+            if entry.type == "view":
+                label = f"[view] {label}"
+            options.append(
+                {
+                    "value": entry.name,
+                    "schema": entry.schema,
+                    "label": label,
+                    "title": label,
+                }
+            )
+        return {"tableLength": count, "options": options, "page": page}
+
     @api
     @has_access_api
     @expose("/copy_dash/<dashboard_id>/", methods=["GET", "POST"])
@@ -2017,6 +2235,33 @@ class Superset(BaseSupersetView):
             )
         )
 
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose("/invalidate_cache/<datasource_type>/<datasource_id>/", methods=["POST"])
+    def invalidate_cache(self, datasource_type, datasource_id):
+        """Evicts the cached data of a datasource, e.g. after its table was
+        reloaded, and optionally warms up the cache of its charts again.
+
+        The `since` and `until` form fields restrict the eviction to the data
+        of overlapping time ranges, `warm_up=true` queues the warm up.
+        """
+        datasource = ConnectorRegistry.get_datasource(
+            datasource_type, datasource_id, db.session
+        )
+        security_manager.assert_datasource_permission(datasource)
+        since = request.form.get("since")
+        until = request.form.get("until")
+        keys = invalidate_datasource(
+            datasource.uid,
+            utils.parse_human_datetime(since) if since else None,
+            utils.parse_human_datetime(until) if until else None,
+        )
+        warm_up = request.form.get("warm_up") == "true"
+        if warm_up:
+            warm_up_datasource.delay(datasource.type, datasource.id)
+        return json_success(json.dumps({"invalidated": len(keys), "warm_up": warm_up}))
+
     @has_access_api
     @expose("/favstar/<class_name>/<obj_id>/<action>/")
     def favstar(self, class_name, obj_id, action):
@@ -2382,17 +2627,21 @@ class Superset(BaseSupersetView):
     @expose("/results/<key>/")
     @event_logger.log_this
     def results(self, key):
-        """Serves a key off of the results backend"""
+        """Serves a key off of the results backend
+
+        Only a window of the rows is served, starting at the ``offset`` request
+        argument and holding at most ``limit`` and ``DISPLAY_MAX_ROW`` rows.
+        """
         if not results_backend:
             return json_error_response("Results backend isn't configured")
 
         read_from_results_backend_start = now_as_float()
-        blob = results_backend.get(key)
+        manifest = paged_results.read_manifest(results_backend, key)
         stats_logger.timing(
             "sqllab.query.results_backend_read",
             now_as_float() - read_from_results_backend_start,
         )
-        if not blob:
+        if not manifest:
             return json_error_response(
                 "Data could not be retrieved. " "You may want to re-run the query.",
                 status=410,
@@ -2406,19 +2655,36 @@ class Superset(BaseSupersetView):
             )
 
         rejected_tables = security_manager.rejected_tables(
-            query.sql, query.database, query.schema
+            query.sql, query.database, query.schema, tables=query.tables
         )
         if rejected_tables:
             return json_error_response(
                 security_manager.get_table_access_error_msg(rejected_tables), status=403
             )
 
-        payload = utils.zlib_decompress_to_string(blob)
-        payload_json = json.loads(payload)
+        offset = max(request.args.get("offset", 0, type=int), 0)
+        limit = request.args.get("limit", type=int)
+        display_limit = config.get("DISPLAY_MAX_ROW")
+        if display_limit:
+            limit = min(limit, display_limit) if limit else display_limit
+        read_pages_start = now_as_float()
+        try:
+            manifest["data"] = paged_results.read_rows(
+                results_backend, key, manifest, offset, limit
+            )
+        except SupersetException:
+            return json_error_response(
+                "Data could not be retrieved. " "You may want to re-run the query.",
+                status=410,
+            )
+        stats_logger.timing(
+            "sqllab.query.results_backend_read_pages", now_as_float() - read_pages_start
+        )
+        manifest["offset"] = offset
 
         return json_success(
             json.dumps(
-                apply_display_max_row_limit(payload_json),
+                apply_display_max_row_limit(manifest),
                 default=utils.json_iso_dttm_ser,
                 ignore_nan=True,
             )
@@ -2433,6 +2699,7 @@ class Superset(BaseSupersetView):
             query = db.session.query(Query).filter_by(client_id=client_id).one()
             query.status = QueryStatus.STOPPED
             db.session.commit()
+            signal_stop(query)
         except Exception:
             pass
         return self.json_response("OK")
@@ -2552,6 +2819,8 @@ class Superset(BaseSupersetView):
             user_id=g.user.get_id() if g.user else None,
             client_id=client_id,
         )
+        # saves re-parsing the SQL on each access check of its results
+        query.set_extra_json_key("tables", sorted(ParsedQuery(sql).tables))
         session.add(query)
         session.flush()
         query_id = query.id
@@ -2649,7 +2918,7 @@ class Superset(BaseSupersetView):
         query = db.session.query(Query).filter_by(client_id=client_id).one()
 
         rejected_tables = security_manager.rejected_tables(
-            query.sql, query.database, query.schema
+            query.sql, query.database, query.schema, tables=query.tables
         )
         if rejected_tables:
             flash(
@@ -2658,32 +2927,28 @@ class Superset(BaseSupersetView):
                 )
             )
             return redirect("/")
-        blob = None
+        manifest = None
+        chunksize = config.get("CSV_EXPORT_CHUNK_SIZE")
         if results_backend and query.results_key:
             logging.info(
                 "Fetching CSV from results backend " "[{}]".format(query.results_key)
             )
-            blob = results_backend.get(query.results_key)
-        if blob:
-            logging.info("Decompressing")
-            json_payload = utils.zlib_decompress_to_string(blob)
-            obj = json.loads(json_payload)
-            columns = [c["name"] for c in obj["columns"]]
-            df = pd.DataFrame.from_records(obj["data"], columns=columns)
-            logging.info("Using pandas to convert to CSV")
-            csv = df.to_csv(index=False, **config.get("CSV_EXPORT"))
+            manifest = paged_results.read_manifest(results_backend, query.results_key)
+        if manifest:
+            columns = [c["name"] for c in manifest["columns"]]
+            pages = paged_results.iter_pages(
+                results_backend, query.results_key, manifest, chunksize
+            )
+            dfs = (
+                pd.DataFrame.from_records(records, columns=columns) for records in pages
+            )
         else:
             logging.info("Running a query to turn into CSV")
             sql = query.select_sql or query.executed_sql
-            df = query.database.get_df(sql, query.schema)
-            # TODO(bkyryliuk): add compression=gzip for big files.
-            csv = df.to_csv(index=False, **config.get("CSV_EXPORT"))
-        response = Response(csv, mimetype="text/csv")
-        response.headers[
-            "Content-Disposition"
-        ] = f"attachment; filename={query.name}.csv"
-        logging.info("Ready to return response")
-        return response
+            dfs = query.database.get_df_chunks(sql, query.schema, chunksize)
+        chunks = utils.df_to_csv_chunks(dfs, index=False, **config.get("CSV_EXPORT"))
+        logging.info("Streaming CSV response")
+        return csv_stream_response(chunks, filename=query.name)
 
     @api
     @handle_api_exception
@@ -145,7 +145,14 @@ class DatabaseMixin:  # noqa
             "If database flavor does not support schema or any schema is allowed "
             "to be accessed, just leave the list empty"
             "4. the ``version`` field is a string specifying the this db's version. "
-            "This should be used with Presto DBs so that the syntax is correct",
+            "This should be used with Presto DBs so that the syntax is correct<br/>"
+            "5. The ``engine_pool`` object enables a pool of connections shared "
+            "by the chart queries run against this database, one pool per "
+            "impersonated user. Its ``pool_size``, ``max_overflow``, "
+            "``pool_timeout``, ``pool_recycle`` and ``pool_pre_ping`` entries "
+            'are passed to the engine. Specify it as **"engine_pool": '
+            '{"pool_size": 5, "max_overflow": 10, "pool_recycle": 3600, '
+            '"pool_pre_ping": true}**. Connections are not pooled otherwise',
             True,
         ),
         "impersonate_user": _(
@@ -17,19 +17,33 @@
 # pylint: disable=C,R,W
 import os
 
-from flask import flash, redirect
-from flask_appbuilder import SimpleFormView
+from flask import flash, g, redirect
+from flask_appbuilder import expose, SimpleFormView
 from flask_appbuilder.models.sqla.interface import SQLAInterface
+from flask_appbuilder.security.decorators import has_access_api
 from flask_babel import gettext as __
 from flask_babel import lazy_gettext as _
+import simplejson as json
 from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 
 from superset import app, appbuilder, security_manager
 from superset.connectors.sqla.models import SqlaTable
 import superset.models.core as models
+from superset.tasks.csv_upload import (
+    get_upload_status,
+    PENDING,
+    set_upload_status,
+    upload_csv,
+)
 from superset.utils import core as utils
-from superset.views.base import DeleteMixin, SupersetModelView, YamlExportMixin
+from superset.views.base import (
+    DeleteMixin,
+    json_error_response,
+    json_success,
+    SupersetModelView,
+    YamlExportMixin,
+)
 from . import DatabaseMixin
 from .forms import CsvToDatabaseForm
 
@@ -106,6 +120,11 @@ class CsvToDatabaseView(SimpleFormView):
         form.csv_file.data.filename = secure_filename(form.csv_file.data.filename)
         csv_filename = form.csv_file.data.filename
         path = os.path.join(config["UPLOAD_FOLDER"], csv_filename)
+        if (
+            config["CSV_UPLOAD_ASYNC"]
+            and database.db_engine_spec.allows_async_csv_upload
+        ):
+            return self.upload_async(form)
         try:
             utils.ensure_path_exists(config["UPLOAD_FOLDER"])
             csv_file.save(path)
@@ -140,6 +159,48 @@ class CsvToDatabaseView(SimpleFormView):
         stats_logger.incr("successful_csv_upload")
         return redirect("/tablemodelview/list/")
 
+    def upload_async(self, form):
+        """Saves the csv and has a Celery worker load it into the table"""
+        database = form.con.data
+        upload_id = utils.shortid()
+        try:
+            params = database.db_engine_spec.get_csv_upload_params(form)
+            csv_filename = params["filename"]
+            # concurrent uploads of files of the same name don't share a path
+            params["filename"] = f"{upload_id}_{csv_filename}"
+            utils.ensure_path_exists(config["UPLOAD_FOLDER"])
+            form.csv_file.data.save(
+                os.path.join(config["UPLOAD_FOLDER"], params["filename"])
+            )
+        except Exception as e:
+            flash(str(e), "danger")
+            stats_logger.incr("failed_csv_upload")
+            return redirect("/csvtodatabaseview/form")
+
+        status = {"state": PENDING, "user_id": g.user.id, "table_name": form.name.data}
+        set_upload_status(upload_id, status)
+        upload_csv.delay(upload_id, database.id, params, g.user.id)
+        message = _(
+            'CSV file "{0}" is being uploaded to table "{1}" in database "{2}". '
+            "Its progress is at {3}".format(
+                csv_filename,
+                form.name.data,
+                database.database_name,
+                f"/csvtodatabaseview/status/{upload_id}/",
+            )
+        )
+        flash(message, "info")
+        return redirect("/tablemodelview/list/")
+
+    @expose("/status/<upload_id>/")
+    @has_access_api
+    def status(self, upload_id):
+        """The progress of a csv upload loaded by a Celery worker"""
+        status = get_upload_status(upload_id)
+        if not status or status["user_id"] != g.user.id:
+            return json_error_response("Unknown upload", status=404)
+        return json_success(json.dumps(status))
+
     def is_schema_allowed(self, database, schema):
         if not database.allow_csv_upload:
             return False
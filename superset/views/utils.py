@@ -91,6 +91,12 @@ def get_viz(
         return viz_obj
 
 
+def only_overrides_filters(form_data: Dict[str, Any]) -> bool:
+    """Check if form data only contains slice_id, additional filters and viz type"""
+    valid_keys = ["slice_id", "extra_filters", "adhoc_filters", "viz_type"]
+    return all(key in valid_keys for key in form_data)
+
+
 def get_form_data(slice_id=None, use_slice_data=False):
     form_data = {}
     post_data = request.form.get("form_data")
@@ -121,9 +127,7 @@ def get_form_data(slice_id=None, use_slice_data=False):
     slice_id = form_data.get("slice_id") or slice_id
     slc = None
 
-    # Check if form data only contains slice_id, additional filters and viz type
-    valid_keys = ["slice_id", "extra_filters", "adhoc_filters", "viz_type"]
-    valid_slice_id = all(key in valid_keys for key in form_data)
+    valid_slice_id = only_overrides_filters(form_data)
 
     # Include the slice_form_data if request from explore or slice calls
     # or if form_data only contains slice_id and additional filters
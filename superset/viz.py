@@ -21,6 +21,7 @@ These objects represent the backend of all the visualizations that
 Superset can render.
 """
 from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import copy
 from datetime import datetime, timedelta
 from functools import reduce
@@ -29,7 +30,6 @@ import inspect
 from itertools import product
 import logging
 import math
-import pickle as pkl
 import re
 import uuid
 
@@ -44,16 +44,25 @@ import pandas as pd
 from pandas.tseries.frequencies import to_offset
 import polyline
 import simplejson as json
+import sqlalchemy as sqla
+from sqlalchemy.orm.state import InstanceState
 
-from superset import app, cache, get_css_manifest_files
+from superset import app, cache, db, get_css_manifest_files
 from superset.exceptions import NullValueException, SpatialException
-from superset.utils import core as utils
+from superset.utils import cache_codecs, core as utils, rollups
+from superset.utils.cache import (
+    acquire_lease,
+    index_cache_key,
+    release_lease,
+    wait_for_key,
+)
 from superset.utils.core import (
     DTTM_ALIAS,
     JS_MAX_INTEGER,
     merge_extra_filters,
     to_adhoc,
 )
+from superset.utils.dates import EPOCH
 
 
 config = app.config
@@ -145,18 +154,23 @@ class BaseViz(object):
                         d[k] = str(v)
         return data
 
-    def run_extra_queries(self):
+    def extra_queries(self):
         """Lifecycle method to use when more than one query is needed
 
         In rare-ish cases, a visualization may need to execute multiple
         queries. That is the case for FilterBox or for time comparison
         in Line chart for instance.
 
-        In those cases, we need to make sure these queries run before the
-        main `get_payload` method gets called, so that the overall caching
-        metadata can be right. The way it works here is that if any of
-        the previous `get_df_payload` calls hit the cache, the main
-        payload's metadata will reflect that.
+        This method returns a list of `(query_obj, kwargs)` tuples, the
+        `kwargs` being passed along to `get_df_payload`. These queries are
+        sent to the datasource together with the main query (see
+        `get_df_payloads`), and their payloads are then handed over to
+        `process_extra_payloads`, in the same order, before the main
+        payload gets processed.
+
+        The overall caching metadata is the same as if the queries had run
+        one after the other, the extra queries first: if any of them hit
+        the cache, the main payload's metadata will reflect that.
 
         The multi-query support may need more work to become a first class
         use case in the framework, and for the UI to reflect the subtleties
@@ -166,8 +180,82 @@ class BaseViz(object):
         when moving from caching the visualization's data itself, to caching
         the underlying query(ies).
         """
+        return []
+
+    def process_extra_payloads(self, payloads):
+        """Receives the payloads of the queries returned by `extra_queries`"""
         pass
 
+    def load_thread_datasource(self):
+        """Reloads the datasource through the session of the calling thread
+
+        ORM objects load their attributes through the session that loaded
+        them, which can't be shared across threads: copies of the viz run by
+        worker threads get an instance of the datasource of their own.
+        """
+        state = sqla.inspect(self.datasource, raiseerr=False)
+        if not isinstance(state, InstanceState) or state.identity is None:
+            return
+        datasource = db.session.query(state.class_).get(state.identity)
+        if not datasource:
+            raise Exception(_("Viz is missing a datasource"))
+        self.datasource = datasource
+
+    # attributes of the viz that `get_df_payload` sets while querying
+    query_state_attributes = (
+        "query",
+        "status",
+        "error_msg",
+        "error_message",
+        "results",
+        "_any_cache_key",
+        "_any_cached_dttm",
+    )
+
+    def get_df_payloads(self, queries):
+        """Runs `get_df_payload` for every `(query_obj, kwargs)` in `queries`
+
+        The queries are run concurrently, at most VIZ_MAX_CONCURRENT_QUERIES
+        at a time. Each one runs on its own copy of the viz, so that it
+        keeps its own cache lookup, status and error. The state of the
+        copies is then merged back into the viz in order, which leaves it as
+        it would be had the queries run one after the other. Copies run by
+        worker threads reload the datasource, see `load_thread_datasource`.
+        """
+        initial_state = {
+            attr: getattr(self, attr) for attr in self.query_state_attributes
+        }
+        vizs = [copy.copy(self) for _ in queries]
+        max_workers = min(len(vizs), config.get("VIZ_MAX_CONCURRENT_QUERIES") or 1)
+        if max_workers > 1:
+
+            def get_df_payload(viz_obj, query_obj, kwargs):
+                viz_obj.load_thread_datasource()
+                return viz_obj.get_df_payload(query_obj, **kwargs)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        utils.copy_current_context(get_df_payload),
+                        viz_obj,
+                        query_obj,
+                        kwargs,
+                    )
+                    for viz_obj, (query_obj, kwargs) in zip(vizs, queries)
+                ]
+            payloads = [future.result() for future in futures]
+        else:
+            payloads = [
+                viz_obj.get_df_payload(query_obj, **kwargs)
+                for viz_obj, (query_obj, kwargs) in zip(vizs, queries)
+            ]
+
+        for viz_obj in vizs:
+            for attr, value in initial_state.items():
+                if getattr(viz_obj, attr) is not value:
+                    setattr(self, attr, getattr(viz_obj, attr))
+        return payloads
+
     def get_samples(self):
         query_obj = self.query_obj()
         query_obj.update(
@@ -336,6 +424,213 @@ class BaseViz(object):
             return self.datasource.database.cache_timeout
         return config.get("CACHE_DEFAULT_TIMEOUT")
 
+    @property
+    def stale_cache_timeout(self):
+        stale_cache_timeout = getattr(self.datasource, "stale_cache_timeout", None)
+        if stale_cache_timeout is not None:
+            return stale_cache_timeout
+        return config.get("STALE_CACHE_TIMEOUT")
+
+    def can_serve_stale(self, query_obj):
+        """Whether the cached data of a query can be served past its timeout
+
+        Templated queries can depend on the user, so they can't be refreshed
+        in the background and expire as usual."""
+        return bool(
+            self.cache_timeout
+            and self.stale_cache_timeout
+            and not self.datasource.get_extra_cache_keys(query_obj)
+        )
+
+    def is_stale(self, cached_dttm):
+        if not self.cache_timeout:
+            return False
+        cached_at = datetime.strptime(cached_dttm, "%Y-%m-%dT%H:%M:%S")
+        age = (datetime.utcnow() - cached_at).total_seconds()
+        return age > self.cache_timeout
+
+    def refresh_stale_cache(self, cache_key):
+        """Refreshes the stale cached data of the chart in the background
+
+        The refresh holds the lease on the cache key, so that it only runs
+        once however many requests are served the stale data meanwhile."""
+        from superset.tasks.cache import refresh_chart_data
+
+        if not acquire_lease(cache_key):
+            return
+        try:
+            refresh_chart_data.delay(
+                self.datasource.type, self.datasource.id, self.form_data, cache_key
+            )
+        except Exception as e:
+            logging.exception(e)
+            release_lease(cache_key)
+
+    # seconds in the time grains whose buckets never straddle two segments
+    segment_grain_seconds = {
+        None: 1,
+        "PT1S": 1,
+        "PT1M": 60,
+        "PT5M": 5 * 60,
+        "PT10M": 10 * 60,
+        "PT15M": 15 * 60,
+        "PT0.5H": 30 * 60,
+        "PT1H": 60 * 60,
+        "P1D": 24 * 60 * 60,
+    }
+
+    def get_segment_bounds(self, query_obj):
+        """
+        Splits the time range of a time series query in the segments its data
+        is cached in, when TIMESERIES_CACHE_SEGMENT_SECONDS is set.
+
+        :param query_obj: the query object
+        :return: a list of `(start, end)` datetimes covering the time range,
+            or None if the data of the query can't be cached in segments
+        """
+        segment_seconds = config.get("TIMESERIES_CACHE_SEGMENT_SECONDS")
+        if not segment_seconds or not cache or self.force:
+            return None
+        if self.datasource.type != "table" or self.datasource.is_templated(query_obj):
+            return None
+        if not query_obj.get("is_timeseries") or not query_obj.get("granularity"):
+            return None
+        # the series kept by the limit depend on the whole time range
+        if query_obj.get("timeseries_limit") and query_obj.get("groupby"):
+            return None
+        from_dttm = query_obj.get("from_dttm")
+        to_dttm = query_obj.get("to_dttm")
+        if not from_dttm or not to_dttm or from_dttm >= to_dttm:
+            return None
+        grain = (query_obj.get("extras") or {}).get("time_grain_sqla")
+        grain_seconds = self.segment_grain_seconds.get(grain)
+        if not grain_seconds or segment_seconds % grain_seconds:
+            return None
+        if (from_dttm - EPOCH).total_seconds() % segment_seconds:
+            return None
+
+        bounds = []
+        start = from_dttm
+        while start < to_dttm:
+            end = min(start + timedelta(seconds=segment_seconds), to_dttm)
+            bounds.append((start, end))
+            start = end
+        return bounds
+
+    def segment_cache_key(self, query_obj, start, end):
+        """The cache key of the data of a query between `start` and `end`"""
+        cache_dict = {
+            k: v
+            for k, v in query_obj.items()
+            if k not in ("from_dttm", "to_dttm", "inner_from_dttm", "inner_to_dttm")
+        }
+        cache_dict["segment"] = [start, end]
+        cache_dict["datasource"] = self.datasource.uid
+        cache_dict["offset"] = self.datasource.offset
+        cache_dict["time_shift"] = str(self.time_shift)
+        cache_dict["enforce_numerical_metrics"] = self.enforce_numerical_metrics
+        json_data = self.json_dumps(cache_dict, sort_keys=True)
+        return hashlib.md5(json_data.encode("utf-8")).hexdigest()
+
+    def get_df_by_segments(self, query_obj, bounds):
+        """
+        Same as `get_df`, but serves the closed segments of the time range
+        from the cache. The segments missing from the cache and the open ones,
+        which may still get data, are queried, each run of consecutive
+        segments in a single query.
+        """
+        segment_size = bounds[0][1] - bounds[0][0]
+        now = datetime.now()
+        keys = [self.segment_cache_key(query_obj, start, end) for start, end in bounds]
+        closed = [end - start == segment_size and end <= now for start, end in bounds]
+        dfs = [None] * len(bounds)
+        try:
+            cache_values = cache.get_many(*keys)
+        except Exception as e:
+            logging.exception(e)
+            cache_values = [None] * len(keys)
+        for i, cache_value in enumerate(cache_values):
+            if cache_value and closed[i]:
+                try:
+                    dfs[i] = cache_codecs.deserialize(cache_value)["df"]
+                    stats_logger.incr("segment_cache.hit")
+                except Exception as e:
+                    logging.exception(e)
+
+        runs = []
+        for i, df in enumerate(dfs):
+            if df is not None:
+                continue
+            if runs and runs[-1][1] == i:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+
+        queries = []
+        shift = timedelta(hours=self.datasource.offset or 0) + self.time_shift
+        for first, last in runs:
+            run_query_obj = dict(
+                query_obj, from_dttm=bounds[first][0], to_dttm=bounds[last - 1][1]
+            )
+            df = self.get_df(run_query_obj)
+            if self.status == utils.QueryStatus.FAILED or df is None:
+                return None
+            queries.append(self.query)
+            if not df.empty:
+                timestamps = df[DTTM_ALIAS] - shift
+            for i in range(first, last):
+                stats_logger.incr("segment_cache.miss")
+                if df.empty:
+                    dfs[i] = df
+                else:
+                    start, end = bounds[i]
+                    dfs[i] = df[(timestamps >= start) & (timestamps < end)]
+                if not closed[i]:
+                    continue
+                try:
+                    cache_value = cache_codecs.serialize(
+                        dict(df=dfs[i]), config.get("DATA_CACHE_CODEC")
+                    )
+                    cache.set(keys[i], cache_value, timeout=self.cache_timeout)
+                    index_cache_key(
+                        self.datasource.uid, keys[i], self.cache_timeout, *bounds[i]
+                    )
+                except Exception as e:
+                    logging.warning("Could not cache key {}".format(keys[i]))
+                    logging.exception(e)
+
+        self.query = ";\n\n".join(queries)
+        self.status = utils.QueryStatus.SUCCESS
+        return pd.concat(dfs, ignore_index=True, sort=False)
+
+    def rollup_index_key(self, query_obj):
+        """Key of the index of the cached results `query_obj` may be rolled
+        up from, None if it can't be answered by a rollup"""
+        if self.datasource.type != "table" or self.datasource.is_templated(query_obj):
+            return None
+        return rollups.index_key(
+            query_obj,
+            datasource=self.datasource.uid,
+            time_shift=str(self.time_shift),
+            enforce_numerical_metrics=self.enforce_numerical_metrics,
+        )
+
+    def get_rollup(self, query_obj, rollup_key):
+        """Rolls a cached result of a finer query up to `query_obj`
+
+        :return: the cached value of the finer query with its `df` rolled up,
+            or None if no cached result subsumes `query_obj`
+        """
+        saved_metrics = {m.metric_name: m.expression for m in self.datasource.metrics}
+        functions = {}
+        for metric in query_obj["metrics"]:
+            function = rollups.metric_rollup_function(metric, saved_metrics)
+            if not function:
+                return None
+            functions[utils.get_metric_name(metric)] = function
+        regrain = not self.datasource.offset and not self.time_shift
+        return rollups.find_rollup(rollup_key, query_obj, functions, regrain)
+
     def get_json(self):
         return json.dumps(
             self.get_payload(), default=utils.json_int_dttm_ser, ignore_nan=True
@@ -368,8 +663,24 @@ class BaseViz(object):
 
     def get_payload(self, query_obj=None):
         """Returns a payload of metadata and data"""
-        self.run_extra_queries()
-        payload = self.get_df_payload(query_obj)
+        if not query_obj:
+            query_obj = self.query_obj()
+        extra_queries = self.extra_queries()
+        payloads = self.get_df_payloads(extra_queries + [(query_obj, {})])
+        self.process_extra_payloads(payloads[:-1])
+
+        # the merged metadata accounts for the extra queries as well
+        payload = payloads[-1]
+        payload.update(
+            {
+                "cache_key": self._any_cache_key,
+                "cached_dttm": self._any_cached_dttm,
+                "error": self.error_message,
+                "is_cached": self._any_cache_key is not None,
+                "query": self.query,
+                "status": self.status,
+            }
+        )
 
         df = payload.get("df")
         if self.status != utils.QueryStatus.FAILED:
@@ -391,18 +702,28 @@ class BaseViz(object):
         stacktrace = None
         df = None
         cached_dttm = datetime.utcnow().isoformat().split(".")[0]
+        leased = False
+        rollup_key = None
         if cache_key and cache and not self.force:
+            rollup_key = self.rollup_index_key(query_obj)
             cache_value = cache.get(cache_key)
+            if not cache_value:
+                leased = acquire_lease(cache_key)
+                if not leased:
+                    cache_value = wait_for_key(cache_key)
             if cache_value:
                 stats_logger.incr("loaded_from_cache")
                 try:
-                    cache_value = pkl.loads(cache_value)
+                    cache_value = cache_codecs.deserialize(cache_value)
                     df = cache_value["df"]
                     self.query = cache_value["query"]
                     self._any_cached_dttm = cache_value["dttm"]
                     self._any_cache_key = cache_key
                     self.status = utils.QueryStatus.SUCCESS
                     is_loaded = True
+                    if self.is_stale(cache_value["dttm"]):
+                        stats_logger.incr("loaded_from_stale_cache")
+                        self.refresh_stale_cache(cache_key)
                 except Exception as e:
                     logging.exception(e)
                     logging.error(
@@ -412,10 +733,23 @@ class BaseViz(object):
 
         if query_obj and not is_loaded:
             try:
-                df = self.get_df(query_obj)
-                if self.status != utils.QueryStatus.FAILED:
-                    stats_logger.incr("loaded_from_source")
+                cache_value = rollup_key and self.get_rollup(query_obj, rollup_key)
+                if cache_value:
+                    stats_logger.incr("loaded_from_rollup")
+                    df = cache_value["df"]
+                    self.query = cache_value["query"]
+                    self.status = utils.QueryStatus.SUCCESS
+                    cached_dttm = cache_value["dttm"]
                     is_loaded = True
+                else:
+                    bounds = self.get_segment_bounds(query_obj)
+                    if bounds:
+                        df = self.get_df_by_segments(query_obj, bounds)
+                    else:
+                        df = self.get_df(query_obj)
+                    if self.status != utils.QueryStatus.FAILED:
+                        stats_logger.incr("loaded_from_source")
+                        is_loaded = True
             except Exception as e:
                 logging.exception(e)
                 if not self.error_message:
@@ -435,20 +769,38 @@ class BaseViz(object):
                         df=df if df is not None else None,
                         query=self.query,
                     )
-                    cache_value = pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+                    cache_value = cache_codecs.serialize(
+                        cache_value, config.get("DATA_CACHE_CODEC")
+                    )
 
                     logging.info(
                         "Caching {} chars at key {}".format(len(cache_value), cache_key)
                     )
 
                     stats_logger.incr("set_cache_key")
-                    cache.set(cache_key, cache_value, timeout=self.cache_timeout)
+                    timeout = self.cache_timeout
+                    if self.can_serve_stale(query_obj):
+                        timeout += self.stale_cache_timeout
+                    cache.set(cache_key, cache_value, timeout=timeout)
+                    index_cache_key(
+                        self.datasource.uid,
+                        cache_key,
+                        timeout,
+                        query_obj.get("from_dttm"),
+                        query_obj.get("to_dttm"),
+                    )
+                    if rollup_key:
+                        rowcount = len(df.index) if df is not None else 0
+                        entry = rollups.make_entry(query_obj, cache_key, rowcount)
+                        rollups.register(rollup_key, entry, timeout)
                 except Exception as e:
                     # cache.set call can fail if the backend is down or if
                     # the key is too large or whatever other reasons
                     logging.warning("Could not cache key {}".format(cache_key))
                     logging.exception(e)
                     cache.delete(cache_key)
+        if leased:
+            release_lease(cache_key)
         return {
             "cache_key": self._any_cache_key,
             "cached_dttm": self._any_cached_dttm,
@@ -491,6 +843,20 @@ class BaseViz(object):
         include_index = not isinstance(df.index, pd.RangeIndex)
         return df.to_csv(index=include_index, **config.get("CSV_EXPORT"))
 
+    def get_csv_chunks(self):
+        """Same as ``get_csv`` but yields the CSV a few rows at a time
+
+        The query runs when this method is called, only the conversion to
+        CSV is deferred to when the chunks are consumed.
+        """
+        df = self.get_df()
+        include_index = not isinstance(df.index, pd.RangeIndex)
+        return utils.df_to_csv_chunks(
+            utils.df_chunks(df, config.get("CSV_EXPORT_CHUNK_SIZE")),
+            index=include_index,
+            **config.get("CSV_EXPORT"),
+        )
+
     def get_data(self, df):
         return df.to_dict(orient="records")
 
@@ -1197,15 +1563,16 @@ class NVD3TimeSeriesViz(NVD3Viz):
 
         return df
 
-    def run_extra_queries(self):
-        fd = self.form_data
-
-        time_compare = fd.get("time_compare") or []
+    def time_compare_options(self):
+        time_compare = self.form_data.get("time_compare") or []
         # backwards compatibility
         if not isinstance(time_compare, list):
             time_compare = [time_compare]
+        return time_compare
 
-        for option in time_compare:
+    def extra_queries(self):
+        queries = []
+        for option in self.time_compare_options():
             query_object = self.query_obj()
             delta = utils.parse_past_timedelta(option)
             query_object["inner_from_dttm"] = query_object["from_dttm"]
@@ -1220,11 +1587,15 @@ class NVD3TimeSeriesViz(NVD3Viz):
                 )
             query_object["from_dttm"] -= delta
             query_object["to_dttm"] -= delta
+            queries.append((query_object, {"time_compare": option}))
+        return queries
 
-            df2 = self.get_df_payload(query_object, time_compare=option).get("df")
+    def process_extra_payloads(self, payloads):
+        for option, payload in zip(self.time_compare_options(), payloads):
+            df2 = payload.get("df")
             if df2 is not None and DTTM_ALIAS in df2:
                 label = "{} offset".format(option)
-                df2[DTTM_ALIAS] += delta
+                df2[DTTM_ALIAS] += utils.parse_past_timedelta(option)
                 df2 = self.process_data(df2)
                 self._extra_chart_data.append((label, df2))
 
@@ -1804,22 +2175,28 @@ class FilterBoxViz(BaseViz):
     def query_obj(self):
         return None
 
-    def run_extra_queries(self):
+    def extra_queries(self):
         qry = super().query_obj()
         filters = self.form_data.get("filter_configs") or []
         qry["row_limit"] = self.filter_row_limit
-        self.dataframes = {}
+        queries = []
         for flt in filters:
             col = flt.get("column")
             if not col:
                 raise Exception(
                     _("Invalid filter configuration, please select a column")
                 )
-            qry["groupby"] = [col]
             metric = flt.get("metric")
-            qry["metrics"] = [metric] if metric else []
-            df = self.get_df_payload(query_obj=qry).get("df")
-            self.dataframes[col] = df
+            query_obj = dict(qry, groupby=[col], metrics=[metric] if metric else [])
+            queries.append((query_obj, {}))
+        return queries
+
+    def process_extra_payloads(self, payloads):
+        filters = self.form_data.get("filter_configs") or []
+        self.dataframes = {
+            flt.get("column"): payload.get("df")
+            for flt, payload in zip(filters, payloads)
+        }
 
     def get_data(self, df):
         filters = self.form_data.get("filter_configs") or []
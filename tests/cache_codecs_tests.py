@@ -0,0 +1,85 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+import pickle as pkl
+import unittest
+
+import pandas as pd
+
+from superset.exceptions import CacheCodecException
+from superset.utils import cache_codecs
+from .base_tests import SupersetTestCase
+
+
+class CacheCodecsTestCase(SupersetTestCase):
+    def get_payload(self):
+        df = pd.DataFrame(
+            {
+                "name": ["Aaron", "Abby", "Aaron", None],
+                "num": [1, 2, 3, 4],
+                "ratio": [0.5, 1.5, None, 2.0],
+                "__timestamp": pd.date_range("2019-01-01", periods=4),
+            }
+        )
+        return {"dttm": "2019-01-01T00:00:00", "df": df, "query": "SELECT 1"}
+
+    def assert_roundtrip(self, codec):
+        payload = self.get_payload()
+        data = cache_codecs.serialize(payload, codec)
+        self.assertTrue(data.startswith(cache_codecs.MAGIC))
+        result = cache_codecs.deserialize(data)
+        self.assertEqual(result["dttm"], payload["dttm"])
+        self.assertEqual(result["query"], payload["query"])
+        pd.testing.assert_frame_equal(result["df"], payload["df"])
+
+    def test_pickle_roundtrip(self):
+        self.assert_roundtrip("pickle")
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pyarrow"), "pyarrow not installed"
+    )
+    def test_arrow_roundtrip(self):
+        self.assert_roundtrip("arrow")
+        self.assert_roundtrip(cache_codecs.ArrowCodec(compression_level=1))
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pyarrow"), "pyarrow not installed"
+    )
+    def test_parquet_roundtrip(self):
+        self.assert_roundtrip("parquet")
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pyarrow"), "pyarrow not installed"
+    )
+    def test_fallback_to_pickle(self):
+        df = pd.DataFrame({"mixed": [1, "a", 2.5]})
+        data = cache_codecs.serialize({"df": df}, "parquet")
+        pd.testing.assert_frame_equal(cache_codecs.deserialize(data)["df"], df)
+
+    def test_no_df(self):
+        data = cache_codecs.serialize({"df": None, "query": "SELECT 1"})
+        self.assertEqual(
+            cache_codecs.deserialize(data), {"df": None, "query": "SELECT 1"}
+        )
+
+    def test_legacy_pickle(self):
+        payload = self.get_payload()
+        result = cache_codecs.deserialize(pkl.dumps(payload))
+        pd.testing.assert_frame_equal(result["df"], payload["df"])
+
+    def test_unknown_codec(self):
+        with self.assertRaises(CacheCodecException):
+            cache_codecs.serialize(self.get_payload(), "foo")
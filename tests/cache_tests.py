@@ -15,9 +15,19 @@
 # specific language governing permissions and limitations
 # under the License.
 """Unit tests for Superset with caching"""
+from datetime import datetime, timedelta
 import json
+import threading
+from unittest import mock
 
 from superset import cache, db
+from superset.utils.cache import (
+    acquire_lease,
+    index_cache_key,
+    invalidate_datasource,
+    release_lease,
+    wait_for_key,
+)
 from superset.utils.core import QueryStatus
 from .base_tests import SupersetTestCase
 
@@ -50,3 +60,44 @@ class CacheTests(SupersetTestCase):
         self.assertEqual(resp_from_cache["status"], QueryStatus.SUCCESS)
         self.assertEqual(resp["data"], resp_from_cache["data"])
         self.assertEqual(resp["query"], resp_from_cache["query"])
+
+    def test_coalesced_cache_misses(self):
+        self.assertTrue(acquire_lease("key"))
+        self.assertFalse(acquire_lease("key"))
+        timer = threading.Timer(0.1, cache.set, ("key", "value"))
+        timer.start()
+        self.assertEqual(wait_for_key("key"), "value")
+        timer.join()
+
+        # waiters stop waiting once the lease is released without a value
+        release_lease("key")
+        self.assertIsNone(wait_for_key("other_key"))
+        self.assertTrue(acquire_lease("key"))
+
+    def test_invalidate_datasource(self):
+        day = timedelta(days=1)
+        start = datetime(2019, 1, 1)
+        index_cache_key("1__table", "january", 60, start, start + 31 * day)
+        index_cache_key("1__table", "all_time", 60)
+        index_cache_key("1__table", "december", 60, start - 31 * day, start)
+        index_cache_key("2__table", "other_table", 60)
+        for key in ("january", "all_time", "december", "other_table"):
+            cache.set(key, "value")
+
+        keys = invalidate_datasource("1__table", since=start + day)
+        self.assertEqual(set(keys), {"january", "all_time"})
+        self.assertIsNone(cache.get("january"))
+        self.assertIsNone(cache.get("all_time"))
+        self.assertEqual(cache.get("december"), "value")
+        self.assertEqual(cache.get("other_table"), "value")
+
+        self.assertEqual(invalidate_datasource("1__table"), ["december"])
+        self.assertEqual(invalidate_datasource("1__table"), [])
+        self.assertEqual(cache.get("other_table"), "value")
+
+    def test_index_cache_key_write_failed(self):
+        with mock.patch("superset.utils.cache.stats_logger") as stats_logger:
+            with mock.patch.object(cache, "set", return_value=False):
+                index_cache_key("3__table", "too_big", 60)
+        stats_logger.incr.assert_called_with("cache_index.write_failed")
+        self.assertEqual(invalidate_datasource("3__table"), [])
@@ -18,6 +18,8 @@
 import csv
 import datetime
 import doctest
+import functools
+import gzip
 import io
 import json
 import logging
@@ -28,16 +30,19 @@ import string
 import unittest
 from unittest import mock
 
+from flask_appbuilder.security.sqla import models as ab_models
 import pandas as pd
 import psycopg2
 import sqlalchemy as sqla
 
-from superset import dataframe, db, jinja_context, security_manager, sql_lab
+from superset import app, dataframe, db, jinja_context, security_manager, sql_lab
 from superset.connectors.sqla.models import SqlaTable
 from superset.db_engine_specs.base import BaseEngineSpec
 from superset.db_engine_specs.mssql import MssqlEngineSpec
 from superset.models import core as models
+from superset.models.catalog import CatalogEntry
 from superset.models.sql_lab import Query
+from superset.tasks import csv_upload
 from superset.utils import core as utils
 from superset.views.database.views import DatabaseView
 from .base_tests import SupersetTestCase
@@ -480,6 +485,27 @@ class CoreTests(SupersetTestCase):
         self.assertEqual(list(expected_data), list(data))
         self.logout()
 
+    def test_csv_endpoint_streaming(self):
+        self.login("admin")
+        sql = "SELECT username FROM ab_user ORDER BY username"
+        client_id = "{}".format(random.getrandbits(64))[:10]
+        self.run_sql(sql, client_id, raise_on_error=True)
+        usernames = [u.username for u in db.session.query(ab_models.User).all()]
+        expected_data = [["username"]] + [[u] for u in sorted(usernames)]
+
+        url = "/superset/csv/{}".format(client_id)
+        with mock.patch.dict(app.config, {"CSV_EXPORT_CHUNK_SIZE": 1}):
+            resp = self.client.get(url)
+            self.assertTrue(resp.is_streamed)
+            data = csv.reader(io.StringIO(resp.data.decode("utf-8")))
+            self.assertEqual(expected_data, list(data))
+
+            resp = self.client.get(url, headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+            data = csv.reader(io.StringIO(gzip.decompress(resp.data).decode("utf-8")))
+            self.assertEqual(expected_data, list(data))
+        self.logout()
+
     def test_extra_table_metadata(self):
         self.login("admin")
         dbid = utils.get_main_database().id
@@ -643,6 +669,47 @@ class CoreTests(SupersetTestCase):
         finally:
             os.remove(filename)
 
+    def test_import_csv_async(self):
+        self.login(username="admin")
+        filename = "testCSVAsync.csv"
+        table_name = "".join(random.choice(string.ascii_uppercase) for _ in range(5))
+        with open(filename, "w") as test_file:
+            test_file.write("a,b\njohn,1\npaul,2\n")
+        example_db = utils.get_example_database()
+        example_db.allow_csv_upload = True
+        db.session.commit()
+        form_data = {
+            "csv_file": open(filename, "rb"),
+            "sep": ",",
+            "name": table_name,
+            "con": example_db.id,
+            "if_exists": "append",
+            "mangle_dupe_cols": False,
+        }
+        view = "superset.views.database.views"
+        try:
+            with mock.patch.dict(app.config, {"CSV_UPLOAD_ASYNC": True}):
+                with mock.patch(f"{view}.upload_csv") as upload_csv:
+                    resp = self.get_resp("/csvtodatabaseview/form", data=form_data)
+            self.assertIn(f'is being uploaded to table "{table_name}"', resp)
+            args = upload_csv.delay.call_args[0]
+            self.assertEqual(args[2]["filename"], f"{args[0]}_{filename}")
+            upload_path = app.config["UPLOAD_FOLDER"] + args[2]["filename"]
+            self.assertTrue(os.path.exists(upload_path))
+            url = f"/csvtodatabaseview/status/{args[0]}/"
+            self.assertEqual(self.get_json_resp(url)["state"], "pending")
+
+            # what the worker runs
+            csv_upload.upload_csv(*args)
+            status = self.get_json_resp(url)
+            self.assertEqual(status["state"], "success")
+            self.assertEqual(status["rows"], 2)
+            table = db.session.query(SqlaTable).get(status["table_id"])
+            self.assertEqual(table.table_name, table_name)
+            self.assertFalse(os.path.exists(upload_path))
+        finally:
+            os.remove(filename)
+
     def test_dataframe_timezone(self):
         tz = psycopg2.tz.FixedOffsetTimezone(offset=60, name=None)
         data = [
@@ -773,6 +840,84 @@ class CoreTests(SupersetTestCase):
         resp = self.get_resp(f"/superset/select_star/{examples_db.id}/birth_names")
         self.assertIn("gender", resp)
 
+    def test_tables_from_catalog(self):
+        self.login(username="admin")
+        examples_db = utils.get_example_database()
+        engine = examples_db.get_sqla_engine()
+        try:
+            counts = CatalogEntry.refresh(db.session, examples_db)
+            self.assertGreater(counts["added"], 0)
+            self.assertEqual(CatalogEntry.refresh(db.session, examples_db)["added"], 0)
+
+            url = f"/superset/tables/{examples_db.id}/main/user/"
+            with mock.patch.dict(app.config, {"MAX_TABLE_NAMES": 2}):
+                data = self.get_json_resp(url)
+                # tables starting with "user" first
+                self.assertEqual(data["options"][0]["value"], "user_attribute")
+                self.assertEqual(len(data["options"]), 2)
+                self.assertGreater(data["tableLength"], 2)
+                last_page = (data["tableLength"] - 1) // 2
+                data = self.get_json_resp(url + f"?page={last_page}")
+                self.assertEqual(data["page"], last_page)
+                self.assertTrue(
+                    all("user" in option["value"] for option in data["options"])
+                )
+
+            # tables registered without a schema are in the default one
+            count, entries = CatalogEntry.search(
+                db.session, examples_db, substr="user", names={(None, "ab_user")}
+            )
+            self.assertEqual(
+                [(e.schema, e.name) for e in entries], [("main", "ab_user")]
+            )
+
+            # tables created since the last refresh are only listed when forcing
+            # a refresh
+            engine.execute("CREATE TABLE catalog_new_table (a INT)")
+            url = f"/superset/tables/{examples_db.id}/main/catalog_new/"
+            data = self.get_json_resp(url)
+            self.assertEqual(data["tableLength"], 0)
+            data = self.get_json_resp(url + "true/")
+            values = [option["value"] for option in data["options"]]
+            self.assertIn("catalog_new_table", values)
+        finally:
+            engine.execute("DROP TABLE IF EXISTS catalog_new_table")
+            db.session.query(CatalogEntry).filter_by(
+                database_id=examples_db.id
+            ).delete()
+            db.session.commit()
+
+    def test_catalog_search_pages(self):
+        examples_db = utils.get_example_database()
+        names = ["tab_b", "tab_a", "my_tab", "a_tab", "other"]
+        for name in names:
+            db.session.add(
+                CatalogEntry(
+                    database_id=examples_db.id, schema="s", name=name, type="table"
+                )
+            )
+        db.session.commit()
+        try:
+            search = functools.partial(
+                CatalogEntry.search, db.session, examples_db, substr="tab", schema="s"
+            )
+            # the tables starting with the search fill the page
+            count, entries = search(limit=2)
+            self.assertEqual(count, 2)
+            self.assertEqual([e.name for e in entries], ["tab_a", "tab_b"])
+            count, entries = search(offset=1, limit=2)
+            self.assertEqual(count, 4)
+            self.assertEqual([e.name for e in entries], ["tab_b", "a_tab"])
+            count, entries = search(offset=2, limit=2)
+            self.assertEqual([e.name for e in entries], ["a_tab", "my_tab"])
+            count, entries = search()
+            self.assertEqual(count, 4)
+        finally:
+            db.session.query(CatalogEntry).filter_by(
+                database_id=examples_db.id
+            ).delete()
+            db.session.commit()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -24,6 +24,7 @@ from sqlalchemy import func
 from superset import db, security_manager
 from superset.connectors.sqla.models import SqlaTable
 from superset.models import core as models
+from superset.utils.core import get_main_database
 from .base_tests import SupersetTestCase
 
 
@@ -497,6 +498,84 @@ class DashboardTests(SupersetTestCase):
         resp = self.get_resp("/dashboard/list/")
         self.assertNotIn(f"/superset/dashboard/{slug}/", resp)
 
+    def test_dashboard_charts_json(self):
+        table = SqlaTable(table_name="ab_role", database=get_main_database())
+        db.session.add(table)
+        db.session.commit()
+        table.fetch_metadata()
+
+        form_data = {
+            "viz_type": "table",
+            "datasource": "{}__table".format(table.id),
+            "groupby": ["name"],
+            "metrics": ["count"],
+            "time_range": "No filter",
+        }
+        slices = []
+        for name in ("Roles", "Broken roles"):
+            slc = models.Slice(
+                slice_name=name,
+                datasource_type="table",
+                datasource_id=table.id,
+                viz_type="table",
+                params=json.dumps(form_data),
+            )
+            db.session.add(slc)
+            slices.append(slc)
+        dash = models.Dashboard(dashboard_title="Roles", slices=slices)
+        db.session.add(dash)
+        db.session.commit()
+
+        dash_id = dash.id
+        slice_ids = [slc.id for slc in slices]
+        table_id = table.id
+
+        broken_metric = {
+            "expressionType": "SQL",
+            "sqlExpression": "COUNT(no_such_column)",
+            "label": "broken",
+        }
+        charts_form_data = [
+            {"slice_id": slice_ids[0]},
+            dict(form_data, slice_id=slice_ids[1], metrics=[broken_metric]),
+            dict(form_data, slice_id=-1),
+            "not a form data",
+        ]
+        self.login("admin")
+        resp = self.client.post(
+            "/superset/dashboard_charts_json/{}/".format(dash_id),
+            data={"form_data": json.dumps(charts_form_data)},
+        )
+        self.assertTrue(resp.is_streamed)
+        lines = resp.data.decode("utf-8").splitlines()
+        charts = {}
+        for line in lines:
+            chart = json.loads(line)
+            charts[chart["slice_id"]] = chart
+        self.assertEqual(len(lines), 4)
+
+        self.assertEqual(charts[slice_ids[0]]["status"], 200)
+        roles = [role.name for role in security_manager.get_all_roles()]
+        data = charts[slice_ids[0]]["payload"]["data"]["records"]
+        self.assertEqual(sorted(row["name"] for row in data), sorted(roles))
+        self.assertEqual(charts[slice_ids[1]]["status"], 400)
+        self.assertEqual(charts[slice_ids[1]]["payload"]["status"], "failed")
+        self.assertEqual(charts[-1]["status"], 404)
+        self.assertEqual(charts[None]["status"], 400)
+
+        # the charts that were queried are logged one by one
+        logs = db.session.query(models.Log).filter_by(
+            action="dashboard_chart_json", dashboard_id=dash_id
+        )
+        self.assertEqual(sorted(log.slice_id for log in logs), sorted(slice_ids))
+        logs.delete(synchronize_session=False)
+
+        db.session.delete(db.session.query(models.Dashboard).get(dash_id))
+        for slice_id in slice_ids:
+            db.session.delete(db.session.query(models.Slice).get(slice_id))
+        db.session.delete(db.session.query(SqlaTable).get(table_id))
+        db.session.commit()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -14,10 +14,14 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+from datetime import datetime, timedelta
+
 import numpy as np
+import pandas as pd
 
 from superset.dataframe import dedup, SupersetDataFrame
 from superset.db_engine_specs import BaseEngineSpec
+from superset.utils.core import base_json_conv
 from .base_tests import SupersetTestCase
 
 
@@ -108,3 +112,36 @@ class SupersetDataFrameTestCase(SupersetTestCase):
         cursor_descr = (("a", "string"), ("a", "string"))
         cdf = SupersetDataFrame(data, cursor_descr, BaseEngineSpec)
         self.assertListEqual(cdf.column_names, ["a", "a__1"])
+
+    def test_data(self):
+        data = [
+            ("a1", 1, 1.5, datetime(2019, 1, 1), 2 ** 60),
+            ("a2", 2, None, datetime(2019, 1, 2), 2),
+        ]
+        cursor_descr = (("a", None), ("b", None), ("c", None), ("d", None), ("e", None))
+        cdf = SupersetDataFrame(data, cursor_descr, BaseEngineSpec)
+        self.assertEqual(cdf.data[0]["a"], "a1")
+        self.assertEqual(cdf.data[0]["b"], 1)
+        self.assertEqual(cdf.data[0]["c"], 1.5)
+        self.assertTrue(np.isnan(cdf.data[1]["c"]))
+        self.assertEqual(cdf.data[1]["d"], datetime(2019, 1, 2))
+        # ints too big for JavaScript are converted to strings
+        self.assertEqual(cdf.data[0]["e"], str(2 ** 60))
+        self.assertEqual(cdf.data[1]["e"], 2)
+
+    def test_data_with_object_ints(self):
+        data = [(2 ** 70, "x"), (1, "y")]
+        cursor_descr = (("a", None), ("b", None))
+        cdf = SupersetDataFrame(data, cursor_descr, BaseEngineSpec)
+        self.assertEqual(cdf.data, [{"a": str(2 ** 70), "b": "x"}, {"a": 1, "b": "y"}])
+
+    def test_data_with_timedeltas(self):
+        data = [(timedelta(hours=1),), (None,)]
+        cdf = SupersetDataFrame(data, (("a", None),), BaseEngineSpec)
+        self.assertEqual(cdf.data[0]["a"], pd.Timedelta(hours=1))
+        self.assertEqual(base_json_conv(cdf.data[0]["a"]), "0 days 01:00:00")
+        self.assertTrue(pd.isnull(cdf.data[1]["a"]))
+
+    def test_data_empty(self):
+        cdf = SupersetDataFrame([], (("a", None),), BaseEngineSpec)
+        self.assertEqual(cdf.data, [])
@@ -14,6 +14,7 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+import os
 import unittest
 from unittest import mock
 
@@ -24,7 +25,7 @@ from sqlalchemy.engine.result import RowProxy
 from sqlalchemy.sql import select
 from sqlalchemy.types import String, UnicodeText
 
-from superset import app
+from superset import app, cache
 from superset.db_engine_specs import engines
 from superset.db_engine_specs.base import BaseEngineSpec, builtin_time_grains
 from superset.db_engine_specs.bigquery import BigQueryEngineSpec
@@ -37,7 +38,13 @@ from superset.db_engine_specs.postgres import PostgresEngineSpec
 from superset.db_engine_specs.presto import PrestoEngineSpec
 from superset.db_engine_specs.sqlite import SqliteEngineSpec
 from superset.models.core import Database
+from superset.models.sql_lab import Query
 from superset.utils.core import get_example_database
+from superset.utils.query_progress import (
+    QueryProgressPoller,
+    signal_stop,
+    stop_signal_key,
+)
 from .base_tests import SupersetTestCase
 
 
@@ -128,6 +135,72 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         )
         self.assertEquals(60, HiveEngineSpec.progress(log))
 
+    @mock.patch("superset.utils.query_progress.time")
+    def test_presto_handle_cursor(self, mock_time):
+        query = mock.Mock(id=-1, progress=0)
+        session = mock.Mock()
+        cursor = mock.Mock()
+        cursor.poll.side_effect = [
+            {"stats": {"state": "RUNNING", "completedSplits": 1, "totalSplits": 100}},
+            {"stats": {"state": "RUNNING", "completedSplits": 2, "totalSplits": 100}},
+            {"stats": {"state": "RUNNING", "completedSplits": 8, "totalSplits": 100}},
+            None,
+        ]
+        PrestoEngineSpec.handle_cursor(cursor, query, session)
+        self.assertEqual(query.progress, 8)
+        # progress is only committed once it moved significantly
+        session.commit.assert_called_once()
+        self.assertEqual(
+            [c[0][0] for c in mock_time.sleep.call_args_list], [1, 1.5, 2.25]
+        )
+        cursor.cancel.assert_not_called()
+
+    @mock.patch("superset.utils.query_progress.time")
+    def test_presto_handle_cursor_stopped(self, mock_time):
+        query = mock.Mock(id=-2, progress=0)
+        cursor = mock.Mock()
+        cursor.poll.return_value = {"stats": {"state": "RUNNING"}}
+        signal_stop(query)
+        try:
+            PrestoEngineSpec.handle_cursor(cursor, query, mock.Mock())
+        finally:
+            cache.delete(stop_signal_key(query.id))
+        cursor.cancel.assert_called_once()
+
+    def test_progress_poller_reads_status_once_per_max_interval(self):
+        query = Query(id=-3, progress=0)
+        session = mock.Mock()
+        session.query.return_value.filter_by.return_value.scalar.return_value = (
+            "running"
+        )
+        now = "superset.utils.query_progress.now_as_float"
+        with mock.patch(now, return_value=1000.0):
+            poller = QueryProgressPoller(query, session, max_interval=5)
+        with mock.patch(now, return_value=1000.0 + 4999):
+            self.assertFalse(poller.is_stopped())
+            self.assertFalse(poller.is_stopped())
+        session.query.assert_not_called()
+        with mock.patch(now, return_value=1000.0 + 5000):
+            self.assertFalse(poller.is_stopped())
+            self.assertFalse(poller.is_stopped())
+        session.query.assert_called_once()
+
+    @mock.patch("superset.utils.query_progress.cache", None)
+    def test_progress_poller_reads_status_in_new_transaction(self):
+        query = Query(id=-3, progress=0)
+        session = mock.Mock()
+        session.query.return_value.filter_by.return_value.scalar.side_effect = [
+            "running",
+            "stopped",
+        ]
+        poller = QueryProgressPoller(query, session, max_interval=5)
+        self.assertFalse(poller.is_stopped())
+        self.assertTrue(poller.is_stopped())
+        calls = [name for name, args, kwargs in session.mock_calls]
+        self.assertEqual(calls[:2], ["commit", "query"])
+        self.assertEqual(calls.count("commit"), 2)
+        self.assertEqual(calls.count("query"), 2)
+
     def test_hive_error_msg(self):
         msg = (
             '{...} errorMessage="Error while compiling statement: FAILED: '
@@ -945,3 +1018,71 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         else:
             expected = ["VARCHAR(255)", "VARCHAR(255)", "FLOAT"]
         self.assertEquals(col_names, expected)
+
+    def test_upload_csv_in_chunks(self):
+        example_db = get_example_database()
+        filename = "test_upload_csv_in_chunks.csv"
+        path = app.config["UPLOAD_FOLDER"] + filename
+        with open(path, "w") as f:
+            f.write("id,code,note\n1,x1,\n2,x2,\n,003,a\n4,004,b\n5,005,\n")
+        params = {
+            "filename": filename,
+            "read_csv": {"sep": ","},
+            "to_sql": {
+                "name": "test_upload_csv_in_chunks",
+                "schema": None,
+                "if_exists": "replace",
+                "index": False,
+                "index_label": None,
+            },
+        }
+        progress = mock.Mock()
+        config = {"CSV_UPLOAD_CHUNK_SIZE": 2, "CSV_UPLOAD_SAMPLE_SIZE": 2}
+        try:
+            with mock.patch.dict(app.config, config):
+                rows = example_db.db_engine_spec.upload_csv(
+                    example_db, params, progress
+                )
+            df = example_db.get_df("SELECT * FROM test_upload_csv_in_chunks", None)
+        finally:
+            os.remove(path)
+            example_db.get_sqla_engine().execute(
+                "DROP TABLE IF EXISTS test_upload_csv_in_chunks"
+            )
+        self.assertEqual(rows, 5)
+        self.assertEqual(progress.call_count, 3)
+        self.assertEqual(progress.call_args[0][0], 5)
+        # types of the sample: integers, strings and nulls read as strings
+        self.assertEqual(df["id"].tolist()[:2], [1, 2])
+        self.assertEqual(df["code"].tolist(), ["x1", "x2", "003", "004", "005"])
+        self.assertEqual(df["note"].tolist()[2:4], ["a", "b"])
+
+    def test_df_to_sql_insert_method(self):
+        df = pd.DataFrame({"a": range(10), "b": range(10)})
+        with mock.patch.object(pd.DataFrame, "to_sql") as to_sql:
+            BaseEngineSpec.df_to_sql(df, name="t", index=False, chunksize=10000)
+            to_sql.assert_called_with(
+                method="multi", name="t", index=False, chunksize=1000
+            )
+            SqliteEngineSpec.df_to_sql(df, name="t", index=False, chunksize=10000)
+            to_sql.assert_called_with(
+                method=None, name="t", index=False, chunksize=10000
+            )
+            con = mock.Mock()
+            con.dialect.driver = "psycopg2"
+            PostgresEngineSpec.df_to_sql(
+                df, name="t", con=con, index=False, chunksize=10000
+            )
+            to_sql.assert_called_with(
+                method=PostgresEngineSpec.copy_rows,
+                name="t",
+                con=con,
+                index=False,
+                chunksize=10000,
+            )
+            # other drivers don't have COPY
+            con.dialect.driver = "pg8000"
+            PostgresEngineSpec.df_to_sql(
+                df, name="t", con=con, index=False, chunksize=10000
+            )
+            self.assertEqual(to_sql.call_args[1]["method"], "multi")
@@ -16,8 +16,15 @@
 # under the License.
 import logging
 import unittest
+from unittest.mock import Mock, patch, PropertyMock
 
-from superset.utils.log import DBEventLogger, get_event_logger_from_cfg_value
+from superset import app, db
+from superset.models.core import Log
+from superset.utils.log import (
+    BufferedDBEventLogger,
+    DBEventLogger,
+    get_event_logger_from_cfg_value,
+)
 
 
 class TestEventLogger(unittest.TestCase):
@@ -42,3 +49,23 @@ class TestEventLogger(unittest.TestCase):
         # test that assignment of non AbstractEventLogger derived type raises TypeError
         with self.assertRaises(TypeError):
             get_event_logger_from_cfg_value(logging.getLogger())
+
+    def test_buffered_db_event_logger(self):
+        event_logger = BufferedDBEventLogger(
+            max_queue_size=2, batch_size=10, flush_interval=60
+        )
+        stats_logger = Mock()
+        records = [{"i": 1}, {"i": 2}, {"i": 3}]
+        with app.app_context(), patch.object(
+            BufferedDBEventLogger, "stats_logger", new_callable=PropertyMock
+        ) as stats_logger_property:
+            stats_logger_property.return_value = stats_logger
+            event_logger.log(None, "test_buffered", records=records)
+            query = db.session.query(Log).filter_by(action="test_buffered")
+            self.assertEqual(query.count(), 0)
+            stats_logger.incr.assert_called_once_with("event_logger.dropped")
+
+            event_logger.flush()
+            self.assertEqual([log.json for log in query], ['{"i": 1}', '{"i": 2}'])
+            query.delete()
+            db.session.commit()
@@ -14,14 +14,22 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+from contextlib import closing
+import json
 import textwrap
 import unittest
+from unittest import mock
 
+from celery.signals import worker_process_init
 import pandas
 from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool
 
 from superset import app
+from superset.db_engine_specs.sqlite import SqliteEngineSpec
 from superset.models.core import Database
+from superset.tasks import celery_app  # noqa
+from superset.utils import engine_pools
 from superset.utils.core import get_example_database, get_main_database, QueryStatus
 from .base_tests import SupersetTestCase
 
@@ -103,6 +111,75 @@ class DatabaseModelTestCase(SupersetTestCase):
         user_name = make_url(model.get_sqla_engine(user_name=example_user).url).username
         self.assertNotEquals(example_user, user_name)
 
+    def test_get_sqla_engine_pooled(self):
+        extra = json.dumps({"engine_pool": {"pool_size": 2, "max_overflow": 1}})
+
+        def make_model():
+            return Database(
+                id=1000, database_name="pooled", sqlalchemy_uri="sqlite://", extra=extra
+            )
+
+        model = make_model()
+        engine = model.get_sqla_engine()
+        self.assertIsInstance(engine.pool, engine_pools.InstrumentedQueuePool)
+        self.assertEqual(engine.pool.size(), 2)
+        # the engine outlives the model
+        self.assertIs(make_model().get_sqla_engine(), engine)
+        self.assertIsNot(make_model().get_sqla_engine(schema="main"), engine)
+        self.assertIsInstance(model.get_sqla_engine(nullpool=True).pool, NullPool)
+
+        engine.pool.stats_logger = mock.Mock()
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute("SELECT 1").scalar(), 1)
+            engine.pool.stats_logger.timing.assert_called_once_with(
+                "engine_pool.1000.checkout_wait", mock.ANY
+            )
+            engine.pool.stats_logger.gauge.assert_called_once_with(
+                "engine_pool.1000.saturation", 1 / 3
+            )
+
+        # impersonated users don't share connections
+        model.impersonate_user = True
+        with mock.patch.object(engine_pools, "create_engine") as create_engine:
+            model.get_sqla_engine(user_name="alice")
+            model.get_sqla_engine(user_name="bob")
+            model.get_sqla_engine(user_name="alice")
+        urls = [str(call[0][0]) for call in create_engine.call_args_list]
+        self.assertEqual(urls, ["sqlite://alice@", "sqlite://bob@"])
+
+        # changing the pool parameters replaces the engine
+        model.extra = json.dumps({"engine_pool": {"pool_size": 3}})
+        model.impersonate_user = False
+        self.assertEqual(model.get_sqla_engine().pool.size(), 3)
+        engine_pools.dispose_engines()
+
+    def test_pooled_connection_session_reset(self):
+        extra = json.dumps({"engine_pool": {"pool_size": 1}})
+        model = Database(
+            id=1001, database_name="pooled", sqlalchemy_uri="sqlite://", extra=extra
+        )
+
+        def dbapi_connection():
+            with closing(model.get_sqla_engine().raw_connection()) as conn:
+                return conn.connection
+
+        try:
+            model.get_df("SELECT 1", None)
+            connection = dbapi_connection()
+            model.get_df("SELECT 1", None)
+            self.assertIs(dbapi_connection(), connection)
+
+            # connections whose session was changed aren't reused
+            model.get_df("PRAGMA case_sensitive_like = true; SELECT 1", None)
+            self.assertIsNot(dbapi_connection(), connection)
+        finally:
+            engine_pools.dispose_engines()
+
+    def test_dispose_engines_after_fork(self):
+        with mock.patch.object(engine_pools, "dispose_engines") as dispose_engines:
+            worker_process_init.send(sender=None)
+        dispose_engines.assert_called_once_with()
+
     def test_select_star(self):
         db = get_example_database()
         table_name = "energy_usage"
@@ -168,6 +245,22 @@ class DatabaseModelTestCase(SupersetTestCase):
             df = main_db.get_df("USE superset; SELECT ';';", None)
             self.assertEquals(df.iat[0, 0], ";")
 
+    def test_get_df_chunks(self):
+        main_db = get_main_database()
+        sql = "SELECT 1 AS a UNION ALL SELECT 2 UNION ALL SELECT 3"
+
+        with mock.patch.object(SqliteEngineSpec, "allows_cursor_streaming", True):
+            dfs = list(main_db.get_df_chunks(sql, None, 2))
+        self.assertEquals([len(df.index) for df in dfs], [2, 1])
+        self.assertEquals(list(pandas.concat(dfs)["a"]), [1, 2, 3])
+
+        dfs = list(main_db.get_df_chunks(sql, None, 2))
+        self.assertEquals([len(df.index) for df in dfs], [2, 1])
+
+        dfs = list(main_db.get_df_chunks(sql + " LIMIT 0", None, 2))
+        self.assertEquals(len(dfs), 1)
+        self.assertEquals(list(dfs[0].columns), ["a"])
+
 
 class SqlaTableModelTestCase(SupersetTestCase):
     def test_get_timestamp_expression(self):
@@ -16,8 +16,11 @@
 # under the License.
 import inspect
 import unittest
+from unittest import mock
 
-from superset import app, appbuilder, security_manager
+from flask import g
+
+from superset import app, appbuilder, cache, security_manager
 from .base_tests import SupersetTestCase
 
 
@@ -209,6 +212,38 @@ class RolePermissionTests(SupersetTestCase):
         self.assert_cannot_gamma(get_perm_tuples("Gamma"))
         self.assert_cannot_alpha(get_perm_tuples("Alpha"))
 
+    def test_permissions_index(self):
+        perm = "[test].[permissions_index](id:1)"
+        role = security_manager.find_role("Gamma")
+        with app.test_request_context():
+            g.user = security_manager.find_user(username="gamma")
+            self.assertFalse(security_manager.can_access("datasource_access", perm))
+
+            # granting a permission bumps the version the index is cached under
+            security_manager.add_permission_view_menu("datasource_access", perm)
+            pvm = security_manager.find_permission_view_menu("datasource_access", perm)
+            security_manager.add_permission_role(role, pvm)
+            self.assertTrue(security_manager.can_access("datasource_access", perm))
+            # later checks of the request don't read the cache
+            with mock.patch.object(cache, "get", wraps=cache.get) as cache_get:
+                self.assertTrue(security_manager.can_access("datasource_access", perm))
+                self.assertIn(perm, security_manager._user_datasource_perms())
+            cache_get.assert_not_called()
+            self.assertTrue(security_manager.can_access("can_list", "TableModelView"))
+
+            security_manager.del_permission_role(role, pvm)
+            self.assertFalse(security_manager.can_access("datasource_access", perm))
+            security_manager.del_permission_view_menu("datasource_access", perm)
+
+            # indexes and their version expire, for processes not sharing the cache
+            with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+                security_manager.bump_permissions_version()
+                security_manager.can_access("datasource_access", perm)
+            timeout = app.config["PERMISSIONS_INDEX_TIMEOUT"]
+            self.assertEqual(cache_set.call_count, 2)
+            for call in cache_set.call_args_list:
+                self.assertEqual(call[1]["timeout"], timeout)
+
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
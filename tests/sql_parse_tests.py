@@ -15,6 +15,9 @@
 # specific language governing permissions and limitations
 # under the License.
 import unittest
+from unittest import mock
+
+import sqlparse
 
 from superset import sql_parse
 
@@ -504,3 +507,29 @@ class SupersetTestCase(unittest.TestCase):
         SELECT * FROM match
         """
         self.assertEquals({"foo"}, self.extract_tables(query))
+
+    def test_analysis_cache(self):
+        sql = "SELECT * FROM cached_analysis LIMIT 10"
+        with mock.patch(
+            "superset.sql_parse.sqlparse.parse", wraps=sqlparse.parse
+        ) as parse:
+            first = sql_parse.ParsedQuery(sql)
+            second = sql_parse.ParsedQuery(sql + ";")
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(second.tables, frozenset({"cached_analysis"}))
+            self.assertEqual(second.limit, 10)
+            self.assertTrue(second.is_select())
+
+            # rewriting the limit parses the SQL again, without changing the cache
+            self.assertEqual(
+                first.get_query_with_new_limit(5),
+                "SELECT * FROM cached_analysis LIMIT 5",
+            )
+            self.assertEqual(parse.call_count, 2)
+            self.assertEqual(sql_parse.ParsedQuery(sql).limit, 10)
+
+            # the cache keeps digests of the SQL texts, statements are parsed
+            # when needed
+            self.assertIn(sql_parse.sql_digest(sql), sql_parse.get_analysis.cache)
+            self.assertNotIn(sql, str(list(sql_parse.get_analysis.cache)))
+            self.assertEqual(second.get_statements(), [sql])
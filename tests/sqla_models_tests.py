@@ -14,7 +14,15 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from superset.connectors.sqla.models import SqlaTable, TableColumn
+from unittest import mock
+
+from superset import db
+from superset.connectors.sqla.models import (
+    SqlaTable,
+    SqlMetric,
+    TableColumn,
+    TableRollup,
+)
 from superset.db_engine_specs.druid import DruidEngineSpec
 from superset.utils.core import get_main_database
 from .base_tests import SupersetTestCase
@@ -58,6 +66,31 @@ class DatabaseModelTestCase(SupersetTestCase):
         self.assertTrue(table.has_extra_cache_keys(query_obj))
         self.assertListEqual(extra_cache_keys, ["user_1", "user_2"])
 
+    def test_extra_cache_keys_reused(self):
+        query = "SELECT '{{ cache_key_wrapper('user_1') }}' as user"
+        table = SqlaTable(sql=query, database=get_main_database())
+        query_obj = {
+            "granularity": None,
+            "from_dttm": None,
+            "to_dttm": None,
+            "groupby": ["user"],
+            "metrics": [],
+            "is_timeseries": False,
+            "filter": [],
+            "extras": {"having": "(COUNT(*) > {{ cache_key_wrapper(1) }})"},
+        }
+        with mock.patch.object(
+            SqlaTable, "get_template_processor", wraps=table.get_template_processor
+        ) as get_template_processor:
+            with mock.patch.object(SqlaTable, "get_sqla_query") as get_sqla_query:
+                extra_cache_keys = table.get_extra_cache_keys(query_obj)
+                get_sqla_query.assert_not_called()
+            self.assertListEqual(extra_cache_keys, ["user_1", 1])
+
+            sqla_query = table.get_sqla_query(**query_obj)
+            self.assertListEqual(sqla_query.extra_cache_keys, ["user_1", 1])
+            self.assertEqual(get_template_processor.call_count, 1)
+
     def test_has_no_extra_cache_keys(self):
         query = "SELECT 'abc' as user"
         table = SqlaTable(sql=query, database=get_main_database())
@@ -74,3 +107,157 @@ class DatabaseModelTestCase(SupersetTestCase):
         extra_cache_keys = table.get_extra_cache_keys(query_obj)
         self.assertFalse(table.has_extra_cache_keys(query_obj))
         self.assertListEqual(extra_cache_keys, [])
+
+    def test_get_snapshot(self):
+        session = db.session
+        table = SqlaTable(table_name="snapshot_table", database=get_main_database())
+        table.columns = [TableColumn(column_name="a", type="INTEGER")]
+        session.add(table)
+        session.commit()
+        try:
+            snapshot = table.get_snapshot()
+            self.assertEqual(list(snapshot.columns), ["a"])
+            self.assertIs(table.get_snapshot(), snapshot)
+            self.assertEqual(table.get_col("a").column_name, "a")
+
+            # pending changes aren't shared with the other requests
+            table.columns.append(TableColumn(column_name="b", type="INTEGER"))
+            self.assertEqual(list(table.get_snapshot().columns), ["a", "b"])
+            self.assertIsNot(table.get_snapshot(), snapshot)
+            session.commit()
+
+            # editing a column refreshes the snapshots of its table
+            table.columns[0].is_dttm = True
+            session.commit()
+            snapshot = table.get_snapshot()
+            self.assertEqual(sorted(snapshot.columns), ["a", "b"])
+            self.assertEqual(snapshot.dttm_cols, ["a"])
+            self.assertIs(table.get_snapshot(), snapshot)
+
+            # every edit bumps the version, however close to the previous one
+            version = table.version
+            table.columns[0].is_dttm = False
+            session.commit()
+            self.assertEqual(table.version, version + 1)
+            self.assertEqual(table.get_snapshot().dttm_cols, [])
+            table.description = "edited"
+            session.commit()
+            self.assertEqual(table.version, version + 2)
+        finally:
+            session.delete(table)
+            session.commit()
+
+    def test_compile_query(self):
+        session = db.session
+        table = SqlaTable(table_name="compiled_table", database=get_main_database())
+        table.columns = [TableColumn(column_name="a", type="INTEGER")]
+        session.add(table)
+        session.commit()
+        query_obj = {
+            "granularity": None,
+            "from_dttm": None,
+            "to_dttm": None,
+            "groupby": ["a"],
+            "metrics": [],
+            "is_timeseries": False,
+            "filter": [],
+            "extras": {"where": "(a > 1)"},
+        }
+        try:
+            compiled = table.compile_query(query_obj)
+            self.assertIn("a > 1", compiled.sql)
+            self.assertIs(table.compile_query(dict(query_obj)), compiled)
+            self.assertEqual(table.get_query_str_extended(query_obj).sql, compiled.sql)
+
+            query_obj["extras"] = {"where": "(a > {{ 1 + 1 }})"}
+            self.assertIsNone(table.compiled_query_key(query_obj))
+            self.assertIn("a > 2", table.compile_query(query_obj).sql)
+
+            query_obj["extras"] = {"where": "(a > 3)"}
+            self.assertIsNot(table.compile_query(query_obj), compiled)
+        finally:
+            session.delete(table)
+            session.commit()
+
+    def test_rollup_table(self):
+        session = db.session
+        database = get_main_database()
+        allow_ctas = database.allow_ctas
+        engine = database.get_sqla_engine()
+        engine.execute(
+            "CREATE TABLE rollup_facts (ds DATETIME, gender TEXT, state TEXT, num INT)"
+        )
+        engine.execute(
+            "INSERT INTO rollup_facts VALUES "
+            "('2019-01-01 10:00:00', 'boy', 'CA', 1), "
+            "('2019-01-01 11:00:00', 'girl', 'CA', 2), "
+            "('2019-01-02 10:00:00', 'boy', 'NY', 4), "
+            "('2019-01-02 12:00:00', 'boy', 'CA', 8)"
+        )
+        table = SqlaTable(
+            table_name="rollup_facts", database=database, main_dttm_col="ds"
+        )
+        table.columns = [
+            TableColumn(column_name="ds", type="DATETIME", is_dttm=True),
+            TableColumn(column_name="gender", type="TEXT"),
+            TableColumn(column_name="state", type="TEXT"),
+        ]
+        table.metrics = [SqlMetric(metric_name="sum__num", expression="SUM(num)")]
+        rollup = TableRollup(
+            table=table,
+            groupby='["gender", "state"]',
+            metrics='["sum__num"]',
+            time_column="ds",
+            time_grain_sqla="P1D",
+        )
+        session.add(table)
+        session.commit()
+        query_obj = {
+            "granularity": "ds",
+            "from_dttm": None,
+            "to_dttm": None,
+            "groupby": ["gender"],
+            "metrics": ["sum__num"],
+            "is_timeseries": False,
+            "filter": [{"col": "state", "op": "in", "val": ["CA"]}],
+            "extras": {},
+            "row_limit": 100,
+        }
+        try:
+            self.assertIsNone(table.find_rollup(query_obj))
+            database.allow_ctas = False
+            session.commit()
+            with self.assertRaises(Exception):
+                rollup.refresh()
+            database.allow_ctas = True
+            session.commit()
+            self.assertIsNone(rollup.refresh())
+            session.commit()
+
+            # the previous table is dropped once the new one is committed
+            with mock.patch("superset.connectors.sqla.models.now_as_float") as now:
+                now.return_value = 1.0
+                previous = rollup.refresh()
+            self.assertIsNotNone(previous)
+            self.assertTrue(engine.has_table(previous))
+            session.commit()
+            rollup.drop_rollup_table(previous)
+            self.assertFalse(engine.has_table(previous))
+
+            self.assertEqual(table.find_rollup(query_obj).id, rollup.id)
+            self.assertIn(rollup.rollup_table, table.get_query_str(query_obj))
+            df = table.query(query_obj).df.sort_values("gender")
+            self.assertEqual(list(df["gender"]), ["boy", "girl"])
+            self.assertEqual(list(df["sum__num"]), [9, 2])
+
+            # queries on columns the rollup doesn't have read the table
+            query_obj["filter"] = [{"col": "num", "op": "==", "val": "1"}]
+            self.assertIsNone(table.find_rollup(query_obj))
+            self.assertNotIn(rollup.rollup_table, table.get_query_str(query_obj))
+        finally:
+            if rollup.rollup_table:
+                engine.execute(f"DROP TABLE IF EXISTS {rollup.rollup_table}")
+            engine.execute("DROP TABLE rollup_facts")
+            database.allow_ctas = allow_ctas
+            session.delete(table)
+            session.commit()
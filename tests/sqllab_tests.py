@@ -18,15 +18,18 @@
 from datetime import datetime, timedelta
 import json
 import unittest
+from unittest import mock
 
 from flask_appbuilder.security.sqla import models as ab_models
 import prison
+from werkzeug.contrib.cache import SimpleCache
 
 from superset import db, security_manager
 from superset.dataframe import SupersetDataFrame
 from superset.db_engine_specs import BaseEngineSpec
 from superset.models.sql_lab import Query
-from superset.utils.core import datetime_to_epoch, get_main_database
+from superset.utils import paged_results
+from superset.utils.core import datetime_to_epoch, get_main_database, QueryStatus
 from .base_tests import SupersetTestCase
 
 
@@ -421,6 +424,46 @@ class SqlLabTests(SupersetTestCase):
         for i, expected_result in enumerate(expected_results):
             self.assertEquals(expected_result, data["result"][i]["database_name"])
 
+    def test_results_paged(self):
+        self.login("admin")
+        client_id = "client_id_paged"
+        self.run_sql("SELECT 1", client_id=client_id, raise_on_error=True)
+        query = db.session.query(Query).filter_by(client_id=client_id).one()
+        query.results_key = results_key = "paged_results_key"
+        db.session.commit()
+
+        backend = SimpleCache()
+        rows = [{"a": i} for i in range(25)]
+        payload = {
+            "status": QueryStatus.SUCCESS,
+            "data": rows,
+            "columns": [{"name": "a"}],
+            "query": {"rows": len(rows)},
+        }
+        paged_results.store_results(
+            backend, results_key, payload, page_size=10, timeout=0
+        )
+        url = "/superset/results/{}/".format(results_key)
+        try:
+            with mock.patch("superset.views.core.results_backend", backend):
+                data = self.get_json_resp(url + "?offset=8&limit=5")
+                self.assertEqual(data["data"], rows[8:13])
+                self.assertEqual(data["paging"]["pages"], 3)
+                self.assertEqual(self.get_json_resp(url)["data"], rows)
+
+                resp = self.get_resp("/superset/csv/{}".format(client_id))
+                self.assertEqual(
+                    resp.splitlines(), ["a"] + [str(row["a"]) for row in rows]
+                )
+
+                # windows on expired pages can't be served
+                backend.delete(paged_results.page_key(results_key, 1))
+                self.assertEqual(self.client.get(url + "?limit=5").status_code, 200)
+                self.assertEqual(self.client.get(url + "?offset=12").status_code, 410)
+        finally:
+            db.session.query(Query).filter_by(client_id=client_id).delete()
+            db.session.commit()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -29,9 +29,9 @@ class StatsdStatsLoggerTest(TestCase):
         logger.decr("foo2")
         client.decr.assert_called_once()
         client.decr.assert_called_with("foo2")
-        logger.gauge("foo3")
+        logger.gauge("foo3", 2)
         client.gauge.assert_called_once()
-        client.gauge.assert_called_with("foo3")
+        client.gauge.assert_called_with("foo3", 2)
         logger.timing("foo4", 1.234)
         client.timing.assert_called_once()
         client.timing.assert_called_with("foo4", 1.234)
@@ -15,17 +15,21 @@
 # specific language governing permissions and limitations
 # under the License.
 """Unit tests for Superset cache warmup"""
+from datetime import datetime, timedelta
 import json
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock, patch
 
-from superset import db
+from superset import app, cache, db
 from superset.models.core import Log
 from superset.models.tags import get_tag, ObjectTypes, TaggedObject, TagTypes
 from superset.tasks.cache import (
     DashboardTagsStrategy,
     get_form_data,
+    PredictiveStrategy,
     TopNDashboardsStrategy,
+    warm_up_charts,
 )
+from superset.utils import cache_codecs
 from .base_tests import SupersetTestCase
 
 
@@ -209,3 +213,68 @@ class CacheWarmUpTests(SupersetTestCase):
         result = sorted(strategy.get_urls())
         expected = sorted(tag1_urls + tag2_urls)
         self.assertEqual(result, expected)
+
+    @patch("superset.tasks.cache.get_viz")
+    def test_warm_up_charts(self, get_viz):
+        cache_keys = {1: "warmup_a", 2: "warmup_a", 3: "warmup_b", 4: "warmup_c"}
+
+        def make_viz(chart, dashboard):
+            viz_obj = MagicMock()
+            viz_obj.cache_key.return_value = cache_keys[chart.id]
+            viz_obj.is_stale.return_value = False
+            viz_obj.get_payload.return_value = {"status": "success"}
+            viz_obj.datasource.type = "table"
+            viz_obj.datasource.database_id = chart.id % 2
+            return viz_obj
+
+        get_viz.side_effect = make_viz
+        cache_value = dict(dttm=datetime.utcnow().isoformat(), df=None, query="")
+        cache.set(
+            "warmup_b",
+            cache_codecs.serialize(cache_value, app.config.get("DATA_CACHE_CODEC")),
+        )
+        try:
+            results = warm_up_charts([(Mock(id=i), None) for i in range(1, 5)])
+        finally:
+            cache.delete("warmup_b")
+
+        warmed_up = sorted(r["chart_id"] for r in results["success"])
+        self.assertEqual(warmed_up, [1, 4])
+        self.assertEqual(results["duplicates"], [2])
+        self.assertEqual(results["fresh"], [3])
+        self.assertEqual(results["errors"], [])
+
+    def test_predictive_strategy(self):
+        now = datetime(2030, 1, 7, 9, 45)
+        last_week = datetime(2029, 12, 31, 10, 10)
+
+        def log(slice_id, dttm, duration_ms=100, action="explore_json"):
+            db.session.add(
+                Log(
+                    action=action, slice_id=slice_id, dttm=dttm, duration_ms=duration_ms
+                )
+            )
+
+        log(1001, last_week, 2000)
+        for _ in range(2):
+            log(1001, last_week, 2000, action="dashboard_chart_json")
+        for _ in range(2):
+            log(1002, last_week - timedelta(weeks=1), 5000)
+        log(1002, now - timedelta(days=1))
+        # not viewed lately
+        log(1003, last_week - timedelta(weeks=1))
+        # viewed at another time of the week
+        log(1004, last_week - timedelta(hours=2))
+        db.session.commit()
+        try:
+            strategy = PredictiveStrategy(budget_seconds=3)
+            predictions = strategy.get_predictions(now)
+            self.assertEqual([p[0] for p in predictions], [1001, 1002])
+            self.assertEqual(predictions[0][2], 2)
+            self.assertGreater(predictions[0][1], predictions[1][1])
+            self.assertEqual(strategy.select(predictions), [1001])
+        finally:
+            db.session.query(Log).filter(
+                Log.slice_id.in_([1001, 1002, 1003, 1004])
+            ).delete(synchronize_session=False)
+            db.session.commit()
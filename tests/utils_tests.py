@@ -16,13 +16,16 @@
 # under the License.
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+import gzip
+from time import monotonic
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 import uuid
 
 from flask import Flask
 from flask_caching import Cache
 import numpy
+import pandas as pd
 from sqlalchemy.exc import ArgumentError
 
 from superset import app, db, security_manager
@@ -32,9 +35,12 @@ from superset.utils.core import (
     base_json_conv,
     convert_legacy_filters_into_adhoc,
     datetime_f,
+    df_chunks,
+    df_to_csv_chunks,
     get_or_create_db,
     get_since_until,
     get_stacktrace,
+    gzip_chunks,
     json_int_dttm_ser,
     json_iso_dttm_ser,
     JSONEncodedDict,
@@ -143,6 +149,21 @@ class UtilsTestCase(unittest.TestCase):
         got_str = zlib_decompress_to_string(blob)
         self.assertEquals(json_str, got_str)
 
+    def test_gzip_chunks(self):
+        chunks = ["a,b\n", "", "1,2\n"]
+        data = b"".join(gzip_chunks(chunks))
+        self.assertEquals(gzip.decompress(data), b"a,b\n1,2\n")
+
+    def test_df_to_csv_chunks(self):
+        df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+        chunks = list(df_to_csv_chunks(df_chunks(df, 2), index=False))
+        self.assertEquals(chunks, ["a,b\n1,x\n2,y\n", "3,z\n"])
+        self.assertEquals("".join(chunks), df.to_csv(index=False))
+
+        empty_df = pd.DataFrame(columns=["a", "b"])
+        chunks = list(df_to_csv_chunks(df_chunks(empty_df, 2), index=False))
+        self.assertEquals(chunks, ["a,b\n"])
+
     @patch("superset.utils.core.to_adhoc", mock_to_adhoc)
     def test_merge_extra_filters(self):
         # does nothing if no extra filters
@@ -606,6 +627,42 @@ class UtilsTestCase(unittest.TestCase):
         self.assertEqual(instance.watcher, 4)
         self.assertEqual(result1, result8)
 
+    def test_memoized_lru_and_ttl(self):
+        calls = []
+        evicted = []
+        stats_logger = Mock()
+
+        @memoized(
+            maxsize=2,
+            ttl=60,
+            on_evict=evicted.append,
+            stats_logger=stats_logger,
+            stats_prefix="test",
+        )
+        def test_function(a):
+            calls.append(a)
+            return a * 10
+
+        test_function(1)
+        test_function(2)
+        self.assertEqual(test_function(1), 10)
+        self.assertEqual(calls, [1, 2])
+
+        # 2 is the least recently used
+        test_function(3)
+        self.assertEqual(evicted, [20])
+        test_function(1)
+        self.assertEqual(calls, [1, 2, 3])
+
+        with patch("superset.utils.core.monotonic", return_value=monotonic() + 61):
+            self.assertEqual(test_function(1), 10)
+        self.assertEqual(calls, [1, 2, 3, 1])
+        self.assertEqual(evicted, [20, 10, 30])
+
+        stats_logger.incr.assert_any_call("test.hit")
+        stats_logger.incr.assert_any_call("test.miss")
+        stats_logger.incr.assert_any_call("test.eviction")
+
     @patch("superset.utils.core.parse_human_datetime", mock_parse_human_datetime)
     def test_get_since_until(self):
         result = get_since_until()
@@ -14,16 +14,21 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from datetime import datetime
+from datetime import datetime, timedelta
+import threading
 from unittest.mock import Mock, patch
 import uuid
 
 import numpy as np
 import pandas as pd
+from sqlalchemy.orm import object_session
 
-from superset import app
+from superset import app, cache, db
+from superset.connectors.sqla.models import SqlaTable
 from superset.exceptions import SpatialException
-from superset.utils.core import DTTM_ALIAS
+from superset.utils import cache_codecs, rollups
+from superset.utils.cache import release_lease
+from superset.utils.core import DTTM_ALIAS, get_main_database, QueryStatus
 import superset.viz as viz
 from .base_tests import SupersetTestCase
 from .utils import load_fixture
@@ -136,6 +141,227 @@ class BaseVizTestCase(SupersetTestCase):
             result[DTTM_ALIAS], pd.Series([datetime(1960, 1, 1, 0, 0)], name=DTTM_ALIAS)
         )
 
+    def test_get_df_payloads(self):
+        datasource = self.get_datasource_mock()
+        datasource.uid = "1__table"
+        datasource.get_extra_cache_keys = Mock(return_value=[])
+        datasource.cache_timeout = 0
+        test_viz = viz.BaseViz(datasource, form_data={}, force=True)
+        # both queries have to be in flight at the same time to get past it
+        barrier = threading.Barrier(2, timeout=10)
+
+        def get_df(query_obj):
+            barrier.wait()
+            if query_obj["row_limit"] == 2:
+                raise Exception("Query failed")
+            return pd.DataFrame({"a": range(query_obj["row_limit"])})
+
+        test_viz.get_df = Mock(side_effect=get_df)
+        queries = [
+            ({"from_dttm": None, "to_dttm": None, "row_limit": row_limit}, {})
+            for row_limit in (1, 2)
+        ]
+        with app.app_context():
+            payloads = test_viz.get_df_payloads(queries)
+        self.assertEqual(len(payloads[0]["df"].index), 1)
+        self.assertIsNone(payloads[0]["error"])
+        self.assertIsNone(payloads[1]["df"])
+        self.assertEqual(payloads[1]["error"], "Query failed")
+        self.assertEqual(test_viz.status, QueryStatus.FAILED)
+        self.assertEqual(test_viz.error_message, "Query failed")
+
+    def test_get_df_payloads_thread_datasource(self):
+        datasource = SqlaTable(table_name="thread_table", database=get_main_database())
+        db.session.add(datasource)
+        db.session.commit()
+        datasource_id = datasource.id
+        test_viz = viz.BaseViz(datasource, form_data={})
+        sessions = []
+
+        def get_df_payload(viz_obj, query_obj):
+            self.assertIsNot(viz_obj.datasource, datasource)
+            self.assertEqual(viz_obj.datasource.id, datasource_id)
+            sessions.append(object_session(viz_obj.datasource))
+            return {}
+
+        try:
+            with patch.object(
+                viz.BaseViz, "get_df_payload", autospec=True, side_effect=get_df_payload
+            ):
+                test_viz.get_df_payloads([({}, {}), ({}, {})])
+        finally:
+            db.session.delete(datasource)
+            db.session.commit()
+        self.assertEqual(len(sessions), 2)
+        self.assertNotIn(object_session(datasource), sessions)
+
+    @patch("superset.tasks.cache.refresh_chart_data")
+    def test_get_df_payload_stale(self, refresh_chart_data):
+        datasource = self.get_datasource_mock()
+        datasource.uid = "1__table"
+        datasource.get_extra_cache_keys = Mock(return_value=[])
+        datasource.cache_timeout = 60
+        datasource.stale_cache_timeout = 600
+        form_data = {"viz_type": "table"}
+        query_obj = {"from_dttm": None, "to_dttm": None, "row_limit": 1}
+        test_viz = viz.BaseViz(datasource, form_data=form_data)
+        test_viz.get_df = Mock()
+        cache_key = test_viz.cache_key(query_obj)
+        cached_dttm = (datetime.utcnow() - timedelta(seconds=120)).isoformat()
+        cache_value = dict(
+            dttm=cached_dttm.split(".")[0], df=pd.DataFrame({"a": [1]}), query=""
+        )
+        cache.set(
+            cache_key,
+            cache_codecs.serialize(cache_value, app.config.get("DATA_CACHE_CODEC")),
+        )
+        try:
+            for _ in range(2):
+                payload = test_viz.get_df_payload(query_obj)
+                self.assertTrue(payload["is_cached"])
+                self.assertEqual(list(payload["df"]["a"]), [1])
+            test_viz.get_df.assert_not_called()
+            # the refresh is only scheduled once
+            refresh_chart_data.delay.assert_called_once_with(
+                datasource.type, datasource.id, form_data, cache_key
+            )
+        finally:
+            cache.delete(cache_key)
+            release_lease(cache_key)
+
+    @patch.dict(app.config, {"TIMESERIES_CACHE_SEGMENT_SECONDS": 24 * 60 * 60})
+    def test_get_df_by_segments(self):
+        datasource = self.get_datasource_mock()
+        datasource.uid = "1__table"
+        datasource.offset = 0
+        datasource.cache_timeout = 60
+        datasource.is_templated = Mock(return_value=False)
+        test_viz = viz.BaseViz(datasource, form_data={})
+        query_obj = {
+            "granularity": "ds",
+            "is_timeseries": True,
+            "groupby": [],
+            "metrics": ["sum__num"],
+            "extras": {"time_grain_sqla": "P1D"},
+            "from_dttm": datetime(2019, 1, 1),
+            "to_dttm": datetime(2019, 1, 4, 12),
+        }
+
+        def get_df(query_obj):
+            dttms = pd.date_range(query_obj["from_dttm"], query_obj["to_dttm"])
+            return pd.DataFrame({DTTM_ALIAS: dttms, "sum__num": range(len(dttms))})
+
+        test_viz.get_df = Mock(side_effect=get_df)
+        bounds = test_viz.get_segment_bounds(query_obj)
+        self.assertEqual(len(bounds), 4)
+        self.assertEqual(bounds[-1], (datetime(2019, 1, 4), datetime(2019, 1, 4, 12)))
+        keys = [test_viz.segment_cache_key(query_obj, *b) for b in bounds]
+        try:
+            df = test_viz.get_df_by_segments(query_obj, bounds)
+            self.assertEqual(list(df["sum__num"]), [0, 1, 2, 3])
+            # the closed segments are served from the cache, only the open
+            # one is queried again
+            df = test_viz.get_df_by_segments(query_obj, bounds)
+            self.assertEqual(list(df["sum__num"]), [0, 1, 2, 0])
+            self.assertEqual(
+                test_viz.get_df.call_args[0][0]["from_dttm"], datetime(2019, 1, 4)
+            )
+
+            # time ranges not starting on a segment aren't split
+            query_obj["from_dttm"] = datetime(2019, 1, 1, 6)
+            self.assertIsNone(test_viz.get_segment_bounds(query_obj))
+        finally:
+            for key in keys:
+                cache.delete(key)
+
+    def test_get_df_payload_rollup(self):
+        datasource = self.get_datasource_mock()
+        datasource.uid = "1__table"
+        datasource.offset = 0
+        datasource.cache_timeout = 60
+        datasource.stale_cache_timeout = 0
+        datasource.is_templated = Mock(return_value=False)
+        datasource.get_extra_cache_keys = Mock(return_value=[])
+        datasource.metrics = [Mock(metric_name="sum__num", expression="SUM(num)")]
+        test_viz = viz.BaseViz(datasource, form_data={})
+        test_viz.get_df = Mock(
+            return_value=pd.DataFrame(
+                {
+                    DTTM_ALIAS: pd.to_datetime(
+                        ["2019-01-01", "2019-01-02", "2019-01-02", "2019-02-01"]
+                    ),
+                    "country": ["FR", "FR", "FR", "US"],
+                    "state": ["A", "A", "B", "C"],
+                    "sum__num": [1, 2, 3, 4],
+                }
+            )
+        )
+        query_obj = {
+            "granularity": "ds",
+            "from_dttm": datetime(2019, 1, 1),
+            "to_dttm": datetime(2019, 3, 1),
+            "is_timeseries": True,
+            "groupby": ["country", "state"],
+            "metrics": ["sum__num"],
+            "row_limit": 100,
+            "filter": [],
+            "timeseries_limit": 0,
+            "extras": {"where": "", "having": "", "time_grain_sqla": "P1D"},
+            "order_desc": True,
+        }
+        coarser_query_obj = dict(
+            query_obj,
+            groupby=["country"],
+            extras=dict(query_obj["extras"], time_grain_sqla="P1M"),
+        )
+        cache_keys = [test_viz.cache_key(q) for q in (query_obj, coarser_query_obj)]
+        rollup_key = test_viz.rollup_index_key(query_obj)
+        try:
+            test_viz.get_df_payload(query_obj)
+            payload = test_viz.get_df_payload(coarser_query_obj)
+            test_viz.get_df.assert_called_once()
+            df = payload["df"].sort_values(DTTM_ALIAS)
+            self.assertEqual(list(df["country"]), ["FR", "US"])
+            self.assertEqual(list(df["sum__num"]), [6, 4])
+            self.assertEqual(list(df[DTTM_ALIAS].dt.month), [1, 2])
+
+            # averages can't be rolled up
+            avg_query_obj = dict(
+                coarser_query_obj,
+                metrics=[
+                    {
+                        "expressionType": "SQL",
+                        "sqlExpression": "AVG(num)",
+                        "label": "avg__num",
+                    }
+                ],
+            )
+            self.assertIsNone(test_viz.get_rollup(avg_query_obj, rollup_key))
+        finally:
+            for key in cache_keys + [rollup_key]:
+                cache.delete(key)
+
+    def test_roll_up_null_sums(self):
+        df = pd.DataFrame(
+            {
+                "country": ["FR", "FR", "US", "US"],
+                "sum__num": [1, None, None, None],
+                "count": [1, 1, 2, 0],
+            }
+        )
+        query_obj = {"groupby": ["country"], "metrics": ["sum__num"]}
+        functions = {"sum__num": "sum", "count": "sum"}
+        df = rollups.roll_up(df, query_obj, functions).sort_values("country")
+        self.assertEqual(list(df["country"]), ["FR", "US"])
+        self.assertEqual(df["sum__num"][0], 1)
+        self.assertTrue(pd.isnull(df["sum__num"][1]))
+        self.assertEqual(list(df["count"]), [2, 2])
+
+        df = rollups.roll_up(
+            df[df.country == "US"], {"metrics": ["sum__num"]}, functions
+        )
+        self.assertTrue(pd.isnull(df["sum__num"][0]))
+
     def test_cache_timeout(self):
         datasource = self.get_datasource_mock()
         datasource.cache_timeout = 0